@@ -28,6 +28,7 @@ from ..interfaces.base import (traits, TraitedSpec, BaseInterface,
                                BaseInterfaceInputSpec, File, isdefined,
                                InputMultiPath)
 from ..utils import NUMPY_MMAP
+from ..utils.filemanip import fname_presuffix
 from ..utils.misc import normalize_mc_params
 
 IFLOG = logging.getLogger('interface')
@@ -265,12 +266,8 @@ Bradley L. and Petersen, Steven E.},
 
     def _run_interface(self, runtime):
         mpars = np.loadtxt(self.inputs.in_file)  # mpars is N_t x 6
-        mpars = np.apply_along_axis(func1d=normalize_mc_params,
-                                    axis=1, arr=mpars,
-                                    source=self.inputs.parameter_source)
-        diff = mpars[:-1, :6] - mpars[1:, :6]
-        diff[:, 3:6] *= self.inputs.radius
-        fd_res = np.abs(diff).sum(axis=1)
+        mpars = normalize_mc_params(mpars, self.inputs.parameter_source)
+        fd_res = framewise_displacement(mpars, self.inputs.radius)
 
         self._results = {
             'out_file': op.abspath(self.inputs.out_file),
@@ -299,6 +296,94 @@ Bradley L. and Petersen, Steven E.},
     def _list_outputs(self):
         return self._results
 
+class BatchFramewiseDisplacementInputSpec(BaseInterfaceInputSpec):
+    in_files = InputMultiPath(File(exists=True), mandatory=True,
+                              desc='motion parameters of each run')
+    parameter_source = traits.Enum("FSL", "AFNI", "SPM", "FSFAST", "NIPY",
+                                   desc="Source of movement parameters",
+                                   mandatory=True)
+    radius = traits.Float(50, usedefault=True,
+                          desc='radius in mm to calculate angular FDs, 50mm is the '
+                               'default since it is used in Power et al. 2012')
+    out_table = File('fd_power_2012.tsv', usedefault=True,
+                     desc='output table with the FD of all runs')
+
+
+class BatchFramewiseDisplacementOutputSpec(TraitedSpec):
+    out_files = traits.List(File(exists=True),
+                            desc='calculated FD per timestep, for each run')
+    out_table = File(exists=True, desc='output table with the FD of all runs')
+    fd_average = traits.List(traits.Float(), desc='average FD of each run')
+
+
+class BatchFramewiseDisplacement(BaseInterface):
+    """
+    Calculate the :abbr:`FD (framewise displacement)` of many runs at once,
+    as :py:class:`FramewiseDisplacement` does for one.
+
+    The motion parameters of all runs are concatenated and the FD of all
+    timesteps is computed in a single pass. The FD of each run is written
+    to its own file (named after the input and the position of the run,
+    e.g. ``<input>_run000_fd.txt``), and the FD of all runs to
+    a single table with columns ``run`` (position in ``in_files``),
+    ``timestep`` and ``FramewiseDisplacement``.
+
+    >>> fd = BatchFramewiseDisplacement()
+    >>> fd.inputs.in_files = ['fsl_mcflirt_movpar.txt'] * 2
+    >>> fd.inputs.parameter_source = 'FSL'
+    >>> res = fd.run() # doctest: +SKIP
+
+    """
+
+    input_spec = BatchFramewiseDisplacementInputSpec
+    output_spec = BatchFramewiseDisplacementOutputSpec
+
+    def _run_interface(self, runtime):
+        runs = [np.atleast_2d(np.loadtxt(in_file))
+                for in_file in self.inputs.in_files]
+        lengths = np.array([len(mpars) for mpars in runs])
+        mpars = normalize_mc_params(np.vstack(runs),
+                                    self.inputs.parameter_source)
+
+        # Drop the differences between the last and first timepoints of
+        # consecutive runs
+        fd_res = framewise_displacement(mpars, self.inputs.radius)
+        fd_res = np.delete(fd_res, np.cumsum(lengths)[:-1] - 1)
+        run_fd_res = np.split(fd_res, np.cumsum(lengths - 1)[:-1])
+
+        out_files = []
+        fd_average = []
+        for idx, (in_file, run_fd) in enumerate(zip(self.inputs.in_files,
+                                                    run_fd_res)):
+            out_files.append(fname_presuffix(in_file,
+                                             suffix='_run%03d_fd' % idx,
+                                             newpath=os.getcwd(),
+                                             use_ext=False) + '.txt')
+            np.savetxt(out_files[-1], run_fd, header='FramewiseDisplacement',
+                       comments='')
+            fd_average.append(float(run_fd.mean()))
+
+        run_ids = np.repeat(np.arange(len(runs)), lengths - 1)
+        timesteps = np.concatenate([np.arange(len(run_fd))
+                                    for run_fd in run_fd_res])
+        out_table = op.abspath(self.inputs.out_table)
+        np.savetxt(out_table, np.column_stack((run_ids, timesteps, fd_res)),
+                   fmt=['%d', '%d', '%.18e'], delimiter='\t',
+                   header='\t'.join(('run', 'timestep',
+                                      'FramewiseDisplacement')),
+                   comments='')
+
+        self._results = {
+            'out_files': out_files,
+            'out_table': out_table,
+            'fd_average': fd_average,
+        }
+        return runtime
+
+    def _list_outputs(self):
+        return self._results
+
+
 class CompCorInputSpec(BaseInterfaceInputSpec):
     realigned_file = File(exists=True, mandatory=True,
                           desc='already realigned brain image (4D)')
@@ -542,31 +627,82 @@ class TSNR(BaseInterface):
     output_spec = TSNROutputSpec
 
     def _run_interface(self, runtime):
-        img = nb.load(self.inputs.in_file[0], mmap=NUMPY_MMAP)
+        vollist = [nb.load(filename, mmap=NUMPY_MMAP)
+                   for filename in self.inputs.in_file]
+        img = vollist[0]
         header = img.header.copy()
-        vollist = [nb.load(filename, mmap=NUMPY_MMAP) for filename in self.inputs.in_file]
-        data = np.concatenate([vol.get_data().reshape(
-            vol.get_shape()[:3] + (-1,)) for vol in vollist], axis=3)
-        data = np.nan_to_num(data)
-
-        if data.dtype.kind == 'i':
+        shape = img.shape[:3]
+        timepoints = sum(_nvols(vol) for vol in vollist)
+
+        dtype = np.result_type(*[vol.get_data_dtype() for vol in vollist])
+        if any(vol.dataobj.slope != 1 or vol.dataobj.inter != 0
+               for vol in vollist):
+            dtype = np.float64
+        if dtype.kind == 'i':
             header.set_data_dtype(np.float32)
-            data = data.astype(np.float32)
-
+            dtype = np.float32
+        elif dtype.kind != 'f':
+            # e.g. unsigned integers, averaged in double precision
+            dtype = np.float64
+
+        # Sufficient statistics are accumulated relative to the first
+        # volume, to avoid cancellation in the sums of squares.
+        degree = 0
         if isdefined(self.inputs.regress_poly):
-            data = regress_poly(self.inputs.regress_poly, data, remove_mean=False)
-            img = nb.Nifti1Image(data, img.get_affine(), header)
-            nb.save(img, op.abspath(self.inputs.detrended_file))
+            degree = self.inputs.regress_poly
+            dtype = np.float64
+        X = _poly_design(degree, timepoints)
+        offset = None
+        sums = 0
+        sqsums = 0
+        proj = 0
+        for t0, t1, block in _iter_volume_blocks(vollist):
+            if offset is None:
+                offset = block[:, :1].copy()
+            block -= offset
+            sums += block.sum(axis=1)
+            sqsums += (block ** 2).sum(axis=1)
+            if degree:
+                proj += block.dot(X[t0:t1])
+
+        sums /= timepoints
+        if degree:
+            # polynomial fit, degree 0 is kept in the data
+            betas = proj.dot(np.linalg.pinv(X.T.dot(X)))[:, 1:]
+            X = X[:, 1:]
+            sqsums += (-2 * np.sum(betas * proj[:, 1:], axis=1) +
+                       np.sum(betas.dot(X.T.dot(X)) * betas, axis=1))
+            sums -= betas.dot(X.mean(axis=0))
+
+            from .misc import _scratch_memmap
+            detrended_file = op.abspath(self.inputs.detrended_file)
+            buffername, detrended = _scratch_memmap(
+                detrended_file, shape + (timepoints, ), np.float64)
+            try:
+                for t0, t1, block in _iter_volume_blocks(vollist):
+                    block -= betas.dot(X[t0:t1].T)
+                    detrended[..., t0:t1] = block.reshape(
+                        shape + (t1 - t0, ), order='F')
+                nb.save(nb.Nifti1Image(detrended, img.affine, header),
+                        detrended_file)
+            finally:
+                del detrended
+                os.remove(buffername)
+
+        variance = np.clip(sqsums / timepoints - sums ** 2, 0, None)
+        meanimg = (sums + offset[:, 0]).reshape(shape, order='F')
+        stddevimg = np.sqrt(variance).reshape(shape, order='F')
 
-        meanimg = np.mean(data, axis=3)
-        stddevimg = np.std(data, axis=3)
         tsnr = np.zeros_like(meanimg)
         tsnr[stddevimg > 1.e-3] = meanimg[stddevimg > 1.e-3] / stddevimg[stddevimg > 1.e-3]
-        img = nb.Nifti1Image(tsnr, img.get_affine(), header)
+        tsnr = tsnr.astype(dtype)
+        meanimg = meanimg.astype(dtype)
+        stddevimg = stddevimg.astype(dtype)
+        img = nb.Nifti1Image(tsnr, img.affine, header)
         nb.save(img, op.abspath(self.inputs.tsnr_file))
-        img = nb.Nifti1Image(meanimg, img.get_affine(), header)
+        img = nb.Nifti1Image(meanimg, img.affine, header)
         nb.save(img, op.abspath(self.inputs.mean_file))
-        img = nb.Nifti1Image(stddevimg, img.get_affine(), header)
+        img = nb.Nifti1Image(stddevimg, img.affine, header)
         nb.save(img, op.abspath(self.inputs.stddev_file))
         return runtime
 
@@ -599,11 +735,10 @@ class NonSteadyStateDetector(BaseInterface):
     output_spec = NonSteadyStateDetectorOutputSpec
 
     def _run_interface(self, runtime):
-        in_nii = nb.load(self.inputs.in_file)
-        global_signal = in_nii.get_data()[:,:,:,:50].mean(axis=0).mean(axis=0).mean(axis=0)
+        global_signal = _initial_global_signal(self.inputs.in_file)
 
         self._results = {
-            'n_volumes_to_discard': _is_outlier(global_signal)
+            'n_volumes_to_discard': is_outlier(global_signal)
         }
 
         return runtime
@@ -611,6 +746,78 @@ class NonSteadyStateDetector(BaseInterface):
     def _list_outputs(self):
         return self._results
 
+
+class BatchNonSteadyStateDetectorInputSpec(BaseInterfaceInputSpec):
+    in_files = InputMultiPath(File(exists=True), mandatory=True,
+                              desc='4D NIFTI EPI files')
+    out_table = File('nonsteady_volumes.tsv', usedefault=True,
+                     desc='output table with the results of all runs')
+
+
+class BatchNonSteadyStateDetectorOutputSpec(TraitedSpec):
+    n_volumes_to_discard = traits.List(
+        traits.Int(), desc='Number of non-steady state volumes detected in '
+                           'the beginning of each scan.')
+    out_table = File(exists=True,
+                     desc='output table with the results of all runs')
+
+
+class BatchNonSteadyStateDetector(BaseInterface):
+    """
+    Returns the number of non-steady state volumes detected at the beginning
+    of each of several scans, as :py:class:`NonSteadyStateDetector` does
+    for one. Only the first volumes of each scan are read.
+
+    >>> nss = BatchNonSteadyStateDetector()
+    >>> nss.inputs.in_files = ['functional.nii', 'functional2.nii']
+    >>> res = nss.run() # doctest: +SKIP
+
+    """
+
+    input_spec = BatchNonSteadyStateDetectorInputSpec
+    output_spec = BatchNonSteadyStateDetectorOutputSpec
+
+    def _run_interface(self, runtime):
+        n_volumes = [is_outlier(_initial_global_signal(in_file))
+                     for in_file in self.inputs.in_files]
+
+        out_table = op.abspath(self.inputs.out_table)
+        with open(out_table, 'w') as fp:
+            fp.write('run\tin_file\tn_volumes_to_discard\n')
+            for run, (in_file, n) in enumerate(zip(self.inputs.in_files,
+                                                   n_volumes)):
+                fp.write('%d\t%s\t%d\n' % (run, in_file, n))
+
+        self._results = {
+            'n_volumes_to_discard': n_volumes,
+            'out_table': out_table,
+        }
+        return runtime
+
+    def _list_outputs(self):
+        return self._results
+
+
+def framewise_displacement(mpars, radius=50):
+    """
+    Computes the FD between consecutive rows of motion parameters in the
+    SPM format (see :py:func:`nipype.utils.misc.normalize_mc_params`)
+
+    >>> framewise_displacement(np.array([[0, 0, 0, 0, 0, 0],
+    ...                                  [1, 0, 0, 0, 0, 0.1]])).tolist()
+    [6.0]
+
+    """
+    diff = mpars[:-1, :6] - mpars[1:, :6]
+    diff[:, 3:6] *= radius
+    return np.abs(diff).sum(axis=1)
+
+
+def _initial_global_signal(in_file, nvols=50):
+    """ Global signal of the first ``nvols`` volumes of a 4D file """
+    in_nii = nb.load(in_file, mmap=NUMPY_MMAP)
+    return in_nii.dataobj[:, :, :, :nvols].mean(axis=0).mean(axis=0).mean(axis=0)
+
 def is_outlier(points, thresh=3.5):
     """
     Returns a boolean array with True if points are outliers and False
@@ -652,6 +859,46 @@ def is_outlier(points, thresh=3.5):
     return timepoints_to_discard
 
 
+def _poly_design(degree, timepoints):
+    ''' returns a timepoints x (degree + 1) design matrix of Legendre
+    polynomials, the first column being degree 0 '''
+    X = np.ones((timepoints, 1)) # quick way to calc degree 0
+    for i in range(degree):
+        polynomial_func = Legendre.basis(i + 1)
+        value_array = np.linspace(-1, 1, timepoints)
+        X = np.hstack((X, polynomial_func(value_array)[:, np.newaxis]))
+    return X
+
+
+def _nvols(img):
+    ''' number of volumes of a 3D or 4D image '''
+    return int(np.prod(img.shape[3:]))
+
+
+def _iter_volume_blocks(imgs, block_bytes=64 * 1024 * 1024):
+    ''' iterates over the volumes of a list of 3D/4D images in blocks.
+    Yields the first and last (excluded) volume indices of the block,
+    counted across all images, and a voxels x volumes float64 array with
+    NaNs set to zero. Only one block is held in memory at a time.
+    '''
+    t0 = 0
+    for img in imgs:
+        nvox = int(np.prod(img.shape[:3]))
+        nvols = _nvols(img)
+        step = max(1, int(block_bytes // (8 * nvox)))
+        dataobj = img.dataobj
+        for start in range(0, nvols, step):
+            stop = min(start + step, nvols)
+            if len(img.shape) == 3:
+                block = np.asanyarray(dataobj)
+            else:
+                block = np.asanyarray(dataobj[..., start:stop])
+            block = np.nan_to_num(block.reshape((nvox, stop - start),
+                                                order='F').astype(np.float64))
+            yield t0 + start, t0 + stop, block
+        t0 += nvols
+
+
 def regress_poly(degree, data, remove_mean=True, axis=-1):
     ''' returns data with degree polynomial regressed out.
     Be default it is calculated along the last axis (usu. time).
@@ -667,11 +914,7 @@ def regress_poly(degree, data, remove_mean=True, axis=-1):
     data = data.reshape((-1, timepoints))
 
     # Generate design matrix
-    X = np.ones((timepoints, 1)) # quick way to calc degree 0
-    for i in range(degree):
-        polynomial_func = Legendre.basis(i + 1)
-        value_array = np.linspace(-1, 1, timepoints)
-        X = np.hstack((X, polynomial_func(value_array)[:, np.newaxis]))
+    X = _poly_design(degree, timepoints)
 
     # Calculate coefficients
     betas = np.linalg.pinv(X).dot(data.T)
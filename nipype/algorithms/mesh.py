@@ -103,7 +103,7 @@ class WarpPoints(TVTKBaseInterface):
         vox2ras = affine[0:3, 0:3]
         ras2vox = np.linalg.inv(vox2ras)
         origin = affine[0:3, 3]
-        voxpoints = np.array([np.dot(ras2vox, (p - origin)) for p in points])
+        voxpoints = np.dot(points - origin, ras2vox.T)
 
         warps = []
         for axis in warp_dims:
@@ -117,9 +117,8 @@ class WarpPoints(TVTKBaseInterface):
 
             warps.append(warp)
 
-        disps = np.squeeze(np.dstack(warps))
-        newpoints = [p + d for p, d in zip(points, disps)]
-        mesh.points = newpoints
+        disps = np.column_stack(warps)
+        mesh.points = points + disps
         w = tvtk.PolyDataWriter()
         VTKInfo.configure_input_data(w, mesh)
         w.file_name = self._gen_fname(self.inputs.points, suffix='warped', ext='.vtk')
@@ -187,14 +186,22 @@ class ComputeMeshWarp(TVTKBaseInterface):
     output_spec = ComputeMeshWarpOutputSpec
 
     def _triangle_area(self, A, B, C):
-        A = np.array(A)
-        B = np.array(B)
-        C = np.array(C)
-        ABxAC = nla.norm(A - B) * nla.norm(A - C)
-        prod = np.dot(B - A, C - A)
-        angle = np.arccos(prod / ABxAC)
-        area = 0.5 * ABxAC * np.sin(angle)
-        return area
+        """Areas of the triangles with vertices ``A``, ``B`` and ``C``,
+        which may be single points or arrays of points (one per row)"""
+        A = np.array(A, dtype=float)
+        B = np.array(B, dtype=float)
+        C = np.array(C, dtype=float)
+        ABxAC = np.cross(B - A, C - A)
+        # not nla.norm(..., axis=-1), which needs numpy >= 1.8
+        return 0.5 * np.sqrt((ABxAC ** 2).sum(-1))
+
+    def _vertex_area(self, points, faces):
+        """Total area of the faces each vertex belongs to"""
+        areas = self._triangle_area(points[faces[:, 0]],
+                                    points[faces[:, 1]],
+                                    points[faces[:, 2]])
+        return np.bincount(faces.reshape(-1), weights=np.repeat(areas, 3),
+                           minlength=len(points))
 
     def _run_interface(self, runtime):
         r1 = tvtk.PolyDataReader(file_name=self.inputs.surface1)
@@ -221,18 +228,7 @@ class ComputeMeshWarp(TVTKBaseInterface):
 
         if self.inputs.weighting == 'area':
             faces = vtk1.polys.to_array().reshape(-1, 4).astype(int)[:, 1:]
-
-            for i, p1 in enumerate(points2):
-                # compute surfaces, set in weight
-                w = 0.0
-                point_faces = faces[(faces[:, :] == i).any(axis=1)]
-
-                for idset in point_faces:
-                    fp1 = points1[int(idset[0])]
-                    fp2 = points1[int(idset[1])]
-                    fp3 = points1[int(idset[2])]
-                    w += self._triangle_area(fp1, fp2, fp3)
-                weights[i] = w
+            weights = self._vertex_area(points1, faces)
 
         result = np.vstack([errvector, weights])
         np.save(op.abspath(self.inputs.out_file), result.transpose())
@@ -21,7 +21,7 @@ import os.path as op
 import nibabel as nb
 import numpy as np
 from scipy.ndimage.morphology import binary_erosion
-from scipy.spatial.distance import cdist, euclidean, dice, jaccard
+from scipy.spatial.distance import cdist, euclidean
 from scipy.ndimage.measurements import center_of_mass, label
 
 from .. import logging
@@ -215,6 +215,87 @@ class Distance(BaseInterface):
         return outputs
 
 
+def label_overlaps(data1, data2, labels):
+    """Computes the per-label intersections and volumes of two label maps
+
+    A sparse confusion matrix between the labels of ``data1`` (rows) and
+    ``data2`` (columns) is accumulated in a single pass over the voxels.
+    Values not in ``labels`` are gathered in an extra last row and column.
+    Returns the intersection, the volume in ``data1`` and the volume in
+    ``data2`` (in voxels) of each label.
+
+    >>> data1 = np.array([0, 1, 1, 2, 2, 2])
+    >>> data2 = np.array([0, 1, 2, 2, 2, 0])
+    >>> [v.tolist() for v in label_overlaps(data1, data2, [1, 2])]
+    [[1, 2], [2, 3], [1, 3]]
+
+    """
+    from scipy import sparse
+
+    labels = np.asarray(labels)
+    nlabels = len(labels)
+    order = np.argsort(labels)
+
+    def _label_index(data):
+        data = np.asarray(data).reshape(-1)
+        pos = np.searchsorted(labels[order], data).clip(0, max(nlabels - 1, 0))
+        index = np.full(data.shape, nlabels, dtype=np.intp)
+        if nlabels:
+            found = labels[order][pos] == data
+            index[found] = order[pos[found]]
+        return index
+
+    idx1 = _label_index(data1)
+    idx2 = _label_index(data2)
+    confusion = sparse.coo_matrix(
+        (np.ones(idx1.size, dtype=np.int64), (idx1, idx2)),
+        shape=(nlabels + 1, nlabels + 1)).tocsr()
+
+    intersection = confusion.diagonal()[:nlabels]
+    volumes1 = np.asarray(confusion.sum(axis=1)).reshape(-1)[:nlabels]
+    volumes2 = np.asarray(confusion.sum(axis=0)).reshape(-1)[:nlabels]
+    return intersection, volumes1, volumes2
+
+
+def _overlap_jaccard(intersection, volumes1, volumes2):
+    """Jaccard index per label, computed as scipy's
+    :py:func:`~scipy.spatial.distance.jaccard` does (0 for absent labels)"""
+    union = volumes1 + volumes2 - intersection
+    jaccard = np.zeros(len(union))
+    nonzero = union > 0
+    jaccard[nonzero] = 1 - ((union - intersection)[nonzero] /
+                            union[nonzero].astype(np.float64))
+    return jaccard
+
+
+def _load_label_maps(nii1, nii2, mask_volume=None):
+    """Reads two label maps, setting negative and NaN values (and voxels
+    outside the mask) to zero"""
+    data1 = nii1.get_data()
+    data1[np.logical_or(data1 < 0, np.isnan(data1))] = 0
+    max1 = int(data1.max())
+    data1 = data1.astype(np.min_scalar_type(max1))
+    data2 = nii2.get_data().astype(np.min_scalar_type(max1))
+    data2[np.logical_or(data1 < 0, np.isnan(data1))] = 0
+
+    if mask_volume is not None:
+        maskdata = nb.load(mask_volume).get_data()
+        maskdata = ~np.logical_or(maskdata == 0, np.isnan(maskdata))
+        data1[~maskdata] = 0
+        data2[~maskdata] = 0
+    return data1, data2
+
+
+def _overlap_weights(volumes, weighting):
+    """Normalized weights to average class overlaps"""
+    weights = np.ones((len(volumes),), dtype=np.float32)
+    if weighting != 'none':
+        weights = weights / np.array(volumes)
+        if weighting == 'squared_vol':
+            weights = weights**2
+    return weights / np.sum(weights)
+
+
 class OverlapInputSpec(BaseInterfaceInputSpec):
     volume1 = File(exists=True, mandatory=True,
                    desc='Has to have the same dimensions as volume2.')
@@ -273,12 +354,6 @@ class Overlap(BaseInterface):
     input_spec = OverlapInputSpec
     output_spec = OverlapOutputSpec
 
-    def _bool_vec_dissimilarity(self, booldata1, booldata2, method):
-        methods = {'dice': dice, 'jaccard': jaccard}
-        if not (np.any(booldata1) or np.any(booldata2)):
-            return 0
-        return 1 - methods[method](booldata1.flat, booldata2.flat)
-
     def _run_interface(self, runtime):
         nii1 = nb.load(self.inputs.volume1)
         nii2 = nb.load(self.inputs.volume2)
@@ -290,45 +365,26 @@ class Overlap(BaseInterface):
             for i in range(nii1.get_data().ndim - 1):
                 scale = scale * voxvol[i]
 
-        data1 = nii1.get_data()
-        data1[np.logical_or(data1 < 0, np.isnan(data1))] = 0
-        max1 = int(data1.max())
-        data1 = data1.astype(np.min_scalar_type(max1))
-        data2 = nii2.get_data().astype(np.min_scalar_type(max1))
-        data2[np.logical_or(data1 < 0, np.isnan(data1))] = 0
-        max2 = data2.max()
-        maxlabel = max(max1, max2)
-
+        mask_volume = None
         if isdefined(self.inputs.mask_volume):
-            maskdata = nb.load(self.inputs.mask_volume).get_data()
-            maskdata = ~np.logical_or(maskdata == 0, np.isnan(maskdata))
-            data1[~maskdata] = 0
-            data2[~maskdata] = 0
-
-        res = []
-        volumes1 = []
-        volumes2 = []
+            mask_volume = self.inputs.mask_volume
+        data1, data2 = _load_label_maps(nii1, nii2, mask_volume)
 
         labels = np.unique(data1[data1 > 0].reshape(-1)).tolist()
         if self.inputs.bg_overlap:
             labels.insert(0, 0)
 
-        for l in labels:
-            res.append(self._bool_vec_dissimilarity(data1 == l,
-                                                    data2 == l, method='jaccard'))
-            volumes1.append(scale * len(data1[data1 == l]))
-            volumes2.append(scale * len(data2[data2 == l]))
+        intersection, volumes1, volumes2 = label_overlaps(data1, data2,
+                                                          labels)
 
         results = dict(jaccard=[], dice=[])
-        results['jaccard'] = np.array(res)
+        results['jaccard'] = _overlap_jaccard(intersection, volumes1,
+                                              volumes2)
         results['dice'] = 2.0 * results['jaccard'] / (results['jaccard'] + 1.0)
 
-        weights = np.ones((len(volumes1),), dtype=np.float32)
-        if self.inputs.weighting != 'none':
-            weights = weights / np.array(volumes1)
-            if self.inputs.weighting == 'squared_vol':
-                weights = weights**2
-        weights = weights / np.sum(weights)
+        volumes1 = scale * volumes1
+        volumes2 = scale * volumes2
+        weights = _overlap_weights(volumes1, self.inputs.weighting)
 
         both_data = np.zeros(data1.shape)
         both_data[(data1 - data2) != 0] = 1
@@ -361,6 +417,123 @@ class Overlap(BaseInterface):
         return outputs
 
 
+class BatchOverlapInputSpec(BaseInterfaceInputSpec):
+    reference = File(exists=True, mandatory=True,
+                     desc='reference label map')
+    in_files = InputMultiPath(File(exists=True), mandatory=True,
+                              desc=('label maps to be compared with the '
+                                    'reference, with its same dimensions'))
+    mask_volume = File(exists=True,
+                       desc='calculate overlap only within this mask.')
+    bg_overlap = traits.Bool(False, usedefault=True, mandatory=True,
+                             desc='consider zeros as a label')
+    weighting = traits.Enum('none', 'volume', 'squared_vol', usedefault=True,
+                            desc=('weighting of the class-overlaps averaged '
+                                  'for each input (see Overlap)'))
+    vol_units = traits.Enum('voxel', 'mm', mandatory=True, usedefault=True,
+                            desc='units for volumes')
+    out_file = File('overlap.tsv', usedefault=True,
+                    desc='output table of overlaps')
+
+
+class BatchOverlapOutputSpec(TraitedSpec):
+    out_file = File(exists=True, desc=('table with one row per input and '
+                                       'label of the reference'))
+    labels = traits.List(traits.Int(), desc='labels of the reference')
+    jaccard = traits.List(traits.Float(),
+                          desc='averaged jaccard index of each input')
+    dice = traits.List(traits.Float(),
+                       desc='averaged dice index of each input')
+
+
+class BatchOverlap(BaseInterface):
+    """
+    Calculates Dice and Jaccard's overlap measures of one reference ROI
+    map against several others, as :py:class:`Overlap` does for a pair.
+    The reference is read only once and the results of all inputs are
+    written to a single tab-separated table with columns ``subject``
+    (position in ``in_files``), ``label``, ``volume_ref``, ``volume``,
+    ``jaccard`` and ``dice``.
+
+    Example
+    -------
+
+    >>> overlap = BatchOverlap()
+    >>> overlap.inputs.reference = 'cont1.nii'
+    >>> overlap.inputs.in_files = ['cont2.nii', 'cont2a.nii']
+    >>> res = overlap.run() # doctest: +SKIP
+
+    """
+    input_spec = BatchOverlapInputSpec
+    output_spec = BatchOverlapOutputSpec
+
+    def _run_interface(self, runtime):
+        ref_nii = nb.load(self.inputs.reference)
+
+        scale = 1.0
+        if self.inputs.vol_units == 'mm':
+            voxvol = ref_nii.header.get_zooms()
+            for i in range(len(ref_nii.shape) - 1):
+                scale = scale * voxvol[i]
+
+        ref_data = ref_nii.get_data()
+        ref_data[np.logical_or(ref_data < 0, np.isnan(ref_data))] = 0
+        dtype = np.min_scalar_type(int(ref_data.max()))
+        ref_data = ref_data.astype(dtype)
+
+        maskdata = None
+        if isdefined(self.inputs.mask_volume):
+            maskdata = nb.load(self.inputs.mask_volume).get_data()
+            maskdata = ~np.logical_or(maskdata == 0, np.isnan(maskdata))
+            ref_data[~maskdata] = 0
+
+        labels = np.unique(ref_data[ref_data > 0].reshape(-1)).tolist()
+        if self.inputs.bg_overlap:
+            labels.insert(0, 0)
+
+        rows = []
+        self._jaccard = []
+        self._dice = []
+        for subject, in_file in enumerate(self.inputs.in_files):
+            data = nb.load(in_file).get_data().astype(dtype)
+            if data.shape != ref_data.shape:
+                raise ValueError(
+                    'Input %s has shape %s, but the reference has shape %s' %
+                    (in_file, data.shape, ref_data.shape))
+            if maskdata is not None:
+                data[~maskdata] = 0
+
+            intersection, volumes1, volumes2 = label_overlaps(
+                ref_data, data, labels)
+            jaccard = _overlap_jaccard(intersection, volumes1, volumes2)
+            dice = 2.0 * jaccard / (jaccard + 1.0)
+            weights = _overlap_weights(scale * volumes1,
+                                       self.inputs.weighting)
+
+            self._jaccard.append(round(float(np.sum(weights * jaccard)), 5))
+            self._dice.append(round(float(np.sum(weights * dice)), 5))
+            rows += [(subject, l, scale * v1, scale * v2, j, d)
+                     for l, v1, v2, j, d in zip(labels, volumes1, volumes2,
+                                                jaccard, dice)]
+
+        with open(self.inputs.out_file, 'w') as fp:
+            fp.write('\t'.join(('subject', 'label', 'volume_ref', 'volume',
+                                 'jaccard', 'dice')) + '\n')
+            for row in rows:
+                fp.write('%d\t%d\t%.17g\t%.17g\t%.17g\t%.17g\n' % row)
+
+        self._labels = labels
+        return runtime
+
+    def _list_outputs(self):
+        outputs = self._outputs().get()
+        outputs['out_file'] = os.path.abspath(self.inputs.out_file)
+        outputs['labels'] = self._labels
+        outputs['jaccard'] = self._jaccard
+        outputs['dice'] = self._dice
+        return outputs
+
+
 class FuzzyOverlapInputSpec(BaseInterfaceInputSpec):
     in_ref = InputMultiPath(File(exists=True), mandatory=True,
                             desc='Reference image. Requires the same dimensions as in_tst.')
@@ -22,9 +22,10 @@ import nibabel as nb
 import numpy as np
 from math import floor, ceil
 from scipy.ndimage.morphology import grey_dilation
+from scipy.special import comb
 import scipy.io as sio
 import itertools
-import scipy.stats as stats
+import tempfile
 import warnings
 
 from .. import logging
@@ -33,13 +34,21 @@ from ..interfaces.base import (BaseInterface, traits, TraitedSpec, File,
                                InputMultiPath, OutputMultiPath,
                                BaseInterfaceInputSpec, isdefined,
                                DynamicTraitedSpec, Undefined)
-from ..utils.filemanip import fname_presuffix, split_filename
+from ..utils.filemanip import (fname_presuffix, split_filename,
+                               append_json_line, load_json_lines)
 from nipype.utils import NUMPY_MMAP
 
 from . import confounds
 
 iflogger = logging.getLogger('interface')
 
+# Approximate number of bytes of tissue probability maps normalized at a time
+TPM_BLOCK_BYTES = 64 * 1024 * 1024
+# Approximate number of bytes of image data corrupted with noise at a time
+NOISE_BLOCK_BYTES = 64 * 1024 * 1024
+# Number of timepoints parsed at a time when calculating moments
+MOMENTS_BLOCK_ROWS = 10000
+
 
 class PickAtlasInputSpec(BaseInterfaceInputSpec):
     atlas = File(exists=True, desc="Location of the atlas that will be used.",
@@ -409,31 +418,50 @@ class Matlab2CSV(BaseInterface):
         return outputs
 
 
+def _is_number(value):
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _csv_layout(in_file):
+    """Returns the number of header rows and the numeric columns (None for
+    all of them) of a CSV file, judging from its first two lines"""
+    with open(in_file, 'r') as fid:
+        first = fid.readline().split(',')
+        second = fid.readline().split(',')
+
+    skiprows = 0
+    if not all(_is_number(value) for value in first):
+        skiprows = 1
+        first = second
+    usecols = [idx for idx, value in enumerate(first) if _is_number(value)]
+    if len(usecols) == len(first):
+        usecols = None
+    return skiprows, usecols
+
+
 def merge_csvs(in_list):
+    """Stacks the numeric tables of CSV files along a third axis
+
+    The header row and the label columns (e.g. row headings or an extra
+    field) of each file are detected from its first lines, and the output
+    array is allocated from the shape of the first file and filled in a
+    single pass.
+    """
+    out_array = None
     for idx, in_file in enumerate(in_list):
-        try:
-            in_array = np.loadtxt(in_file, delimiter=',')
-        except ValueError as ex:
-            try:
-                in_array = np.loadtxt(in_file, delimiter=',', skiprows=1)
-            except ValueError as ex:
-                with open(in_file, 'r') as first:
-                    header_line = first.readline()
-
-                header_list = header_line.split(',')
-                n_cols = len(header_list)
-                try:
-                    in_array = np.loadtxt(
-                        in_file, delimiter=',', skiprows=1,
-                        usecols=list(range(1, n_cols))
-                    )
-                except ValueError as ex:
-                    in_array = np.loadtxt(
-                        in_file, delimiter=',', skiprows=1, usecols=list(range(1, n_cols - 1)))
-        if idx == 0:
-            out_array = in_array
-        else:
-            out_array = np.dstack((out_array, in_array))
+        skiprows, usecols = _csv_layout(in_file)
+        in_array = np.atleast_3d(np.loadtxt(
+            in_file, delimiter=',', skiprows=skiprows, usecols=usecols))
+        if out_array is None:
+            out_array = np.empty(in_array.shape[:2] + (len(in_list), ))
+        elif in_array.shape[:2] != out_array.shape[:2]:
+            raise ValueError('%s holds a %s table, expected %s' % (
+                in_file, in_array.shape[:2], out_array.shape[:2]))
+        out_array[:, :, idx] = in_array[:, :, 0]
     out_array = np.squeeze(out_array)
     iflogger.info('Final output array shape:')
     iflogger.info(np.shape(out_array))
@@ -737,6 +765,8 @@ class AddCSVRow(BaseInterface):
         recall that (1) this module is alpha software; and (2) it should be
         installed for thread-safe writing.
         If lockfile is not installed, then the interface is not thread-safe.
+        Every call reads and rewrites the whole file; to aggregate rows from
+        many nodes, prefer :class:`AppendCSVRow` and :class:`CompactCSVRows`.
 
 
     Example
@@ -786,19 +816,7 @@ class AddCSVRow(BaseInterface):
             warn(('Python module lockfile was not found: AddCSVRow will not be'
                   ' thread-safe in multi-processor execution'))
 
-        input_dict = {}
-        for key, val in list(self.inputs._outputs.items()):
-            # expand lists to several columns
-            if key == 'trait_added' and val in self.inputs.copyable_trait_names():
-                continue
-
-            if isinstance(val, list):
-                for i, v in enumerate(val):
-                    input_dict['%s_%d' % (key, i)] = v
-            else:
-                input_dict[key] = val
-
-        df = pd.DataFrame([input_dict])
+        df = pd.DataFrame([_csv_row(self.inputs)])
 
         if self._have_lock:
             self._lock = pl.FileLock(self.inputs.in_file)
@@ -837,6 +855,154 @@ class AddCSVRow(BaseInterface):
         return base
 
 
+def _csv_row(inputs):
+    """Returns the dynamic inputs of an :class:`AddCSVRow`-like interface as
+    a flat dictionary, expanding lists to several columns"""
+    row = {}
+    for key, val in list(inputs._outputs.items()):
+        if key == 'trait_added' and val in inputs.copyable_trait_names():
+            continue
+
+        if isinstance(val, list):
+            for i, v in enumerate(val):
+                row['%s_%d' % (key, i)] = v
+        else:
+            row[key] = val
+    return row
+
+
+def append_csv_row(journal_file, row):
+    """Appends ``row`` (a dictionary) to ``journal_file`` as one line of JSON
+
+    The record is written with a single ``write`` on an ``O_APPEND``
+    descriptor (see :func:`~nipype.utils.filemanip.append_json_line`), so
+    that concurrent writers on a local filesystem never interleave or lose
+    rows and no lock is required. Journals are turned into a table with
+    :func:`compact_csv_rows`.
+
+    """
+    append_json_line(journal_file, row)
+    return journal_file
+
+
+def compact_csv_rows(journal_files, out_file, delimiter=None):
+    """Writes the rows of one or more journals created with
+    :func:`append_csv_row` to ``out_file``
+
+    Columns are the sorted union of all the keys of the rows, and missing
+    values are left empty. The delimiter defaults to a tab for ``.tsv``
+    files and to a comma otherwise. Truncated records are skipped.
+
+    """
+    import csv
+
+    if delimiter is None:
+        delimiter = '\t' if out_file.endswith('.tsv') else ','
+
+    rows = []
+    for journal_file in np.atleast_1d(journal_files).tolist():
+        rows += load_json_lines(journal_file)
+
+    columns = sorted(set(key for row in rows for key in row))
+    with open(out_file, 'w') as fp:
+        writer = csv.DictWriter(fp, columns, delimiter=str(delimiter),
+                                lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+    return out_file
+
+
+class AppendCSVRowInputSpec(AddCSVRowInputSpec):
+    in_file = traits.File(mandatory=True,
+                          desc=('journal file the row is appended to, one '
+                                'JSON record per line'))
+
+
+class AppendCSVRowOutputSpec(TraitedSpec):
+    journal_file = File(desc='journal file containing the rows')
+
+
+class AppendCSVRow(AddCSVRow):
+
+    """Appends a row to a journal file, to be aggregated in a single table
+    with :class:`CompactCSVRows` once all rows have been written
+
+    Unlike :class:`AddCSVRow`, the existing rows are never read or
+    rewritten: each row is appended to the journal in a single atomic
+    write, so that many nodes can add rows concurrently (e.g. with the
+    MultiProc plugin) without locks.
+
+    .. warning:: Appends are atomic on local filesystems. Network
+        filesystems such as NFS do not guarantee ``O_APPEND`` semantics
+        across hosts; give each host its own journal and compact all of
+        them instead.
+
+
+    Example
+    -------
+
+    >>> from nipype.algorithms import misc
+    >>> addrow = misc.AppendCSVRow()
+    >>> addrow.inputs.in_file = 'scores.jsonl'
+    >>> addrow.inputs.si = 0.74
+    >>> addrow.inputs.di = 0.93
+    >>> addrow.inputs.subject_id = 'S400'
+    >>> addrow.inputs.list_of_values = [ 0.4, 0.7, 0.3 ]
+    >>> addrow.run() # doctest: +SKIP
+    """
+    input_spec = AppendCSVRowInputSpec
+    output_spec = AppendCSVRowOutputSpec
+
+    def _run_interface(self, runtime):
+        append_csv_row(self.inputs.in_file, _csv_row(self.inputs))
+        return runtime
+
+    def _list_outputs(self):
+        outputs = self.output_spec().get()
+        outputs['journal_file'] = op.abspath(self.inputs.in_file)
+        return outputs
+
+
+class CompactCSVRowsInputSpec(BaseInterfaceInputSpec):
+    in_files = InputMultiPath(File(exists=True), mandatory=True,
+                              desc='journal files written by AppendCSVRow')
+    out_file = File('rows.csv', usedefault=True,
+                    desc=('output table, tab-separated if the extension is '
+                          '.tsv and comma-separated otherwise'))
+
+
+class CompactCSVRowsOutputSpec(TraitedSpec):
+    csv_file = File(exists=True, desc='table with all the rows')
+
+
+class CompactCSVRows(BaseInterface):
+
+    """Aggregates the rows appended by :class:`AppendCSVRow` into a single
+    CSV (or TSV) file
+
+    Example
+    -------
+
+    >>> from nipype.algorithms import misc
+    >>> compact = misc.CompactCSVRows()
+    >>> compact.inputs.in_files = 'scores.jsonl'
+    >>> compact.inputs.out_file = 'scores.tsv'
+    >>> compact.run() # doctest: +SKIP
+    """
+    input_spec = CompactCSVRowsInputSpec
+    output_spec = CompactCSVRowsOutputSpec
+
+    def _run_interface(self, runtime):
+        compact_csv_rows(self.inputs.in_files,
+                         op.abspath(self.inputs.out_file))
+        return runtime
+
+    def _list_outputs(self):
+        outputs = self.output_spec().get()
+        outputs['csv_file'] = op.abspath(self.inputs.out_file)
+        return outputs
+
+
 class CalculateNormalizedMomentsInputSpec(TraitedSpec):
     timeseries_file = File(
         exists=True, mandatory=True,
@@ -875,24 +1041,93 @@ class CalculateNormalizedMoments(BaseInterface):
 
     def _list_outputs(self):
         outputs = self.output_spec().get()
-        outputs['skewness'] = self._moments
+        outputs['moments'] = np.atleast_1d(self._moments).tolist()
         return outputs
 
 
-def calc_moments(timeseries_file, moment):
+def _central_sums(data, order):
+    """Returns the sample size, mean and sums of the central powers
+    ``1..order`` of ``data`` along its first axis.
+
+    >>> n, mean, sums = _central_sums(np.array([1., 2., 3., 6.]), 3)
+    >>> n, mean, [float(s) for s in sums[1:]]
+    (4, 3.0, [0.0, 14.0, 18.0])
+
+    """
+    n = data.shape[0]
+    mean = data.mean(axis=0)
+    dev = data - mean
+    sums = [None, np.zeros_like(mean)] + [
+        np.sum(dev ** k, axis=0) for k in range(2, order + 1)]
+    return n, mean, sums
+
+
+def _merge_central_sums(first, second, order):
+    """Combines two results of :func:`_central_sums` into the statistics of
+    the pooled sample, using the pairwise update formulas of Chan et al.
+    (1979) generalized to arbitrary orders by Pebay (2008). With one
+    sample at a time this reduces to Welford's online algorithm.
+    """
+    na, mean_a, sums_a = first
+    nb, mean_b, sums_b = second
+    if na == 0:
+        return second
+    if nb == 0:
+        return first
+
+    n = na + nb
+    delta = mean_b - mean_a
+    sums = [None, np.zeros_like(delta)]
+    for p in range(2, order + 1):
+        value = sums_a[p] + sums_b[p]
+        for k in range(1, p - 1):
+            value = value + comb(p, k, exact=True) * delta ** k * (
+                (-nb / n) ** k * sums_a[p - k] + (na / n) ** k * sums_b[p - k])
+        value = value + (na * nb * delta / n) ** p * (
+            1.0 / nb ** (p - 1) - (-1.0 / na) ** (p - 1))
+        sums.append(value)
+    return n, mean_a + delta * nb / n, sums
+
+
+def calc_moments(timeseries_file, moment, block_rows=None):
     """Returns nth moment (3 for skewness, 4 for kurtosis) of timeseries
     (list of values; one per timeseries).
 
+    The file is parsed ``block_rows`` timepoints at a time and the moments
+    are accumulated online, so only one block is held in memory.
+
     Keyword arguments:
     timeseries_file -- text file with white space separated timepoints in rows
 
     """
-    timeseries = np.genfromtxt(timeseries_file)
-
-    m2 = stats.moment(timeseries, 2, axis=0)
-    m3 = stats.moment(timeseries, moment, axis=0)
+    if block_rows is None:
+        block_rows = MOMENTS_BLOCK_ROWS
+    order = max(2, moment)
+
+    ncols = None
+    acc = (0, None, None)
+    with open(timeseries_file) as fp:
+        while True:
+            lines = list(itertools.islice(fp, block_rows))
+            if not lines:
+                break
+            lines = [line for line in lines if line.split('#')[0].strip()]
+            if not lines:
+                continue
+            if ncols is None:
+                ncols = len(lines[0].split('#')[0].split())
+            block = np.genfromtxt(lines).reshape(-1, ncols)
+            acc = _merge_central_sums(acc, _central_sums(block, order), order)
+
+    n, _, sums = acc
+    m2 = sums[2] / n
+    mn = sums[moment] / n
     zero = (m2 == 0)
-    return np.where(zero, 0, m3 / m2 ** (moment / 2.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(zero, 0, mn / m2 ** (moment / 2.0))
+    if ncols == 1:
+        result = result.reshape(())
+    return result
 
 
 class AddNoiseInputSpec(TraitedSpec):
@@ -906,6 +1141,8 @@ class AddNoiseInputSpec(TraitedSpec):
     bg_dist = traits.Enum('normal', 'rayleigh', usedefault=True, mandatory=True,
                           desc=('desired noise distribution, currently '
                                 'only normal is implemented'))
+    seed = traits.Int(desc=('seed of the random number generators, set for '
+                            'reproducible noise'))
     out_file = File(desc='desired output filename')
 
 
@@ -917,6 +1154,10 @@ class AddNoise(BaseInterface):
     """
     Corrupts with noise the input image
 
+    The image is processed in blocks of slices (3D) or volumes (4D), and the
+    noise of each slice or volume is drawn from its own generator seeded
+    from ``seed`` and its index, so that results are reproducible.
+
 
     Example
     -------
@@ -932,19 +1173,31 @@ class AddNoise(BaseInterface):
     output_spec = AddNoiseOutputSpec
 
     def _run_interface(self, runtime):
-        in_image = nb.load(self.inputs.in_file)
-        in_data = in_image.get_data()
-        snr = self.inputs.snr
+        in_image = nb.load(self.inputs.in_file, mmap=NUMPY_MMAP)
+        out_file = self._gen_output_filename()
 
+        in_mask = None
         if isdefined(self.inputs.in_mask):
-            in_mask = nb.load(self.inputs.in_mask).get_data()
-        else:
-            in_mask = np.ones_like(in_data)
+            in_mask = nb.load(self.inputs.in_mask, mmap=NUMPY_MMAP).dataobj
+
+        seed = None
+        if isdefined(self.inputs.seed):
+            seed = self.inputs.seed
 
-        result = self.gen_noise(in_data, mask=in_mask, snr_db=snr,
-                                dist=self.inputs.dist, bg_dist=self.inputs.bg_dist)
-        res_im = nb.Nifti1Image(result, in_image.affine, in_image.header)
-        res_im.to_filename(self._gen_output_filename())
+        buffername, result = _scratch_memmap(
+            out_file, in_image.shape,
+            np.result_type(in_image.get_data_dtype(), np.float32))
+        try:
+            add_noise(in_image.dataobj, result, mask=in_mask,
+                      snr_db=self.inputs.snr, dist=self.inputs.dist,
+                      bg_dist=self.inputs.bg_dist, seed=seed)
+
+            res_im = nb.Nifti1Image(result, in_image.affine, in_image.header)
+            res_im.to_filename(out_file)
+            del res_im
+        finally:
+            del result
+            os.remove(buffername)
         return runtime
 
     def _gen_output_filename(self):
@@ -961,48 +1214,101 @@ class AddNoise(BaseInterface):
         outputs['out_file'] = self._gen_output_filename()
         return outputs
 
-    def gen_noise(self, image, mask=None, snr_db=10.0, dist='normal', bg_dist='normal'):
+    def gen_noise(self, image, mask=None, snr_db=10.0, dist='normal',
+                  bg_dist='normal', seed=None):
         """
         Generates a copy of an image with a certain amount of
         added gaussian noise (rayleigh for background in mask)
         """
-        from math import sqrt
-        snr = sqrt(np.power(10.0, snr_db / 10.0))
+        result = np.empty(image.shape, dtype=np.float64)
+        return add_noise(image, result, mask=mask, snr_db=snr_db, dist=dist,
+                         bg_dist=bg_dist, seed=seed)
 
-        if mask is None:
-            mask = np.ones_like(image)
-        else:
-            mask[mask > 0] = 1
-            mask[mask < 1] = 0
 
-            if mask.ndim < image.ndim:
-                mask = np.rollaxis(np.array([mask] * image.shape[3]), 0, 4)
+def _iter_noise_blocks(image, mask=None, block_bytes=None):
+    """Iterate over an image in blocks along its last axis
 
-        signal = image[mask > 0].reshape(-1)
+    Yields ``(start, stop, data, mask)`` where ``data`` is
+    ``image[..., start:stop]`` as float64 and ``mask`` is the matching
+    boolean foreground (a single volume mask is broadcast to 4D images).
+
+    """
+    if block_bytes is None:
+        block_bytes = NOISE_BLOCK_BYTES
+
+    nunits = image.shape[-1]
+    unit_bytes = 8 * int(np.prod(image.shape[:-1]))
+    step = max(1, int(block_bytes // max(1, unit_bytes)))
+
+    vol_mask = None
+    if mask is None:
+        vol_mask = np.ones(image.shape[:-1] + (1, ), dtype=bool)
+    elif len(mask.shape) < len(image.shape):
+        vol_mask = (np.asarray(mask) > 0)[..., np.newaxis]
+
+    for start in range(0, nunits, step):
+        stop = min(start + step, nunits)
+        data = np.asarray(image[..., start:stop]).astype(np.float64)
+        if vol_mask is not None:
+            msk = np.broadcast_to(vol_mask, data.shape)
+        else:
+            msk = np.asarray(mask[..., start:stop]) > 0
+        yield start, stop, data, msk
 
-        if dist == 'normal':
-            signal = signal - signal.mean()
-            sigma_n = sqrt(signal.var() / snr)
-            noise = np.random.normal(size=image.shape, scale=sigma_n)
 
-            if (np.any(mask == 0)) and (bg_dist == 'rayleigh'):
-                bg_noise = np.random.rayleigh(size=image.shape, scale=sigma_n)
-                noise[mask == 0] = bg_noise[mask == 0]
+def add_noise(image, out, mask=None, snr_db=10.0, dist='normal',
+              bg_dist='normal', seed=None, block_bytes=None):
+    """
+    Writes into ``out`` a copy of ``image`` with a certain amount of added
+    gaussian (``dist='normal'``) or rician noise, and returns ``out``.
 
-            im_noise = image + noise
+    ``image`` may be an array proxy: it is read in blocks twice, first to
+    accumulate the foreground signal statistics and then to add the noise.
+    The noise of each slice along the last axis is drawn from a
+    ``RandomState`` seeded with ``[seed, index]``, so results do not depend
+    on ``block_bytes``. If ``seed`` is None, it is drawn from ``np.random``.
 
-        elif dist == 'rician':
-            sigma_n = signal.mean() / snr
-            n_1 = np.random.normal(size=image.shape, scale=sigma_n)
-            n_2 = np.random.normal(size=image.shape, scale=sigma_n)
-            stde_1 = n_1 / sqrt(2.0)
-            stde_2 = n_2 / sqrt(2.0)
-            im_noise = np.sqrt((image + stde_1)**2 + (stde_2)**2)
-        else:
-            raise NotImplementedError(('Only normal and rician distributions '
-                                       'are supported'))
+    """
+    from math import sqrt
+    snr = sqrt(np.power(10.0, snr_db / 10.0))
+
+    if dist not in ('normal', 'rician'):
+        raise NotImplementedError(('Only normal and rician distributions '
+                                   'are supported'))
+
+    if seed is None:
+        seed = np.random.randint(np.iinfo(np.int32).max)
+
+    acc = (0, None, None)
+    for _, _, data, msk in _iter_noise_blocks(image, mask, block_bytes):
+        if np.any(msk):
+            acc = _merge_central_sums(acc, _central_sums(data[msk], 2), 2)
+    count, mean, sums = acc
+    if dist == 'normal':
+        sigma_n = sqrt(sums[2] / count / snr)
+    else:
+        sigma_n = mean / snr
+
+    for start, stop, data, msk in _iter_noise_blocks(image, mask,
+                                                     block_bytes):
+        for i in range(stop - start):
+            rng = np.random.RandomState([seed, start + i])
+            unit = data[..., i]
+            if dist == 'normal':
+                noise = rng.normal(size=unit.shape, scale=sigma_n)
+                bg = ~msk[..., i]
+                if bg_dist == 'rayleigh' and np.any(bg):
+                    noise[bg] = rng.rayleigh(size=unit.shape,
+                                             scale=sigma_n)[bg]
+                unit += noise
+            else:
+                stde_1 = rng.normal(size=unit.shape, scale=sigma_n) / sqrt(2.0)
+                stde_2 = rng.normal(size=unit.shape, scale=sigma_n) / sqrt(2.0)
+                unit += stde_1
+                data[..., i] = np.sqrt(unit ** 2 + stde_2 ** 2)
+        out[..., start:stop] = data
 
-        return im_noise
+    return out
 
 
 class NormalizeProbabilityMapSetInputSpec(TraitedSpec):
@@ -1058,6 +1364,10 @@ class SplitROIsInputSpec(TraitedSpec):
     in_mask = File(exists=True, desc='only process files inside mask')
     roi_size = traits.Tuple(traits.Int, traits.Int, traits.Int,
                             desc='desired ROI size')
+    storage = traits.Enum('files', 'memmap', usedefault=True,
+                          desc=('write one NIfTI file per ROI (files) or '
+                                'a single memory-mappable chunk store '
+                                '(memmap)'))
 
 
 class SplitROIsOutputSpec(TraitedSpec):
@@ -1074,6 +1384,12 @@ class SplitROIs(BaseInterface):
     Splits a 3D image in small chunks to enable parallel processing.
     ROIs keep time series structure in 4D images.
 
+    By default, every ROI is written to its own NIfTI file. Setting
+    ``storage = 'memmap'`` writes all ROIs into a single uncompressed
+    array that can be memory-mapped, with an index table as the only
+    ``out_index`` (padding voxels are marked with -1 in the index table,
+    so no masks are generated).
+
     Example
     -------
 
@@ -1098,7 +1414,7 @@ class SplitROIs(BaseInterface):
             roisize = self.inputs.roi_size
 
         res = split_rois(self.inputs.in_file,
-                         mask, roisize)
+                         mask, roisize, storage=self.inputs.storage)
         self._outnames['out_files'] = res[0]
         self._outnames['out_masks'] = res[1]
         self._outnames['out_index'] = res[2]
@@ -1155,18 +1471,27 @@ class MergeROIs(BaseInterface):
         return outputs
 
 
-def normalize_tpms(in_files, in_mask=None, out_files=[]):
+def normalize_tpms(in_files, in_mask=None, out_files=None, block_bytes=None):
     """
     Returns the input tissue probability maps (tpms, aka volume fractions)
     normalized to sum up 1.0 at each voxel within the mask.
+
+    Maps are processed in slabs along the third axis, so that at most
+    about ``block_bytes`` of image data (float32, all classes) are held in
+    memory at a time. Normalized slabs are written into memory-mapped
+    buffers that are then saved to ``out_files``.
+
     """
     import nibabel as nb
     import numpy as np
+    import os
     import os.path as op
 
     in_files = np.atleast_1d(in_files).tolist()
+    out_files = list(out_files or [])
 
     if len(out_files) != len(in_files):
+        out_files = []
         for i, finname in enumerate(in_files):
             fname, fext = op.splitext(op.basename(finname))
             if fext == '.gz':
@@ -1185,39 +1510,82 @@ def normalize_tpms(in_files, in_mask=None, out_files=[]):
         hdr['data_type'] = 16
         hdr.set_data_dtype(np.float32)
         nb.save(nb.Nifti1Image(img_data.astype(np.float32), imgs[0].affine,
-                                 hdr), out_files[0])
+                               hdr), out_files[0])
         return out_files[0]
 
-    img_data = np.array([im.get_data() for im in imgs]).astype(np.float32)
-    # img_data[img_data>1.0] = 1.0
-    img_data[img_data < 0.0] = 0.0
-    weights = np.sum(img_data, axis=0)
+    if block_bytes is None:
+        block_bytes = TPM_BLOCK_BYTES
 
-    msk = np.ones_like(imgs[0].get_data())
-    msk[weights <= 0] = 0
+    shape = imgs[0].shape
+    nslices = shape[2]
+    slice_bytes = 4 * len(imgs) * int(np.prod(shape[:2] + shape[3:]))
+    step = max(1, int(block_bytes // max(1, slice_bytes)))
 
+    msk = None
     if in_mask is not None:
-        msk = nb.load(in_mask, mmap=NUMPY_MMAP).get_data()
-        msk[msk <= 0] = 0
-        msk[msk > 0] = 1
+        msk = nb.load(in_mask, mmap=NUMPY_MMAP).dataobj
+
+    buffers = []
+    try:
+        for out_file in out_files:
+            buffers.append(_scratch_memmap(out_file, shape, np.float32))
+
+        for z0 in range(0, nslices, step):
+            z1 = min(z0 + step, nslices)
+            slab = np.empty((len(imgs), ) + shape[:2] + (z1 - z0, ) +
+                            shape[3:], dtype=np.float32)
+            for i, im in enumerate(imgs):
+                slab[i] = im.dataobj[:, :, z0:z1]
+            np.maximum(slab, 0.0, out=slab)
+
+            weights = slab.sum(axis=0)
+            valid = weights > 0
+            if msk is not None:
+                valid &= np.asarray(msk[:, :, z0:z1]) > 0
+            np.divide(slab, weights, out=slab, where=valid)
+            slab[:, ~valid] = 0.0
+
+            for i, (_, data) in enumerate(buffers):
+                data[:, :, z0:z1] = slab[i]
+
+        for im, out_file, (_, data) in zip(imgs, out_files, buffers):
+            hdr = im.header.copy()
+            hdr['data_type'] = 16
+            hdr.set_data_dtype('float32')
+            nb.save(nb.Nifti1Image(data, im.affine, hdr), out_file)
+    finally:
+        buffernames = [buffername for buffername, _ in buffers]
+        del buffers[:]
+        data = None
+        for buffername in buffernames:
+            os.remove(buffername)
 
-    msk = np.ma.masked_equal(msk, 0)
+    return out_files
 
-    for i, out_file in enumerate(out_files):
-        data = np.ma.masked_equal(img_data[i], 0)
-        probmap = data / weights
-        hdr = imgs[i].header.copy()
-        hdr['data_type'] = 16
-        hdr.set_data_dtype('float32')
-        nb.save(nb.Nifti1Image(probmap.astype(np.float32), imgs[i].affine,
-                                 hdr), out_file)
 
-    return out_files
+def _scratch_memmap(out_file, shape, dtype):
+    """Creates a uniquely named, hidden ``.npy`` memmap next to ``out_file``
+
+    Returns the file name, which the caller removes, and the array.
+    """
+    fd, buffername = tempfile.mkstemp(
+        dir=op.dirname(op.abspath(out_file)), suffix='.npy',
+        prefix='.%s_' % split_filename(out_file)[1])
+    os.close(fd)
+    return buffername, np.lib.format.open_memmap(
+        buffername, mode='w+', dtype=dtype, shape=shape, fortran_order=True)
 
 
-def split_rois(in_file, mask=None, roishape=None):
+def split_rois(in_file, mask=None, roishape=None, storage='files'):
     """
     Splits an image in ROIs for parallel processing
+
+    With ``storage='files'`` every ROI is written as a separate NIfTI file
+    with its own ``.npz`` index file and mask. With ``storage='memmap'`` all
+    ROIs are written to a single uncompressed ``.npy`` array of shape
+    (ROIs, voxels per ROI, volumes), which can be memory-mapped by the
+    consumers, along with an index table of the same first two dimensions
+    holding the original (flat) voxel locations, padded with -1.
     """
     import nibabel as nb
     import numpy as np
@@ -1250,6 +1618,19 @@ def split_rois(in_file, mask=None, roishape=None):
     data = np.squeeze(data.take(nzels, axis=0))
     nvols = data.shape[-1]
 
+    if storage == 'memmap':
+        out_file = op.abspath('rois.npy')
+        out_idx = op.abspath('rois_idx.npy')
+        store = np.lib.format.open_memmap(
+            out_file, mode='w+', dtype=data.dtype,
+            shape=(nrois, roisize, nvols))
+        store.reshape((-1, nvols))[:els] = data.reshape((els, nvols))
+        del store
+        index = np.full((nrois * roisize, ), -1, dtype=np.int64)
+        index[:els] = nzels[0]
+        np.save(out_idx, index.reshape((nrois, roisize)))
+        return [out_file], [], [out_idx]
+
     roidefname = op.abspath('onesmask.nii.gz')
     nb.Nifti1Image(np.ones(roishape, dtype=np.uint8), None,
                    None).to_filename(roidefname)
@@ -1290,15 +1671,45 @@ def split_rois(in_file, mask=None, roishape=None):
     return out_files, out_mask, out_idxs
 
 
+def _iter_roi_chunks(in_files, in_idxs):
+    """
+    Yields ``(indices, data)`` for every chunk written by :func:`split_rois`,
+    where ``data`` is a (voxels, volumes) array
+    """
+    import nibabel as nb
+    import numpy as np
+
+    for cname, iname in zip(in_files, in_idxs):
+        if cname.endswith('.npy'):
+            store = np.load(cname, mmap_mode='r')
+            index = np.load(iname, mmap_mode='r')
+            for cdata, idxs in zip(store, index):
+                nels = np.count_nonzero(idxs >= 0)
+                yield idxs[:nels], cdata[:nels]
+            continue
+
+        f = np.load(iname)
+        idxs = np.atleast_1d(np.squeeze(f['arr_0']))
+        cdata = nb.load(cname, mmap=NUMPY_MMAP).get_data()
+        cdata = cdata.reshape((-1, cdata.shape[-1] if cdata.ndim == 4 else 1))
+        yield idxs, cdata[:len(idxs)]
+
+
 def merge_rois(in_files, in_idxs, in_ref,
                dtype=None, out_file=None):
     """
     Re-builds an image resulting from a parallelized processing
+
+    The chunks may be either the per-ROI NIfTI files and ``.npz`` indices,
+    or a chunk store and index table (``.npy``), as written by
+    :func:`split_rois`. Every chunk is read only once. Results with 300 or
+    more volumes are assembled in a memory-mapped buffer next to the output
+    file, so that memory usage does not grow with the number of volumes.
     """
     import nibabel as nb
     import numpy as np
+    import os
     import os.path as op
-    import subprocess as sp
 
     if out_file is None:
         out_file = op.abspath('merged.nii.gz')
@@ -1306,77 +1717,44 @@ def merge_rois(in_files, in_idxs, in_ref,
     if dtype is None:
         dtype = np.float32
 
-    # if file is compressed, uncompress using os
-    # to avoid memory errors
-    if op.splitext(in_ref)[1] == '.gz':
-        try:
-            iflogger.info('uncompress %i' % in_ref)
-            sp.check_call(['gunzip', in_ref], stdout=sp.PIPE, shell=True)
-            in_ref = op.splitext(in_ref)[0]
-        except:
-            pass
-
+    # only the header of the reference is read
     ref = nb.load(in_ref, mmap=NUMPY_MMAP)
     aff = ref.affine
     hdr = ref.header.copy()
     rsh = ref.shape
     del ref
-    npix = rsh[0] * rsh[1] * rsh[2]
-    fcdata = nb.load(in_files[0]).get_data()
 
-    if fcdata.ndim == 4:
-        ndirs = fcdata.shape[-1]
+    if in_files[0].endswith('.npy'):
+        ndirs = np.load(in_files[0], mmap_mode='r').shape[-1]
     else:
-        ndirs = 1
+        fcshape = nb.load(in_files[0]).shape
+        ndirs = fcshape[-1] if len(fcshape) == 4 else 1
     newshape = (rsh[0], rsh[1], rsh[2], ndirs)
     hdr.set_data_dtype(dtype)
     hdr.set_xyzt_units('mm', 'sec')
+    hdr.set_data_shape(newshape)
 
+    buffername = None
     if ndirs < 300:
-        data = np.zeros((npix, ndirs))
-        for cname, iname in zip(in_files, in_idxs):
-            f = np.load(iname)
-            idxs = np.squeeze(f['arr_0'])
-            cdata = nb.load(cname, mmap=NUMPY_MMAP).get_data().reshape(-1, ndirs)
-            nels = len(idxs)
-            idata = (idxs, )
+        data = np.zeros(newshape, dtype=dtype, order='F')
+    else:
+        buffername, data = _scratch_memmap(out_file, newshape, dtype)
+
+    try:
+        for idxs, cdata in _iter_roi_chunks(in_files, in_idxs):
             try:
-                data[idata, ...] = cdata[0:nels, ...]
+                data[np.unravel_index(idxs, rsh[:3])] = cdata
             except:
                 print(('Consistency between indexes and chunks was '
                        'lost: data=%s, chunk=%s') % (str(data.shape),
                                                      str(cdata.shape)))
                 raise
 
-        hdr.set_data_shape(newshape)
-        nb.Nifti1Image(data.reshape(newshape).astype(dtype),
-                       aff, hdr).to_filename(out_file)
-
-    else:
-        hdr.set_data_shape(rsh[:3])
-        nii = []
-        for d in range(ndirs):
-            fname = op.abspath('vol%06d.nii' % d)
-            nb.Nifti1Image(np.zeros(rsh[:3]), aff, hdr).to_filename(fname)
-            nii.append(fname)
-
-        for cname, iname in zip(in_files, in_idxs):
-            f = np.load(iname)
-            idxs = np.squeeze(f['arr_0'])
-
-            for d, fname in enumerate(nii):
-                data = nb.load(fname, mmap=NUMPY_MMAP).get_data().reshape(-1)
-                cdata = nb.load(cname, mmap=NUMPY_MMAP).get_data().reshape(-1, ndirs)[:, d]
-                nels = len(idxs)
-                idata = (idxs, )
-                data[idata] = cdata[0:nels]
-                nb.Nifti1Image(data.reshape(rsh[:3]),
-                               aff, hdr).to_filename(fname)
-
-        imgs = [nb.load(im, mmap=NUMPY_MMAP) for im in nii]
-        allim = nb.concat_images(imgs)
-        allim.to_filename(out_file)
-
+        nb.Nifti1Image(data, aff, hdr).to_filename(out_file)
+    finally:
+        del data
+        if buffername is not None:
+            os.remove(buffername)
     return out_file
 
 
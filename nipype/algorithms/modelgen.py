@@ -22,10 +22,13 @@ from __future__ import print_function, division, unicode_literals, absolute_impo
 from builtins import range, str, bytes, int
 
 from copy import deepcopy
+import hashlib
+from io import BytesIO
 import os
 
 from nibabel import load
 import numpy as np
+from scipy.signal import fftconvolve
 from scipy.special import gammaln
 
 from ..utils import NUMPY_MMAP
@@ -56,6 +59,12 @@ def gcd(a, b):
     return a
 
 
+# Kernels computed by spm_hrf, indexed by their parameters
+_HRF_CACHE = {}
+# Arrays parsed by read_event_file, indexed by the SHA1 of the file contents
+_EVENT_CACHE = {}
+
+
 def spm_hrf(RT, P=None, fMRI_T=16):
     """ python implementation of spm_hrf
 
@@ -94,6 +103,14 @@ def spm_hrf(RT, P=None, fMRI_T=16):
     if P is not None:
         p[0:len(P)] = P
 
+    key = (float(RT), tuple(p), fMRI_T)
+    if key not in _HRF_CACHE:
+        _HRF_CACHE[key] = _spm_hrf(RT, p, fMRI_T)
+    return _HRF_CACHE[key].copy()
+
+
+def _spm_hrf(RT, p, fMRI_T):
+    """Computes the kernel returned by :func:`spm_hrf`"""
     _spm_Gpdf = lambda x, h, l: np.exp(h * np.log(l) + (h - 1) * np.log(x) - (l * x) - gammaln(h))
     # modelled hemodynamic response function - {mixture of Gammas}
     dt = RT / float(fMRI_T)
@@ -147,10 +164,36 @@ def scale_timings(timelist, input_units, output_units, time_repetition):
 
     if (input_units == 'secs') and (output_units == 'scans'):
         _scalefactor = 1. / time_repetition
-    timelist = [np.max([0., _scalefactor * t]) for t in timelist]
+    timelist = np.maximum(0., _scalefactor *
+                          np.array(timelist, dtype=float)).tolist()
     return timelist
 
 
+def read_event_file(event_file):
+    """Reads a 1, 2 or 3 column event file into a (events x columns) array
+
+    Parsed files are memoized on their contents, so that the same event
+    files shared by many sessions or model variants are parsed only once.
+    The returned array is read-only.
+
+    """
+    with open(event_file, 'rb') as fp:
+        content = fp.read()
+    key = hashlib.sha1(content).hexdigest()
+    if key not in _EVENT_CACHE:
+        lines = [line.split() for line in content.splitlines()
+                 if line.strip()]
+        if lines and b'#' not in content and \
+                all(len(line) == len(lines[0]) for line in lines):
+            event_info = np.array(content.split(), dtype=float).reshape(
+                (len(lines), len(lines[0])))
+        else:
+            event_info = np.loadtxt(BytesIO(content), ndmin=2)
+        event_info.setflags(write=False)
+        _EVENT_CACHE[key] = event_info
+    return _EVENT_CACHE[key]
+
+
 def gen_info(run_event_files):
     """Generate subject_info structure from a list of event files
     """
@@ -165,7 +208,7 @@ def gen_info(run_event_files):
                 name, _ = name.split('.txt')
 
             runinfo.conditions.append(name)
-            event_info = np.atleast_2d(np.loadtxt(event_file))
+            event_info = read_event_file(event_file)
             runinfo.onsets.append(event_info[:, 0].tolist())
             if event_info.shape[1] > 1:
                 runinfo.durations.append(event_info[:, 1].tolist())
@@ -175,7 +218,10 @@ def gen_info(run_event_files):
             if event_info.shape[1] > 2:
                 runinfo.amplitudes.append(event_info[:, 2].tolist())
             else:
-                delattr(runinfo, 'amplitudes')
+                runinfo.amplitudes.append(None)
+        # Amplitudes are only given if all conditions have them
+        if None in runinfo.amplitudes:
+            delattr(runinfo, 'amplitudes')
         info.append(runinfo)
     return info
 
@@ -690,7 +736,6 @@ durations=[[1]])
         npts = int(np.ceil(total_time / dt))
         times = np.arange(0, total_time, dt) * 1e-3
         timeline = np.zeros((npts))
-        timeline2 = np.zeros((npts))
         if isdefined(self.inputs.model_hrf) and self.inputs.model_hrf:
             hrf = spm_hrf(dt * 1e-3)
         reg_scale = 1.0
@@ -709,34 +754,35 @@ durations=[[1]])
                                                                 response.max()))
             iflogger.info('reg_scale: %.4f' % reg_scale)
 
-        for i, t in enumerate(onsets):
-            idx = int(np.round(t / dt))
-            if i_amplitudes:
-                if len(i_amplitudes) > 1:
-                    timeline2[idx] = i_amplitudes[i]
-                else:
-                    timeline2[idx] = i_amplitudes[0]
+        idx = np.round(onsets / dt).astype(int)
+        if i_amplitudes:
+            if len(i_amplitudes) > 1:
+                amplitudes = np.array(i_amplitudes, dtype=float)
             else:
-                timeline2[idx] = 1
-
-            if bplot:
-                plt.subplot(4, 1, 1)
-                plt.plot(times, timeline2)
+                amplitudes = i_amplitudes[0] * np.ones(len(onsets))
+        else:
+            amplitudes = np.ones(len(onsets))
 
-            if not self.inputs.stimuli_as_impulses:
-                if durations[i] == 0:
-                    durations[i] = TA * nvol
-                stimdur = np.ones((int(durations[i] / dt)))
-                timeline2 = np.convolve(timeline2, stimdur)[0:len(timeline2)]
-            timeline += timeline2
-            timeline2[:] = 0
+        if self.inputs.stimuli_as_impulses:
+            np.add.at(timeline, idx, amplitudes)
+        else:
+            durations[durations == 0] = TA * nvol
+            # Boxcars are accumulated as steps up at the onsets and steps
+            # down at the offsets
+            offsets = np.minimum(idx + (durations / dt).astype(int), npts)
+            steps = np.zeros(npts + 1)
+            np.add.at(steps, idx, amplitudes)
+            np.add.at(steps, offsets, -amplitudes)
+            timeline = np.cumsum(steps)[:npts]
 
         if bplot:
+            plt.subplot(4, 1, 1)
+            plt.plot(times, timeline)
             plt.subplot(4, 1, 2)
             plt.plot(times, timeline)
 
         if isdefined(self.inputs.model_hrf) and self.inputs.model_hrf:
-            timeline = np.convolve(timeline, hrf)[0:len(timeline)]
+            timeline = fftconvolve(timeline, hrf)[0:len(timeline)]
             if isdefined(self.inputs.use_temporal_deriv) and \
                     self.inputs.use_temporal_deriv:
                 # create temporal deriv
@@ -749,17 +795,19 @@ durations=[[1]])
                     self.inputs.use_temporal_deriv:
                 plt.plot(times, timederiv)
         # sample timeline
-        timeline2 = np.zeros((npts))
-        reg = []
+        scans = np.arange(nscans)
+        scanstart = ((SCANONSET + (scans / nvol) * TR + (scans % nvol) * TA) /
+                     dt).astype(int)
+        scanidx = scanstart[:, np.newaxis] + np.arange(int(TA / dt))
+        reg = (np.mean(timeline[scanidx], axis=1) * reg_scale).tolist()
         regderiv = []
-        for i, trial in enumerate(np.arange(nscans) / nvol):
-            scanstart = int((SCANONSET + trial * TR + (i % nvol) * TA) / dt)
-            scanidx = scanstart + np.arange(int(TA / dt))
+        if isdefined(self.inputs.use_temporal_deriv) and \
+                self.inputs.use_temporal_deriv:
+            regderiv = (np.mean(timederiv[scanidx], axis=1) *
+                        reg_scale).tolist()
+        if bplot:
+            timeline2 = np.zeros((npts))
             timeline2[scanidx] = np.max(timeline)
-            reg.insert(i, np.mean(timeline[scanidx]) * reg_scale)
-            if isdefined(self.inputs.use_temporal_deriv) and \
-                    self.inputs.use_temporal_deriv:
-                regderiv.insert(i, np.mean(timederiv[scanidx]) * reg_scale)
 
         if isdefined(self.inputs.use_temporal_deriv) and \
                 self.inputs.use_temporal_deriv:
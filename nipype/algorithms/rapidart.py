@@ -38,6 +38,9 @@ from ..utils.misc import find_indices, normalize_mc_params
 from .. import logging, config
 iflogger = logging.getLogger('interface')
 
+# Approximate number of bytes of image data read per block of volumes
+ART_BLOCK_BYTES = 64 * 1024 * 1024
+
 
 def _get_affine_matrix(params, source):
     """Return affine matrix given a set of translation and rotation parameters
@@ -144,12 +147,35 @@ def _nanmean(a, axis=None):
     1.5
 
     """
-    if axis:
+    if axis is not None:
         return np.nansum(a, axis) / np.sum(1 - np.isnan(a), axis)
     else:
         return np.nansum(a) / np.sum(1 - np.isnan(a))
 
 
+def _iter_volume_blocks(data, block_bytes=None):
+    """Iterate over a 4D array in contiguous blocks of volumes
+
+    Yields ``(start, stop, block)`` where ``block`` holds
+    ``data[:, :, :, start:stop]`` reshaped to (voxels, volumes) in Fortran
+    order, so that memory-mapped NIfTI data are read in contiguous slabs.
+
+    >>> data = np.arange(24).reshape((2, 2, 2, 3), order='F')
+    >>> [(t0, t1, b.shape) for t0, t1, b in _iter_volume_blocks(data, 64)]
+    [(0, 1, (8, 1)), (1, 2, (8, 1)), (2, 3, (8, 1))]
+
+    """
+    if block_bytes is None:
+        block_bytes = ART_BLOCK_BYTES
+    nvox = int(np.prod(data.shape[:3]))
+    timepoints = data.shape[3]
+    step = max(1, int(block_bytes // max(1, nvox * data.dtype.itemsize)))
+    for start in range(0, timepoints, step):
+        stop = min(start + step, timepoints)
+        block = np.asarray(data[:, :, :, start:stop])
+        yield start, stop, block.reshape((nvox, stop - start), order='F')
+
+
 class ArtifactDetectInputSpec(BaseInterfaceInputSpec):
     realigned_files = InputMultiPath(File(exists=True),
                                      desc="Names of realigned functional data files",
@@ -369,28 +395,27 @@ class ArtifactDetect(BaseInterface):
             iflogger.debug('art: using spm global')
             intersect_mask = self.inputs.intersect_mask
             if intersect_mask:
-                mask = np.ones((x, y, z), dtype=bool)
-                for t0 in range(timepoints):
-                    vol = data[:, :, :, t0]
+                maskvec = np.ones(x * y * z, dtype=bool)
+                for _, _, block in _iter_volume_blocks(data):
                     # Use an SPM like approach
-                    mask_tmp = vol > \
-                        (_nanmean(vol) / self.inputs.global_threshold)
-                    mask = mask * mask_tmp
-                for t0 in range(timepoints):
-                    vol = data[:, :, :, t0]
-                    g[t0] = _nanmean(vol[mask])
+                    thresh = _nanmean(block, 0) / self.inputs.global_threshold
+                    maskvec &= np.all(block > thresh, axis=1)
+                mask = maskvec.reshape((x, y, z), order='F')
+                for t0, t1, block in _iter_volume_blocks(data):
+                    g[t0:t1, 0] = _nanmean(block[maskvec], 0)
                 if len(find_indices(mask)) < (np.prod((x, y, z)) / 10):
                     intersect_mask = False
                     g = np.zeros((timepoints, 1))
             if not intersect_mask:
                 iflogger.info('not intersect_mask is True')
-                mask = np.zeros((x, y, z, timepoints))
-                for t0 in range(timepoints):
-                    vol = data[:, :, :, t0]
-                    mask_tmp = vol > \
-                        (_nanmean(vol) / self.inputs.global_threshold)
-                    mask[:, :, :, t0] = mask_tmp
-                    g[t0] = np.nansum(vol * mask_tmp) / np.nansum(mask_tmp)
+                mask = np.zeros((x, y, z, timepoints), dtype=bool)
+                for t0, t1, block in _iter_volume_blocks(data):
+                    thresh = _nanmean(block, 0) / self.inputs.global_threshold
+                    mask_tmp = block > thresh
+                    mask[:, :, :, t0:t1] = mask_tmp.reshape(
+                        (x, y, z, t1 - t0), order='F')
+                    g[t0:t1, 0] = (np.nansum(np.where(mask_tmp, block, 0), 0) /
+                                   np.sum(mask_tmp, 0))
         elif masktype == 'file':  # uses a mask image to determine intensity
             maskimg = load(self.inputs.mask_file, mmap=NUMPY_MMAP)
             mask = maskimg.get_data()
@@ -400,10 +425,12 @@ class ArtifactDetect(BaseInterface):
                 vol = data[:, :, :, t0]
                 g[t0] = _nanmean(vol[mask])
         elif masktype == 'thresh':  # uses a fixed signal threshold
-            for t0 in range(timepoints):
-                vol = data[:, :, :, t0]
-                mask = vol > self.inputs.mask_threshold
-                g[t0] = _nanmean(vol[mask])
+            for t0, t1, block in _iter_volume_blocks(data):
+                mask_tmp = block > self.inputs.mask_threshold
+                g[t0:t1, 0] = (np.nansum(np.where(mask_tmp, block, 0), 0) /
+                               np.sum(mask_tmp, 0))
+            # the reported mask is the one of the last volume
+            mask = mask_tmp[:, -1].reshape((x, y, z), order='F')
         else:
             mask = np.ones((x, y, z))
             g = _nanmean(data[mask > 0, :], 1)
@@ -0,0 +1,29 @@
+# AUTO-GENERATED by tools/checkspecs.py - DO NOT EDIT
+from __future__ import unicode_literals
+from ..misc import AppendCSVRow
+
+
+def test_AppendCSVRow_inputs():
+    input_map = dict(_outputs=dict(usedefault=True,
+    ),
+    ignore_exception=dict(nohash=True,
+    usedefault=True,
+    ),
+    in_file=dict(mandatory=True,
+    ),
+    )
+    inputs = AppendCSVRow.input_spec()
+
+    for key, metadata in list(input_map.items()):
+        for metakey, value in list(metadata.items()):
+            assert getattr(inputs.traits()[key], metakey) == value
+
+
+def test_AppendCSVRow_outputs():
+    output_map = dict(journal_file=dict(),
+    )
+    outputs = AppendCSVRow.output_spec()
+
+    for key, metadata in list(output_map.items()):
+        for metakey, value in list(metadata.items()):
+            assert getattr(outputs.traits()[key], metakey) == value
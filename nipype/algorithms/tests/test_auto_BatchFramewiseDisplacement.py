@@ -0,0 +1,35 @@
+# AUTO-GENERATED by tools/checkspecs.py - DO NOT EDIT
+from __future__ import unicode_literals
+from ..confounds import BatchFramewiseDisplacement
+
+
+def test_BatchFramewiseDisplacement_inputs():
+    input_map = dict(ignore_exception=dict(nohash=True,
+    usedefault=True,
+    ),
+    in_files=dict(mandatory=True,
+    ),
+    out_table=dict(usedefault=True,
+    ),
+    parameter_source=dict(mandatory=True,
+    ),
+    radius=dict(usedefault=True,
+    ),
+    )
+    inputs = BatchFramewiseDisplacement.input_spec()
+
+    for key, metadata in list(input_map.items()):
+        for metakey, value in list(metadata.items()):
+            assert getattr(inputs.traits()[key], metakey) == value
+
+
+def test_BatchFramewiseDisplacement_outputs():
+    output_map = dict(fd_average=dict(),
+    out_files=dict(),
+    out_table=dict(),
+    )
+    outputs = BatchFramewiseDisplacement.output_spec()
+
+    for key, metadata in list(output_map.items()):
+        for metakey, value in list(metadata.items()):
+            assert getattr(outputs.traits()[key], metakey) == value
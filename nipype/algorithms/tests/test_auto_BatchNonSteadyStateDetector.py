@@ -0,0 +1,30 @@
+# AUTO-GENERATED by tools/checkspecs.py - DO NOT EDIT
+from __future__ import unicode_literals
+from ..confounds import BatchNonSteadyStateDetector
+
+
+def test_BatchNonSteadyStateDetector_inputs():
+    input_map = dict(ignore_exception=dict(nohash=True,
+    usedefault=True,
+    ),
+    in_files=dict(mandatory=True,
+    ),
+    out_table=dict(usedefault=True,
+    ),
+    )
+    inputs = BatchNonSteadyStateDetector.input_spec()
+
+    for key, metadata in list(input_map.items()):
+        for metakey, value in list(metadata.items()):
+            assert getattr(inputs.traits()[key], metakey) == value
+
+
+def test_BatchNonSteadyStateDetector_outputs():
+    output_map = dict(n_volumes_to_discard=dict(),
+    out_table=dict(),
+    )
+    outputs = BatchNonSteadyStateDetector.output_spec()
+
+    for key, metadata in list(output_map.items()):
+        for metakey, value in list(metadata.items()):
+            assert getattr(outputs.traits()[key], metakey) == value
@@ -0,0 +1,29 @@
+# AUTO-GENERATED by tools/checkspecs.py - DO NOT EDIT
+from __future__ import unicode_literals
+from ..misc import CompactCSVRows
+
+
+def test_CompactCSVRows_inputs():
+    input_map = dict(ignore_exception=dict(nohash=True,
+    usedefault=True,
+    ),
+    in_files=dict(mandatory=True,
+    ),
+    out_file=dict(usedefault=True,
+    ),
+    )
+    inputs = CompactCSVRows.input_spec()
+
+    for key, metadata in list(input_map.items()):
+        for metakey, value in list(metadata.items()):
+            assert getattr(inputs.traits()[key], metakey) == value
+
+
+def test_CompactCSVRows_outputs():
+    output_map = dict(csv_file=dict(),
+    )
+    outputs = CompactCSVRows.output_spec()
+
+    for key, metadata in list(output_map.items()):
+        for metakey, value in list(metadata.items()):
+            assert getattr(outputs.traits()[key], metakey) == value
@@ -8,6 +8,8 @@ def test_SplitROIs_inputs():
     ),
     in_mask=dict(),
     roi_size=dict(),
+    storage=dict(usedefault=True,
+    ),
     )
     inputs = SplitROIs.input_spec()
 
@@ -73,3 +73,110 @@ def test_outliers(tmpdir):
 
     assert is_outlier(in_data) == 1
 
+
+
+def test_fd_batch(tmpdir):
+    from nipype.algorithms.confounds import BatchFramewiseDisplacement
+    tmpdir.chdir()
+    in_file = example_data('fsl_mcflirt_movpar.txt')
+    mpars = np.loadtxt(in_file)
+    np.savetxt('run2.txt', mpars[::-1])
+    np.savetxt('run3.txt', mpars[:10] + 1)
+
+    in_files = [in_file, str(tmpdir.join('run2.txt')),
+                str(tmpdir.join('run3.txt'))]
+    res = BatchFramewiseDisplacement(in_files=in_files,
+                                     parameter_source='FSL').run()
+
+    table = np.loadtxt(res.outputs.out_table, skiprows=1)
+    for run, in_file in enumerate(in_files):
+        single = FramewiseDisplacement(
+            in_file=in_file, parameter_source='FSL',
+            out_file=str(tmpdir.join('fd%d.txt' % run))).run()
+        expected = np.loadtxt(single.outputs.out_file, skiprows=1)
+        assert np.allclose(np.loadtxt(res.outputs.out_files[run],
+                                      skiprows=1), expected)
+        assert np.allclose(table[table[:, 0] == run, 2], expected)
+        assert np.allclose(res.outputs.fd_average[run],
+                           single.outputs.fd_average)
+    assert table[table[:, 0] == 2, 1].tolist() == list(range(9))
+
+
+def test_fd_batch_same_basename(tmpdir):
+    from nipype.algorithms.confounds import BatchFramewiseDisplacement
+    tmpdir.chdir()
+    mpars = np.loadtxt(example_data('fsl_mcflirt_movpar.txt'))
+    in_files = []
+    for run, run_mpars in enumerate((mpars, mpars[::-1] * 2)):
+        tmpdir.mkdir('run%d' % run)
+        in_files.append(str(tmpdir.join('run%d' % run, 'movpar.txt')))
+        np.savetxt(in_files[-1], run_mpars)
+
+    res = BatchFramewiseDisplacement(in_files=in_files,
+                                     parameter_source='FSL').run()
+    assert len(set(res.outputs.out_files)) == 2
+    for run, in_file in enumerate(in_files):
+        single = FramewiseDisplacement(
+            in_file=in_file, parameter_source='FSL',
+            out_file=str(tmpdir.join('fd%d.txt' % run))).run()
+        assert np.allclose(np.loadtxt(res.outputs.out_files[run], skiprows=1),
+                           np.loadtxt(single.outputs.out_file, skiprows=1))
+
+
+def test_non_steady_state_batch(tmpdir):
+    from nipype.algorithms.confounds import (NonSteadyStateDetector,
+                                             BatchNonSteadyStateDetector)
+    import nibabel as nb
+    tmpdir.chdir()
+    np.random.seed(0)
+    in_files = []
+    for n_discard in (0, 3):
+        data = np.random.randn(5, 5, 5, 60) + 100
+        data[..., :n_discard] += 50
+        in_files.append(str(tmpdir.join('func%d.nii.gz' % n_discard)))
+        nb.Nifti1Image(data, np.eye(4)).to_filename(in_files[-1])
+
+    res = BatchNonSteadyStateDetector(in_files=in_files).run()
+    assert res.outputs.n_volumes_to_discard == [0, 3]
+    for in_file, n_discard in zip(in_files, (0, 3)):
+        single = NonSteadyStateDetector(in_file=in_file).run()
+        assert single.outputs.n_volumes_to_discard == n_discard
+
+
+def test_tsnr_uint16(tmpdir):
+    import nibabel as nb
+    from nipype.algorithms.confounds import TSNR
+    tmpdir.chdir()
+    np.random.seed(0)
+    data = np.random.randint(1000, 1003, size=(4, 4, 4, 50)).astype(np.uint16)
+    nb.Nifti1Image(data, np.eye(4)).to_filename('func.nii')
+
+    res = TSNR(in_file='func.nii').run()
+    mean = data.mean(axis=3)
+    std = data.std(axis=3)
+    for out_file, expected in [(res.outputs.mean_file, mean),
+                               (res.outputs.stddev_file, std),
+                               (res.outputs.tsnr_file, mean / std)]:
+        assert np.allclose(nb.load(out_file).get_data(), expected,
+                           rtol=1e-3)
+
+
+def test_tsnr_scratch_buffer(tmpdir, monkeypatch):
+    import glob
+    import nibabel as nb
+    from nipype.algorithms import confounds
+    tmpdir.chdir()
+    np.random.seed(0)
+    data = np.random.randn(4, 4, 4, 20).astype(np.float32) + 100
+    nb.Nifti1Image(data, np.eye(4)).to_filename('func.nii')
+
+    confounds.TSNR(in_file='func.nii', regress_poly=1).run()
+    assert glob.glob('.*.npy') == []
+
+    # the scratch buffer is removed when writing the detrended file fails
+    def _fail(img, filename):
+        raise IOError('disk full')
+    monkeypatch.setattr(confounds.nb, 'save', _fail)
+    with pytest.raises(IOError):
+        confounds.TSNR(in_file='func.nii', regress_poly=1).run()
+    assert glob.glob('.*.npy') == []
@@ -85,3 +85,22 @@ def test_importerror():
 
     with pytest.raises(ImportError):
         m.MeshWarpMaths()
+
+
+def test_vertex_area():
+    # ComputeMeshWarp refuses to instantiate without tvtk, but the area
+    # helpers only need numpy
+    dist = m.ComputeMeshWarp.__new__(m.ComputeMeshWarp)
+
+    # unit square split along its diagonal, plus a right triangle with
+    # legs 2 and 3 sharing the (1, 0, 0) vertex and an isolated vertex
+    points = np.array([[0., 0., 0.], [1., 0., 0.], [1., 1., 0.],
+                       [0., 1., 0.], [1., 0., 2.], [1., 3., 0.],
+                       [5., 5., 5.]])
+    faces = np.array([[0, 1, 2], [0, 2, 3], [1, 4, 5]])
+
+    assert np.allclose(dist._triangle_area(*points[faces[2]]), 3.0)
+    assert np.allclose(dist._triangle_area(points[0], points[1], points[1]),
+                       0.0)
+    assert np.allclose(dist._vertex_area(points, faces),
+                       [1.0, 3.5, 1.0, 0.5, 3.0, 3.0, 0.0])
@@ -4,6 +4,7 @@
 import pytest
 import os
 
+import numpy as np
 import nibabel as nb
 
 from nipype.algorithms import misc
@@ -32,3 +33,112 @@ def test_CreateNifti(create_analyze_pair_file_in_directory):
 
     assert os.path.exists(result.outputs.nifti_file)
     assert nb.load(result.outputs.nifti_file)
+
+
+def test_AddNoise(tmpdir):
+    tmpdir.chdir()
+    rng = np.random.RandomState(0)
+    data = rng.uniform(50, 100, size=(8, 9, 10, 3)).astype(np.float32)
+    mask = np.zeros((8, 9, 10), dtype=np.uint8)
+    mask[2:6, 2:7, 2:8] = 1
+    nb.Nifti1Image(data, np.eye(4)).to_filename('func.nii')
+    nb.Nifti1Image(mask, np.eye(4)).to_filename('mask.nii')
+
+    results = []
+    for out_file in ['noisy1.nii', 'noisy2.nii']:
+        noise = misc.AddNoise(in_file='func.nii', in_mask='mask.nii',
+                              bg_dist='rayleigh', seed=42, out_file=out_file)
+        res = noise.run()
+        results.append(nb.load(res.outputs.out_file).get_data())
+
+    assert np.array_equal(results[0], results[1])
+    assert sorted(os.listdir('.')) == ['func.nii', 'mask.nii', 'noisy1.nii',
+                                       'noisy2.nii']
+
+    # blocks of one volume yield the same noise as the whole image
+    chunked = misc.add_noise(data, np.empty(data.shape), mask=mask,
+                             bg_dist='rayleigh', seed=42, block_bytes=1)
+    assert np.allclose(chunked, results[0], atol=1e-4)
+    assert not np.allclose(chunked, data)
+
+
+def _append_rows(args):
+    journal, writer, nrows = args
+    for i in range(nrows):
+        addrow = misc.AppendCSVRow(in_file=journal)
+        addrow.inputs.writer = writer
+        addrow.inputs.row = i
+        addrow.inputs.values = list(range(writer, writer + 40))
+        addrow.run()
+
+
+def test_AppendCSVRow_concurrent(tmpdir):
+    import multiprocessing
+
+    tmpdir.chdir()
+    journal = os.path.abspath('rows.jsonl')
+    nwriters, nrows = 8, 60
+
+    pool = multiprocessing.Pool(nwriters)
+    try:
+        pool.map(_append_rows, [(journal, w, nrows) for w in range(nwriters)])
+    finally:
+        pool.close()
+        pool.join()
+
+    # a truncated record left by a killed writer is skipped
+    with open(journal, 'a') as fp:
+        fp.write('\n{"writer": 9')
+
+    compact = misc.CompactCSVRows(in_files=[journal], out_file='rows.tsv')
+    res = compact.run()
+
+    with open(res.outputs.csv_file) as fp:
+        lines = fp.read().splitlines()
+    header = lines[0].split('\t')
+    assert header == sorted(['row', 'writer'] +
+                            ['values_%d' % i for i in range(40)])
+    rows = [dict(zip(header, line.split('\t'))) for line in lines[1:]]
+    assert len(rows) == nwriters * nrows
+    assert sorted((int(r['writer']), int(r['row'])) for r in rows) == [
+        (w, i) for w in range(nwriters) for i in range(nrows)]
+    assert all(int(r['values_39']) == int(r['writer']) + 39 for r in rows)
+
+
+def test_CompactCSVRows_torn_journal(tmpdir):
+    tmpdir.chdir()
+    journal = os.path.abspath('rows.jsonl')
+    misc.append_csv_row(journal, {'row': 0, 'value': 'a'})
+    misc.append_csv_row(journal, {'row': 1, 'value': 'b'})
+
+    # a writer killed in the middle of the second record, then more rows
+    # appended by other writers
+    with open(journal, 'r+') as fp:
+        fp.truncate(os.path.getsize(journal) - 5)
+    misc.append_csv_row(journal, {'row': 2, 'value': 'c'})
+    misc.append_csv_row(journal, {'row': 3, 'value': 'd'})
+
+    misc.compact_csv_rows(journal, 'rows.csv')
+    with open('rows.csv') as fp:
+        assert fp.read().splitlines() == ['row,value', '0,a', '2,c', '3,d']
+
+
+def test_merge_csvs(tmpdir):
+    tables = [np.arange(12.).reshape(4, 3) + 100 * idx for idx in range(3)]
+    in_files = []
+    for idx, table in enumerate(tables):
+        in_file = tmpdir.join('table%d.csv' % idx)
+        lines = ['"label","a","b","c","type"']
+        lines += ['"roi%d",%s,"patient"' % (row, ','.join(map(str, values)))
+                  for row, values in enumerate(table)]
+        in_file.write('\n'.join(lines) + '\n')
+        in_files.append(str(in_file))
+
+    merged = misc.merge_csvs(in_files)
+    assert merged.shape == (4, 3, 3)
+    for idx, table in enumerate(tables):
+        assert np.all(merged[:, :, idx] == table)
+
+    np.savetxt(str(tmpdir.join('short.csv')), tables[0][:2], delimiter=',')
+    with pytest.raises(ValueError):
+        misc.merge_csvs(in_files + [str(tmpdir.join('short.csv'))])
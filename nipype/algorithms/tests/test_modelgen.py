@@ -157,3 +157,53 @@ def test_modelgen_sparse(tmpdir):
     npt.assert_almost_equal(res.outputs.session_info[0]['regress'][0]['val'][0], 0.016675298129743384)
     npt.assert_almost_equal(res.outputs.session_info[1]['regress'][1]['val'][5], 0.007671459162258378)
 
+
+
+def test_modelgen_sparse_boxcars():
+    s = SpecifySparseModel(input_units='secs', time_repetition=6,
+                           time_acquisition=2, stimuli_as_impulses=False,
+                           scale_regressors=False)
+    onsets = [0, 3, 4, 30, 31]
+    durations = [8, 2, 0, 1.5, 4]
+    amplitudes = [1, 2, 3, 4, 5]
+    reg = s._gen_regress(onsets, durations, amplitudes, 10)
+
+    # Reference timeline, at a resolution of dt = 200ms
+    timeline = np.zeros(300)
+    for onset, duration, amplitude in zip(onsets, durations, amplitudes):
+        duration = duration or 2
+        start = int(onset * 5)
+        timeline[start:start + int(duration * 5)] += amplitude
+    expected = [timeline[i * 30:i * 30 + 10].mean() for i in range(10)]
+    npt.assert_almost_equal(reg, expected)
+
+
+def test_spm_hrf_cache():
+    from nipype.algorithms.modelgen import spm_hrf
+    hrf = spm_hrf(2)
+    expected = hrf.copy()
+    hrf[:] = 0
+    npt.assert_array_equal(spm_hrf(2), expected)
+
+
+def test_gen_info(tmpdir):
+    from nipype.algorithms.modelgen import gen_info
+    tmpdir.join('cond1.run001.txt').write('1\n12.5\n')
+    tmpdir.join('cond2.run001.txt').write('3 1\n20 2\n')
+    tmpdir.join('cond3.run001.txt').write('# onset duration amplitude\n'
+                                          '4 1 0.5\n')
+    tmpdir.join('cond1.run002.txt').write('1\n12.5\n')
+    tmpdir.join('cond4.txt').write('4 1 0.5\n8 1 1.5\n')
+    run1 = [str(tmpdir.join('cond%d.run001.txt' % i)) for i in range(1, 4)]
+    run2 = [str(tmpdir.join('cond1.run002.txt'))]
+
+    info = gen_info([run1, run2, [str(tmpdir.join('cond4.txt'))]])
+    assert info[0].conditions == ['cond1', 'cond2', 'cond3']
+    assert info[0].onsets == [[1, 12.5], [3, 20], [4]]
+    assert info[0].durations == [[0], [1, 2], [1]]
+    assert not hasattr(info[0], 'amplitudes')
+    assert info[1].conditions == ['cond1']
+    assert info[1].onsets == [[1, 12.5]]
+    assert not hasattr(info[1], 'amplitudes')
+    assert info[2].conditions == ['cond4']
+    assert info[2].amplitudes == [[0.5, 1.5]]
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import numpy as np
 import tempfile
+from scipy import stats
 from nipype.algorithms.misc import calc_moments
 
 
@@ -136,3 +137,17 @@ def test_skew():
                   0.07035664150233077, -
                   0.01935867699166935,
                   0.00483863369427428, 0.21879460029850167]))
+
+
+def test_moments_blocks(tmpdir):
+    rng = np.random.RandomState(0)
+    timeseries = rng.gamma(2.0, size=(257, 4)) * 100.0 + 1e4
+    tsfile = tmpdir.join('timeseries.txt').strpath
+    np.savetxt(tsfile, timeseries, header='gamma timeseries')
+
+    for moment in (3, 4):
+        expected = (stats.moment(timeseries, moment, axis=0) /
+                    stats.moment(timeseries, 2, axis=0) ** (moment / 2.0))
+        for block_rows in (1, 10, 1000):
+            assert np.allclose(calc_moments(tsfile, moment, block_rows),
+                               expected)
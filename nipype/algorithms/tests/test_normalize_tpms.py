@@ -53,3 +53,44 @@ def test_normalize_tpms(tmpdir):
 
     assert np.allclose(sumdata[sumdata > 0.0], 1.0)
 
+
+
+def test_normalize_tpms_slabs(tmpdir):
+    tempdir = str(tmpdir)
+    rng = np.random.RandomState(0)
+    shape = (6, 5, 7)
+    affine = np.eye(4)
+
+    mskdata = np.zeros(shape, dtype=np.uint8)
+    mskdata[1:-1, 1:-1, 1:-1] = 1
+    in_mask = os.path.join(tempdir, 'mask.nii')
+    nb.Nifti1Image(mskdata, affine).to_filename(in_mask)
+
+    mapdata = []
+    in_files = []
+    for i in range(12):
+        data = rng.uniform(-0.1, 1.0, size=shape).astype(np.float32)
+        data[..., 3] = 0.0
+        mapdata.append(np.clip(data, 0.0, None))
+        in_files.append(os.path.join(tempdir, 'tpm_%02d.nii' % i))
+        nb.Nifti1Image(data, affine).to_filename(in_files[-1])
+
+    out_files = [os.path.join(tempdir, 'norm_%02d.nii.gz' % i)
+                 for i in range(12)]
+    normalize_tpms(in_files, in_mask, out_files=out_files,
+                   block_bytes=12 * 30 * 4 * 2)
+
+    weights = np.sum(mapdata, axis=0)
+    inside = (mskdata > 0) & (weights > 0)
+    sumdata = np.zeros(shape)
+    for i, tstfname in enumerate(out_files):
+        normdata = nb.load(tstfname, mmap=NUMPY_MMAP).get_data()
+        assert normdata.dtype == np.float32
+        assert np.all(normdata[~inside] == 0)
+        assert np.allclose(normdata[inside], mapdata[i][inside] /
+                           weights[inside])
+        sumdata += normdata
+
+    assert np.allclose(sumdata[inside], 1.0)
+    assert sorted(os.listdir(tempdir)) == sorted(
+        [os.path.basename(f) for f in in_files + out_files] + ['mask.nii'])
@@ -42,3 +42,32 @@ def test_overlap(tmpdir):
     check_close(res.outputs.roi_voldiff,
                 np.array([0.0063086, -0.0025506, 0.0]))
 
+
+
+def test_batch_overlap(tmpdir):
+    from nipype.algorithms.metrics import BatchOverlap, Overlap
+
+    in1 = example_data('segmentation0.nii.gz')
+    in2 = example_data('segmentation1.nii.gz')
+
+    os.chdir(str(tmpdir))
+    batch = BatchOverlap(reference=in1, in_files=[in1, in2],
+                         vol_units='mm', weighting='volume')
+    res = batch.run()
+
+    table = np.genfromtxt(res.outputs.out_file, names=True, delimiter='\t')
+    assert len(table) == 2 * len(res.outputs.labels)
+
+    for subject, in_file in enumerate([in1, in2]):
+        single = Overlap(volume1=in1, volume2=in_file,
+                         vol_units='mm', weighting='volume').run()
+        rows = table[table['subject'] == subject]
+        assert res.outputs.labels == single.outputs.labels
+        assert res.outputs.jaccard[subject] == single.outputs.jaccard
+        assert res.outputs.dice[subject] == single.outputs.dice
+        np.testing.assert_almost_equal(rows['jaccard'],
+                                       single.outputs.roi_ji)
+        np.testing.assert_almost_equal(rows['dice'], single.outputs.roi_di)
+        np.testing.assert_almost_equal(
+            (rows['volume_ref'] - rows['volume']) / rows['volume_ref'],
+            single.outputs.roi_voldiff)
@@ -87,3 +87,41 @@ def test_sc_output_filenames():
     f = 'motion.nii'
     corrfile = sc._get_output_filenames(f, outputdir)
     assert corrfile == '/tmp/qa.motion_stimcorr.txt'
+
+
+def test_ad_global_intensity_blocks(tmpdir):
+    import nibabel as nb
+    rng = np.random.RandomState(0)
+    data = (500 + rng.rand(6, 7, 5, 11) * 100).astype(np.float32)
+    data[:2] /= 100.
+    data[3, 3, 3, 3] = 0.
+    tmpdir.chdir()
+    nb.Nifti1Image(data, np.eye(4)).to_filename('func.nii')
+    np.savetxt('func.par', rng.randn(11, 6) * 0.1)
+    data = data.astype(np.float64)
+
+    for kwargs in [dict(mask_type='spm_global', global_threshold=1.5,
+                        intersect_mask=True),
+                   dict(mask_type='spm_global', intersect_mask=False),
+                   dict(mask_type='thresh', mask_threshold=550.)]:
+        ad = ra.ArtifactDetect(realigned_files='func.nii',
+                               realignment_parameters='func.par',
+                               parameter_source='FSL', norm_threshold=1,
+                               zintensity_threshold=3, save_plot=False,
+                               **kwargs)
+        ad.run()
+        # per-volume reference computation
+        g = []
+        for t0 in range(data.shape[3]):
+            vol = data[:, :, :, t0]
+            if kwargs['mask_type'] == 'thresh':
+                g.append(vol[vol > 550.].mean())
+            elif kwargs['intersect_mask']:
+                mask = np.all(data > data.mean(axis=(0, 1, 2)) / 1.5, axis=3)
+                g.append(vol[mask].mean())
+            else:
+                g.append(vol[vol > vol.mean() / 8.].mean())
+        npt.assert_almost_equal(np.loadtxt('global_intensity.func.txt'),
+                                g, decimal=2)
+        assert nb.load('mask.func.nii').shape[3:] == (
+            () if kwargs.get('intersect_mask', True) else (11,))
@@ -1,11 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import pytest
 from nipype.testing import example_data
 from nipype.utils import NUMPY_MMAP
 
 
-def test_split_and_merge(tmpdir):
+@pytest.mark.parametrize("storage, ndirs", [
+    ('files', 6), ('memmap', 6), ('files', 300), ('memmap', 300)])
+def test_split_and_merge(tmpdir, storage, ndirs):
     import numpy as np
     import nibabel as nb
     import os.path as op
@@ -18,16 +21,61 @@ def test_split_and_merge(tmpdir):
     mskdata = nb.load(in_mask, mmap=NUMPY_MMAP).get_data()
     aff = nb.load(in_mask, mmap=NUMPY_MMAP).affine
 
-    dwshape = (mskdata.shape[0], mskdata.shape[1], mskdata.shape[2], 6)
+    if ndirs >= 300:
+        # keep the test volume small
+        mskdata = mskdata[::4, ::4, ::4]
+        in_mask = op.join(str(tmpdir), 'mask.nii.gz')
+        nb.Nifti1Image(mskdata, aff, None).to_filename(in_mask)
+
+    dwshape = (mskdata.shape[0], mskdata.shape[1], mskdata.shape[2], ndirs)
     dwdata = np.random.normal(size=dwshape)
     os.chdir(str(tmpdir))
     nb.Nifti1Image(dwdata.astype(np.float32),
                    aff, None).to_filename(dwfile)
 
-    resdw, resmsk, resid = split_rois(dwfile, in_mask, roishape=(20, 20, 2))
+    resdw, resmsk, resid = split_rois(dwfile, in_mask, roishape=(20, 20, 2),
+                                      storage=storage)
     merged = merge_rois(resdw, resid, in_mask)
     dwmerged = nb.load(merged, mmap=NUMPY_MMAP).get_data()
 
     dwmasked = dwdata * mskdata[:, :, :, np.newaxis]
 
     assert np.allclose(dwmasked, dwmerged)
+    assert not [f for f in os.listdir('.') if f.endswith('.npy') and
+                f.startswith('.')]
+
+
+def test_merge_rois_buffers(tmpdir, monkeypatch):
+    import numpy as np
+    import nibabel as nb
+    import os
+    from nipype.algorithms import misc
+
+    tmpdir.chdir()
+    shape = (4, 3, 2, 300)
+    data = np.random.normal(size=shape).astype(np.float32)
+    mask = np.ones(shape[:3], dtype=np.uint8)
+    nb.Nifti1Image(mask, np.eye(4)).to_filename('mask.nii')
+    np.save('chunk.npy', data.reshape(-1, shape[3])[np.newaxis])
+    np.save('idxs.npy', np.arange(mask.size)[np.newaxis])
+
+    # two merges writing to the same directory at the same time
+    buffers = []
+    scratch_memmap = misc._scratch_memmap
+
+    def _scratch(*args):
+        scratch = scratch_memmap(*args)
+        buffers.append(scratch)
+        if len(buffers) == 1:
+            misc.merge_rois(['chunk.npy'], ['idxs.npy'], 'mask.nii',
+                            out_file='other.nii')
+        return scratch
+
+    monkeypatch.setattr(misc, '_scratch_memmap', _scratch)
+    merged = misc.merge_rois(['chunk.npy'], ['idxs.npy'], 'mask.nii',
+                             out_file='merged.nii')
+    assert buffers[0][0] != buffers[1][0]
+    for fname in (merged, 'other.nii'):
+        assert np.allclose(nb.load(fname).get_data(), data)
+    assert not [f for f in os.listdir('.') if f.endswith('.npy') and
+                f.startswith('.')]
@@ -85,6 +85,24 @@ class TestTSNR():
             'tsnr_file': (2.6, 57.3)
         })
 
+    def test_tsnr_multiple_files(self):
+        # set up: one 3D file per volume
+        in_files = []
+        for i in range(self.fake_data.shape[3]):
+            in_files.append('tsnrinfile%d.nii' % i)
+            utils.save_toy_nii(self.fake_data[..., i], in_files[-1])
+
+        # run
+        tsnrresult = TSNR(in_file=in_files, regress_poly=2).run()
+
+        # assert
+        self.assert_expected_outputs_poly(tsnrresult, {
+            'detrended_file': (-0.22, 8.55),
+            'mean_file': (2.8, 7.7),
+            'stddev_file': (0.21, 2.4),
+            'tsnr_file': (1.7, 35.9)
+        })
+
     @mock.patch('warnings.warn')
     def test_warning(self, mock_warn):
         ''' test that usage of misc.TSNR trips a warning to use confounds.TSNR instead '''
@@ -14,6 +14,7 @@ from builtins import range, open
 
 import pickle
 import os.path as op
+from itertools import islice
 
 import numpy as np
 import nibabel as nb
@@ -28,6 +29,9 @@ from ..base import (BaseInterface, BaseInterfaceInputSpec, traits, File,
                     TraitedSpec, Directory, OutputMultiPath, isdefined)
 iflogger = logging.getLogger('interface')
 
+# Number of fibers looked up in the ROI volume at once
+FIBER_CHUNK_SIZE = 10000
+
 
 def length(xyz, along=False):
     """
@@ -74,54 +78,100 @@ def length(xyz, along=False):
     return np.sum(dists)
 
 
+def _points_to_rois(pointsmm, roiData, voxelSize):
+    """ Looks up the ROI label of the voxel containing each point """
+    index = (np.asarray(pointsmm)[:, :3] /
+             np.asarray(voxelSize[:3], dtype=float)).astype(int)
+    return roiData[index[:, 0], index[:, 1], index[:, 2]]
+
+
+def _unique_rois_per_fiber(fiber_ids, rois):
+    """ Removes repeated (fiber, roi) pairs, keeping the first crossing
+
+    Returns the fiber ids and labels of the remaining pairs, ordered as
+    they were crossed.
+    """
+    rois = rois.astype(np.int64)
+    if not len(rois):
+        return fiber_ids, rois
+    offset = rois.min()
+    key = fiber_ids * (rois.max() - offset + 1) + (rois - offset)
+    first = np.sort(np.unique(key, return_index=True)[1])
+    return fiber_ids[first], rois[first]
+
+
+def _incidence_connectivity(n_rois, fiber_ids, rois):
+    """ Number of fibers crossing each pair of different ROIs, given the
+    unique (fiber, roi) crossings """
+    from scipy import sparse
+
+    if not len(rois):
+        return np.zeros((n_rois, n_rois), dtype=np.uint)
+    incidence = sparse.coo_matrix(
+        (np.ones(len(rois), dtype=np.int64), (fiber_ids, rois - 1)),
+        shape=(fiber_ids.max() + 1, n_rois)).tocsc()
+    connectivity = (incidence.T * incidence).toarray().astype(np.uint)
+    np.fill_diagonal(connectivity, 0)
+    return connectivity
+
+
 def get_rois_crossed(pointsmm, roiData, voxelSize):
-    n_points = len(pointsmm)
-    rois_crossed = []
-    for j in range(0, n_points):
-        # store point
-        x = int(pointsmm[j, 0] / float(voxelSize[0]))
-        y = int(pointsmm[j, 1] / float(voxelSize[1]))
-        z = int(pointsmm[j, 2] / float(voxelSize[2]))
-        if not roiData[x, y, z] == 0:
-            rois_crossed.append(roiData[x, y, z])
-    rois_crossed = list(dict.fromkeys(rois_crossed).keys())  # Removed duplicates from the list
-    return rois_crossed
+    rois = _points_to_rois(pointsmm, roiData, voxelSize)
+    rois = rois[rois != 0]
+    # Remove duplicates, keeping the order in which they are crossed
+    first = np.sort(np.unique(rois, return_index=True)[1])
+    return rois[first].tolist()
 
 
 def get_connectivity_matrix(n_rois, list_of_roi_crossed_lists):
-    connectivity_matrix = np.zeros((n_rois, n_rois), dtype=np.uint)
-    for rois_crossed in list_of_roi_crossed_lists:
-        for idx_i, roi_i in enumerate(rois_crossed):
-            for idx_j, roi_j in enumerate(rois_crossed):
-                if idx_i > idx_j:
-                    if not roi_i == roi_j:
-                        connectivity_matrix[roi_i - 1, roi_j - 1] += 1
-    connectivity_matrix = connectivity_matrix + connectivity_matrix.T
-    return connectivity_matrix
+    lengths = [len(rois_crossed) for rois_crossed in list_of_roi_crossed_lists]
+    fiber_ids = np.repeat(np.arange(len(lengths)), lengths)
+    rois = np.array([roi for rois_crossed in list_of_roi_crossed_lists
+                     for roi in rois_crossed], dtype=np.int64)
+    fiber_ids, rois = _unique_rois_per_fiber(fiber_ids, rois)
+    return _incidence_connectivity(n_rois, fiber_ids, rois)
+
+
+def _fibers_intersections(fibers, roiData, voxelSize, n_rois):
+    """ Connectivity matrix counting the fiber/region traversals of the
+    given fibers, and the indices of the fibers crossing any region """
+    lengths = [len(f[0]) for f in fibers]
+    fiber_ids = np.repeat(np.arange(len(fibers)), lengths)
+    rois = _points_to_rois(np.concatenate([f[0] for f in fibers]),
+                           roiData, voxelSize)
+    crossing = rois != 0
+    fiber_ids, rois = _unique_rois_per_fiber(fiber_ids[crossing],
+                                             rois[crossing])
+    return (_incidence_connectivity(n_rois, fiber_ids, rois),
+            np.unique(fiber_ids).tolist())
+
+
+def _log_orphans(dis, n_fib):
+    iflogger.info("Found %i (%f percent out of %i fibers) fibers that start or terminate in a voxel which is not labeled. (orphans)" % (dis, dis * 100.0 / n_fib, n_fib))
+    iflogger.info("Valid fibers: %i (%f percent)" % (n_fib - dis, 100 - dis * 100.0 / n_fib))
 
 
-def create_allpoints_cmat(streamlines, roiData, voxelSize, n_rois):
+def create_allpoints_cmat(streamlines, roiData, voxelSize, n_rois,
+                          chunk_size=FIBER_CHUNK_SIZE):
     """ Create the intersection arrays for each fiber
+
+    Fibers are processed in chunks of ``chunk_size``: the points of all
+    the fibers in a chunk are looked up in the ROI volume at once, and
+    the fiber/ROI incidences are accumulated in the connectivity matrix.
     """
     n_fib = len(streamlines)
-    pc = -1
-    # Computation for each fiber
+    connectivity_matrix = np.zeros((n_rois, n_rois), dtype=np.uint)
     final_fiber_ids = []
-    list_of_roi_crossed_lists = []
-    for i, fiber in enumerate(streamlines):
-        pcN = int(round(float(100 * i) / n_fib))
-        if pcN > pc and pcN % 1 == 0:
-            pc = pcN
-            print('%4.0f%%' % (pc))
-        rois_crossed = get_rois_crossed(fiber[0], roiData, voxelSize)
-        if len(rois_crossed) > 0:
-            list_of_roi_crossed_lists.append(list(rois_crossed))
-            final_fiber_ids.append(i)
-
-    connectivity_matrix = get_connectivity_matrix(n_rois, list_of_roi_crossed_lists)
-    dis = n_fib - len(final_fiber_ids)
-    iflogger.info("Found %i (%f percent out of %i fibers) fibers that start or terminate in a voxel which is not labeled. (orphans)" % (dis, dis * 100.0 / n_fib, n_fib))
-    iflogger.info("Valid fibers: %i (%f percent)" % (n_fib - dis, 100 - dis * 100.0 / n_fib))
+    for start in range(0, n_fib, chunk_size):
+        fibers = streamlines[start:start + chunk_size]
+        iflogger.debug('Computing intersections of fibers %d-%d', start,
+                       start + len(fibers) - 1)
+        matrix, fiber_ids = _fibers_intersections(fibers, roiData, voxelSize,
+                                                  n_rois)
+        connectivity_matrix += matrix
+        final_fiber_ids += [start + i for i in fiber_ids]
+
+    _log_orphans(n_fib - len(final_fiber_ids), n_fib)
     iflogger.info('Returning the intersecting point connectivity matrix')
     return connectivity_matrix, final_fiber_ids
 
@@ -138,42 +188,33 @@ def create_endpoints_array(fib, voxelSize):
     index of its first and last point in the voxelSize volume
     endpointsmm) : endpoints in milimeter coordinates
     """
-
-    # Init
-    n = len(fib)
-    endpoints = np.zeros((n, 2, 3))
-    endpointsmm = np.zeros((n, 2, 3))
-    pc = -1
-
-    # Computation for each fiber
-    for i, fi in enumerate(fib):
-        f = fi[0]
-
-        # store startpoint
-        endpoints[i, 0, :] = f[0, :]
-        # store endpoint
-        endpoints[i, 1, :] = f[-1, :]
-
-        # store startpoint
-        endpointsmm[i, 0, :] = f[0, :]
-        # store endpoint
-        endpointsmm[i, 1, :] = f[-1, :]
-
-        # Translate from mm to index
-        endpoints[i, 0, 0] = int(endpoints[i, 0, 0] / float(voxelSize[0]))
-        endpoints[i, 0, 1] = int(endpoints[i, 0, 1] / float(voxelSize[1]))
-        endpoints[i, 0, 2] = int(endpoints[i, 0, 2] / float(voxelSize[2]))
-        endpoints[i, 1, 0] = int(endpoints[i, 1, 0] / float(voxelSize[0]))
-        endpoints[i, 1, 1] = int(endpoints[i, 1, 1] / float(voxelSize[1]))
-        endpoints[i, 1, 2] = int(endpoints[i, 1, 2] / float(voxelSize[2]))
+    endpointsmm = np.array([(fi[0][0, :3], fi[0][-1, :3]) for fi in fib],
+                           dtype=np.float64).reshape((-1, 2, 3))
+    # Translate from mm to index
+    endpoints = np.trunc(endpointsmm /
+                         np.asarray(voxelSize[:3], dtype=np.float64))
 
     # Return the matrices
-    iflogger.info('Returning the endpoint matrix')
+    iflogger.debug('Returning the endpoint matrix')
     return (endpoints, endpointsmm)
 
 
+def iter_fiber_chunks(track_file, chunk_size=FIBER_CHUNK_SIZE):
+    """ Reads the fibers of a trackvis file in lists of ``chunk_size`` """
+    streams, _ = nb.trackvis.read(track_file, as_generator=True)
+    while True:
+        fibers = list(islice(streams, chunk_size))
+        if not fibers:
+            return
+        yield fibers
+
+
 def cmat(track_file, roi_file, resolution_network_file, matrix_name, matrix_mat_name, endpoint_name, intersections=False):
-    """ Create the connection matrix for each resolution using fibers and ROIs. """
+    """ Create the connection matrix for each resolution using fibers and ROIs.
+
+    The tractography is streamed from ``track_file`` in chunks of
+    ``FIBER_CHUNK_SIZE`` fibers and it is never held in memory as a whole.
+    """
 
     stats = {}
     iflogger.info('Running cmat function')
@@ -181,28 +222,9 @@ def cmat(track_file, roi_file, resolution_network_file, matrix_name, matrix_mat_
     en_fname = op.abspath(endpoint_name + '_endpoints.npy')
     en_fnamemm = op.abspath(endpoint_name + '_endpointsmm.npy')
 
-    iflogger.info('Reading Trackvis file {trk}'.format(trk=track_file))
-    fib, hdr = nb.trackvis.read(track_file, False)
-    stats['orig_n_fib'] = len(fib)
-
     roi = nb.load(roi_file, mmap=NUMPY_MMAP)
     roiData = roi.get_data()
     roiVoxelSize = roi.header.get_zooms()
-    (endpoints, endpointsmm) = create_endpoints_array(fib, roiVoxelSize)
-
-    # Output endpoint arrays
-    iflogger.info('Saving endpoint array: {array}'.format(array=en_fname))
-    np.save(en_fname, endpoints)
-    iflogger.info('Saving endpoint array in mm: {array}'.format(array=en_fnamemm))
-    np.save(en_fnamemm, endpointsmm)
-
-    n = len(fib)
-    iflogger.info('Number of fibers {num}'.format(num=n))
-
-    # Create empty fiber label array
-    fiberlabels = np.zeros((n, 2))
-    final_fiberlabels = []
-    final_fibers_idx = []
 
     # Add node information from specified parcellation scheme
     path, name, ext = split_filename(resolution_network_file)
@@ -225,106 +247,132 @@ def cmat(track_file, roi_file, resolution_network_file, matrix_name, matrix_mat_
             xyz = tuple(np.mean(np.where(np.flipud(roiData) == int(d["dn_correspondence_id"])), axis=1))
             G.node[int(u)]['dn_position'] = tuple([xyz[0], xyz[2], -xyz[1]])
 
+    iflogger.info('Reading Trackvis file {trk}'.format(trk=track_file))
+    _, hdr = nb.trackvis.read(track_file, as_generator=True)
+    endpoints = []
+    endpointsmm = []
+    fiberlength = []
     if intersections:
         iflogger.info("Filtering tractography from intersections")
-        intersection_matrix, final_fiber_ids = create_allpoints_cmat(fib, roiData, roiVoxelSize, nROIs)
+        intersection_matrix = np.zeros((nROIs, nROIs), dtype=np.uint)
+        final_fiber_ids = []
+
+    n = 0
+    for fibers in iter_fiber_chunks(track_file, FIBER_CHUNK_SIZE):
+        chunk_endpoints, chunk_endpointsmm = create_endpoints_array(
+            fibers, roiVoxelSize)
+        endpoints.append(chunk_endpoints)
+        endpointsmm.append(chunk_endpointsmm)
+        fiberlength.append(np.array([length(fi[0]) for fi in fibers]))
+        if intersections:
+            matrix, fiber_ids = _fibers_intersections(fibers, roiData,
+                                                      roiVoxelSize, nROIs)
+            intersection_matrix += matrix
+            final_fiber_ids += [n + i for i in fiber_ids]
+        n += len(fibers)
+
+    stats['orig_n_fib'] = n
+    endpoints = np.concatenate(endpoints or [np.zeros((0, 2, 3))])
+    endpointsmm = np.concatenate(endpointsmm or [np.zeros((0, 2, 3))])
+    fiberlength = np.concatenate(fiberlength or [np.zeros((0,))])
+
+    # Output endpoint arrays
+    iflogger.info('Saving endpoint array: {array}'.format(array=en_fname))
+    np.save(en_fname, endpoints)
+    iflogger.info('Saving endpoint array in mm: {array}'.format(array=en_fnamemm))
+    np.save(en_fnamemm, endpointsmm)
+
+    iflogger.info('Number of fibers {num}'.format(num=n))
+
+    if intersections:
+        _log_orphans(n - len(final_fiber_ids), n)
         finalfibers_fname = op.abspath(endpoint_name + '_intersections_streamline_final.trk')
-        stats['intersections_n_fib'] = save_fibers(hdr, fib, finalfibers_fname, final_fiber_ids)
+        streams, _ = nb.trackvis.read(track_file, as_generator=True)
+        stats['intersections_n_fib'] = save_fibers(hdr, streams, finalfibers_fname, final_fiber_ids)
         intersection_matrix = np.matrix(intersection_matrix)
         I = G.copy()
         H = nx.from_numpy_matrix(np.matrix(intersection_matrix))
         H = nx.relabel_nodes(H, lambda x: x + 1)  # relabel nodes so they start at 1
         I.add_weighted_edges_from(((u, v, d['weight']) for u, v, d in H.edges(data=True)))
 
-    dis = 0
-    for i in range(endpoints.shape[0]):
-
-        # ROI start => ROI end
-        try:
-            startROI = int(roiData[endpoints[i, 0, 0], endpoints[i, 0, 1], endpoints[i, 0, 2]])
-            endROI = int(roiData[endpoints[i, 1, 0], endpoints[i, 1, 1], endpoints[i, 1, 2]])
-        except IndexError:
-            iflogger.error(("AN INDEXERROR EXCEPTION OCCURED FOR FIBER %s. PLEASE CHECK ENDPOINT GENERATION" % i))
-            break
-
-        # Filter
-        if startROI == 0 or endROI == 0:
-            dis += 1
-            fiberlabels[i, 0] = -1
-            continue
-
-        if startROI > nROIs or endROI > nROIs:
-            iflogger.error("Start or endpoint of fiber terminate in a voxel which is labeled higher")
-            iflogger.error("than is expected by the parcellation node information.")
-            iflogger.error("Start ROI: %i, End ROI: %i" % (startROI, endROI))
-            iflogger.error("This needs bugfixing!")
-            continue
-
-        # Update fiber label
-        # switch the rois in order to enforce startROI < endROI
-        if endROI < startROI:
-            tmp = startROI
-            startROI = endROI
-            endROI = tmp
-
-        fiberlabels[i, 0] = startROI
-        fiberlabels[i, 1] = endROI
-
-        final_fiberlabels.append([startROI, endROI])
-        final_fibers_idx.append(i)
+    # Create empty fiber label array
+    fiberlabels = np.zeros((n, 2))
 
-        # Add edge to graph
-        if G.has_edge(startROI, endROI) and 'fiblist' in G.edge[startROI][endROI]:
-            G.edge[startROI][endROI]['fiblist'].append(i)
-        else:
-            G.add_edge(startROI, endROI, fiblist=[i])
+    # ROI start => ROI end
+    endpoints = endpoints.astype(int)
+    shape = np.array(roiData.shape[:3])
+    outside = np.any((endpoints >= shape) | (endpoints < -shape), axis=(1, 2))
+    n_labeled = n
+    if np.any(outside):
+        n_labeled = int(np.argmax(outside))
+        iflogger.error(("AN INDEXERROR EXCEPTION OCCURED FOR FIBER %s. PLEASE CHECK ENDPOINT GENERATION" % n_labeled))
+    startROI = roiData[tuple(endpoints[:n_labeled, 0].T)].astype(int)
+    endROI = roiData[tuple(endpoints[:n_labeled, 1].T)].astype(int)
+
+    # Filter
+    orphans = (startROI == 0) | (endROI == 0)
+    dis = int(np.sum(orphans))
+    fiberlabels[np.flatnonzero(orphans), 0] = -1
+
+    overflow = ~orphans & ((startROI > nROIs) | (endROI > nROIs))
+    for i in np.flatnonzero(overflow):
+        iflogger.error("Start or endpoint of fiber terminate in a voxel which is labeled higher")
+        iflogger.error("than is expected by the parcellation node information.")
+        iflogger.error("Start ROI: %i, End ROI: %i" % (startROI[i], endROI[i]))
+        iflogger.error("This needs bugfixing!")
+
+    # Update fiber label
+    # switch the rois in order to enforce startROI < endROI
+    final_fibers_idx = np.flatnonzero(~orphans & ~overflow)
+    final_fiberlabels_array = np.sort(
+        np.column_stack((startROI[final_fibers_idx],
+                         endROI[final_fibers_idx])), axis=1)
+    fiberlabels[final_fibers_idx] = final_fiberlabels_array
 
     # create a final fiber length array
-    finalfiberlength = []
     if intersections:
         final_fibers_indices = final_fiber_ids
     else:
         final_fibers_indices = final_fibers_idx
+    final_fiberlength_array = fiberlength[final_fibers_indices]
 
-    for idx in final_fibers_indices:
-        # compute length of fiber
-        finalfiberlength.append(length(fib[idx][0]))
-
-    # convert to array
-    final_fiberlength_array = np.array(finalfiberlength)
-
-    # make final fiber labels as array
-    final_fiberlabels_array = np.array(final_fiberlabels, dtype=int)
+    _log_orphans(dis, n)
 
-    iflogger.info("Found %i (%f percent out of %i fibers) fibers that start or terminate in a voxel which is not labeled. (orphans)" % (dis, dis * 100.0 / n, n))
-    iflogger.info("Valid fibers: %i (%f percent)" % (n - dis, 100 - dis * 100.0 / n))
+    # Group the fibers connecting each pair of regions
+    edge_key = (final_fiberlabels_array[:, 0] * (nROIs + 1) +
+                final_fiberlabels_array[:, 1])
+    _, edge_index, edge_fibers = np.unique(
+        edge_key, return_index=True, return_counts=True)
+    edge_order = np.argsort(edge_key, kind='mergesort')
+    edge_lengths = np.split(fiberlength[final_fibers_idx][edge_order],
+                            np.cumsum(edge_fibers)[:-1])
 
     numfib = nx.Graph()
     numfib.add_nodes_from(G)
     fibmean = numfib.copy()
     fibmedian = numfib.copy()
     fibdev = numfib.copy()
-    for u, v, d in G.edges_iter(data=True):
+    for u, v in G.edges():
         G.remove_edge(u, v)
-        di = {}
-        if 'fiblist' in d:
-            di['number_of_fibers'] = len(d['fiblist'])
-            idx = np.where((final_fiberlabels_array[:, 0] == int(u)) & (final_fiberlabels_array[:, 1] == int(v)))[0]
-            di['fiber_length_mean'] = float(np.mean(final_fiberlength_array[idx]))
-            di['fiber_length_median'] = float(np.median(final_fiberlength_array[idx]))
-            di['fiber_length_std'] = float(np.std(final_fiberlength_array[idx]))
-        else:
-            di['number_of_fibers'] = 0
-            di['fiber_length_mean'] = 0
-            di['fiber_length_median'] = 0
-            di['fiber_length_std'] = 0
         if not u == v:  # Fix for self loop problem
-            G.add_edge(u, v, di)
-            if 'fiblist' in d:
-                numfib.add_edge(u, v, weight=di['number_of_fibers'])
-                fibmean.add_edge(u, v, weight=di['fiber_length_mean'])
-                fibmedian.add_edge(u, v, weight=di['fiber_length_median'])
-                fibdev.add_edge(u, v, weight=di['fiber_length_std'])
+            G.add_edge(u, v, {'number_of_fibers': 0,
+                              'fiber_length_mean': 0,
+                              'fiber_length_median': 0,
+                              'fiber_length_std': 0})
+    for idx, lengths in zip(edge_index, edge_lengths):
+        u, v = (int(roi) for roi in final_fiberlabels_array[idx])
+        if u == v:  # Fix for self loop problem
+            continue
+        di = {}
+        di['number_of_fibers'] = len(lengths)
+        di['fiber_length_mean'] = float(np.mean(lengths))
+        di['fiber_length_median'] = float(np.median(lengths))
+        di['fiber_length_std'] = float(np.std(lengths))
+        G.add_edge(u, v, di)
+        numfib.add_edge(u, v, weight=di['number_of_fibers'])
+        fibmean.add_edge(u, v, weight=di['fiber_length_mean'])
+        fibmedian.add_edge(u, v, weight=di['fiber_length_median'])
+        fibdev.add_edge(u, v, weight=di['fiber_length_std'])
 
     iflogger.info('Writing network as {ntwk}'.format(ntwk=matrix_name))
     nx.write_gpickle(G, op.abspath(matrix_name))
@@ -384,21 +432,53 @@ def cmat(track_file, roi_file, resolution_network_file, matrix_name, matrix_mat_
 
     iflogger.info("Filtering tractography - keeping only no orphan fibers")
     finalfibers_fname = op.abspath(endpoint_name + '_streamline_final.trk')
-    stats['endpoint_n_fib'] = save_fibers(hdr, fib, finalfibers_fname, final_fibers_idx)
+    streams, _ = nb.trackvis.read(track_file, as_generator=True)
+    stats['endpoint_n_fib'] = save_fibers(hdr, streams, finalfibers_fname, final_fibers_idx)
     stats['endpoints_percent'] = float(stats['endpoint_n_fib']) / float(stats['orig_n_fib']) * 100
-    stats['intersections_percent'] = float(stats['intersections_n_fib']) / float(stats['orig_n_fib']) * 100
+    if intersections:
+        stats['intersections_percent'] = float(stats['intersections_n_fib']) / float(stats['orig_n_fib']) * 100
 
     out_stats_file = op.abspath(endpoint_name + '_statistics.mat')
     iflogger.info("Saving matrix creation statistics as %s" % out_stats_file)
     sio.savemat(out_stats_file, stats)
 
 
+class _FiberSelection(object):
+    """ The fibers at the given (increasing) positions of ``fibers``, which
+    can be a sequence or an iterator (e.g., reading them from a file) """
+
+    def __init__(self, fibers, indices):
+        self._fibers = fibers
+        self._indices = np.asarray(indices, dtype=int)
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __iter__(self):
+        if hasattr(self._fibers, '__getitem__'):
+            for i in self._indices:
+                yield self._fibers[i]
+            return
+        selected = iter(self._indices)
+        next_index = next(selected, None)
+        for i, fiber in enumerate(self._fibers):
+            if next_index is None:
+                return
+            if i == next_index:
+                yield fiber
+                next_index = next(selected, None)
+
+
 def save_fibers(oldhdr, oldfib, fname, indices):
-    """ Stores a new trackvis file fname using only given indices """
+    """ Stores a new trackvis file fname using only given indices
+
+    ``oldfib`` may be a list of fibers or an iterator over them, such as
+    the generator returned by ``nibabel.trackvis.read(..., as_generator=True)``,
+    in which case fibers are written as they are read and ``indices`` must
+    be increasing.
+    """
     hdrnew = oldhdr.copy()
-    outstreams = []
-    for i in indices:
-        outstreams.append(oldfib[i])
+    outstreams = _FiberSelection(oldfib, indices)
     n_fib_out = len(outstreams)
     hdrnew['n_count'] = n_fib_out
     iflogger.info("Writing final non-orphan fibers as %s" % fname)
@@ -89,18 +89,46 @@ def add_dicts_by_key(in_dict1, in_dict2):
     """
     Combines two dictionaries and adds the values for those keys that are shared
     """
-    both = {}
-    for key1 in in_dict1:
-        for key2 in in_dict2:
-            if key1 == key2:
-                both[key1] = in_dict1[key1] + in_dict2[key2]
-    return both
+    return {key: in_dict1[key] + in_dict2[key]
+            for key in in_dict1 if key in in_dict2}
+
+
+def edge_data_to_arrays(ntwk, n_nodes):
+    """
+    Converts the edge attributes of a network into dense arrays
+
+    Nodes are expected to be labeled from 1 to ``n_nodes``, and each edge
+    (u, v) is stored in the upper triangle of the arrays. Returns a
+    boolean array flagging the edges of the network, and a dictionary with
+    one array per edge attribute (zero where the attribute is missing).
+    """
+    edges = ntwk.edges(data=True)
+    present = np.zeros((n_nodes, n_nodes), dtype=bool)
+    arrays = {}
+    if not edges:
+        return present, arrays
+    u, v, data = zip(*edges)
+    u = np.array(u, dtype=int) - 1
+    v = np.array(v, dtype=int) - 1
+    rows, cols = np.minimum(u, v), np.maximum(u, v)
+    present[rows, cols] = True
+    keys = set(key for d in data for key in d)
+    for key in keys:
+        arrays[key] = np.zeros((n_nodes, n_nodes))
+        has_key = np.array([key in d for d in data])
+        arrays[key][rows[has_key], cols[has_key]] = [
+            d[key] for d in data if key in d]
+    return present, arrays
 
 
 def average_networks(in_files, ntwk_res_file, group_id):
     """
     Sums the edges of input networks and divides by the number of networks
     Writes the average network as .pck and .gexf and returns the name of the written networks
+
+    The edge attributes of each network are accumulated in dense arrays
+    (see :func:`edge_data_to_arrays`), so nodes are expected to be
+    labeled from 1 to the number of nodes of the resolution network.
     """
     import networkx as nx
     import os.path as op
@@ -119,67 +147,53 @@ def average_networks(in_files, ntwk_res_file, group_id):
         iflogger.info(("{n} Nodes found in network resolution "
                        "file").format(n=ntwk_res_file.number_of_nodes()))
         ntwk = remove_all_edges(ntwk_res_file)
-        counting_ntwk = ntwk.copy()
+        n_nodes = ntwk.number_of_nodes()
+
         # Sums all the relevant variables
+        edge_count = np.zeros((n_nodes, n_nodes))
+        edge_sums = {}
+        node_sums = {}
         for index, subject in enumerate(in_files):
             tmp = nx.read_gpickle(subject)
             iflogger.info(('File {s} has {n} '
                            'edges').format(s=subject, n=tmp.number_of_edges()))
-            edges = tmp.edges_iter()
-            for edge in edges:
-                data = {}
-                data = tmp.edge[edge[0]][edge[1]]
-                data['count'] = 1
-                if ntwk.has_edge(edge[0], edge[1]):
-                    current = {}
-                    current = ntwk.edge[edge[0]][edge[1]]
-                    data = add_dicts_by_key(current, data)
-                ntwk.add_edge(edge[0], edge[1], data)
-            nodes = tmp.nodes_iter()
-            for node in nodes:
-                data = {}
-                data = ntwk.node[node]
-                if 'value' in tmp.node[node]:
-                    data['value'] = data['value'] + tmp.node[node]['value']
-                ntwk.add_node(node, data)
+            present, arrays = edge_data_to_arrays(tmp, n_nodes)
+            edge_count += present
+            for key, array in arrays.items():
+                if key in edge_sums:
+                    edge_sums[key] += array
+                else:
+                    edge_sums[key] = array
+            for node, data in tmp.nodes_iter(data=True):
+                if 'value' in data:
+                    node_sums[node] = node_sums.get(node, 0) + data['value']
+        edge_sums.pop('count', None)
 
-        # Divides each value by the number of files
-        nodes = ntwk.nodes_iter()
-        edges = ntwk.edges_iter()
         iflogger.info(('Total network has {n} '
-                       'edges').format(n=ntwk.number_of_edges()))
+                       'edges').format(n=int(np.count_nonzero(edge_count))))
+
+        # Divides each value by the number of files
         avg_ntwk = nx.Graph()
-        newdata = {}
-        for node in nodes:
-            data = ntwk.node[node]
-            newdata = data
-            if 'value' in data:
-                newdata['value'] = data['value'] / len(in_files)
-                ntwk.node[node]['value'] = newdata
+        for node, data in ntwk.nodes_iter(data=True):
+            newdata = dict(data)
+            if node in node_sums:
+                newdata['value'] = (data.get('value', 0) +
+                                    node_sums[node]) / len(in_files)
             avg_ntwk.add_node(node, newdata)
 
         edge_dict = {}
-        edge_dict['count'] = np.zeros((avg_ntwk.number_of_nodes(),
-                                       avg_ntwk.number_of_nodes()))
-        for edge in edges:
-            data = ntwk.edge[edge[0]][edge[1]]
-            if ntwk.edge[edge[0]][edge[1]]['count'] >= count_to_keep_edge:
-                for key in list(data.keys()):
-                    if not key == 'count':
-                        data[key] = data[key] / len(in_files)
-                ntwk.edge[edge[0]][edge[1]] = data
-                avg_ntwk.add_edge(edge[0], edge[1], data)
-            edge_dict['count'][edge[0] - 1][edge[1] - 1] = ntwk.edge[edge[0]][edge[1]]['count']
+        edge_dict['count'] = edge_count
+        keep = (edge_count > 0) & (edge_count >= count_to_keep_edge)
+        for key, array in edge_sums.items():
+            edge_dict[key] = np.where(keep, array / len(in_files), 0)
 
-        iflogger.info('After thresholding, the average network has has {n} edges'.format(n=avg_ntwk.number_of_edges()))
+        rows, cols = np.nonzero(keep)
+        for u, v in zip(rows, cols):
+            data = {key: edge_dict[key][u, v] for key in edge_sums}
+            data['count'] = int(edge_count[u, v])
+            avg_ntwk.add_edge(int(u) + 1, int(v) + 1, data)
 
-        avg_edges = avg_ntwk.edges_iter()
-        for edge in avg_edges:
-            data = avg_ntwk.edge[edge[0]][edge[1]]
-            for key in list(data.keys()):
-                if not key == 'count':
-                    edge_dict[key] = np.zeros((avg_ntwk.number_of_nodes(), avg_ntwk.number_of_nodes()))
-                    edge_dict[key][edge[0] - 1][edge[1] - 1] = data[key]
+        iflogger.info('After thresholding, the average network has has {n} edges'.format(n=avg_ntwk.number_of_edges()))
 
         for key in list(edge_dict.keys()):
             tmp = {}
@@ -316,6 +330,16 @@ def compute_network_measures(ntwk):
     return measures
 
 
+def dict_measure_array(measure):
+    """
+    Stacks the keys of a measure returned as a dictionary on top of its
+    values, in a 2 x N array
+    """
+    nparraykeys = np.array(list(measure.keys()))
+    nparrayvalues = np.hstack(list(measure.values()))
+    return np.vstack((nparraykeys, nparrayvalues))
+
+
 def add_node_data(node_array, ntwk):
     node_ntwk = nx.Graph()
     newdata = {}
@@ -329,17 +353,17 @@ def add_node_data(node_array, ntwk):
 
 def add_edge_data(edge_array, ntwk, above=0, below=0):
     edge_ntwk = ntwk.copy()
-    data = {}
-    for x, row in enumerate(edge_array):
-        for y in range(0, np.max(np.shape(edge_array[x]))):
-            if not edge_array[x, y] == 0:
-                data['value'] = edge_array[x, y]
-                if data['value'] <= below or data['value'] >= above:
-                    if edge_ntwk.has_edge(x + 1, y + 1):
-                        old_edge_dict = edge_ntwk.edge[x + 1][y + 1]
-                        edge_ntwk.remove_edge(x + 1, y + 1)
-                        data.update(old_edge_dict)
-                    edge_ntwk.add_edge(x + 1, y + 1, data)
+    edge_array = np.asarray(edge_array)
+    rows, cols = np.nonzero(edge_array)
+    values = edge_array[rows, cols]
+    selected = (values <= below) | (values >= above)
+    for x, y, value in zip(rows[selected].tolist(), cols[selected].tolist(),
+                           values[selected].tolist()):
+        data = {'value': value}
+        if edge_ntwk.has_edge(x + 1, y + 1):
+            data.update(edge_ntwk.edge[x + 1][y + 1])
+            edge_ntwk.remove_edge(x + 1, y + 1)
+        edge_ntwk.add_edge(x + 1, y + 1, data)
     return edge_ntwk
 
 
@@ -465,16 +489,8 @@ class NetworkXMetrics(BaseInterface):
         # stacks them together, and saves them in a MATLAB .mat file via Scipy
         global dicts
         dicts = list()
-        for idx, key in enumerate(dict_measures.keys()):
-            for idxd, keyd in enumerate(dict_measures[key].keys()):
-                if idxd == 0:
-                    nparraykeys = np.array(keyd)
-                    nparrayvalues = np.array(dict_measures[key][keyd])
-                else:
-                    nparraykeys = np.append(nparraykeys, np.array(keyd))
-                    values = np.array(dict_measures[key][keyd])
-                    nparrayvalues = np.append(nparrayvalues, values)
-            nparray = np.vstack((nparraykeys, nparrayvalues))
+        for key in dict_measures.keys():
+            nparray = dict_measure_array(dict_measures[key])
             out_file = op.abspath(self._gen_outfilename(key, 'mat'))
             npdict = {}
             npdict[key] = nparray
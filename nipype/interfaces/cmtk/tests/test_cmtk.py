@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+import os
+
+import numpy as np
+import nibabel as nb
+import networkx as nx
+import scipy.io as sio
+import pytest
+
+from .. import cmtk
+
+# ROI labels along x (1 mm isotropic voxels); x == 2 is not labeled
+LABELS = [1, 1, 0, 2, 3, 3]
+
+# Points (x coordinates, in mm) of each fiber; y = z = 0.5
+FIBERS = [
+    [0.5, 1.5, 2.5, 3.5],  # 1 -> 2, length 3
+    [0.5, 2.5, 5.5],       # 1 -> 3, length 5
+    [2.5, 4.5],            # orphan (starts unlabeled), crosses 3
+    [0.5, 3.5, 4.5],       # 1 -> 3 through 2, length 4
+    [2.5, 2.5],            # orphan, crosses nothing
+    [3.5, 0.5],            # 2 -> 1, length 3
+]
+
+
+def _points(xs):
+    return np.array([[x, 0.5, 0.5] for x in xs], dtype=np.float32)
+
+
+@pytest.fixture()
+def cmat_inputs(tmpdir):
+    tmpdir.chdir()
+    roi = np.zeros((6, 2, 2), dtype=np.int16)
+    roi[:] = np.array(LABELS)[:, None, None]
+    nb.Nifti1Image(roi, np.eye(4)).to_filename('roi.nii')
+
+    hdr = {'dim': np.array([6, 2, 2]),
+           'voxel_size': np.array([1., 1., 1.])}
+    nb.trackvis.write('fibers.trk',
+                      [(_points(xs), None, None) for xs in FIBERS], hdr)
+
+    gp = nx.Graph()
+    for label in (1, 2, 3):
+        gp.add_node(label, dn_correspondence_id=label,
+                    dn_name='roi%d' % label)
+    nx.write_gpickle(gp, 'network.pck')
+    return os.path.abspath('fibers.trk'), os.path.abspath('roi.nii')
+
+
+def _read_fibers(fname):
+    streams, _ = nb.trackvis.read(fname)
+    return [s[0][:, 0].tolist() for s in streams]
+
+
+def test_iter_fiber_chunks(cmat_inputs):
+    track_file, _ = cmat_inputs
+    chunks = list(cmtk.iter_fiber_chunks(track_file, chunk_size=4))
+    assert [len(c) for c in chunks] == [4, 2]
+    assert [f[0][:, 0].tolist() for c in chunks for f in c] == FIBERS
+
+
+@pytest.mark.parametrize('as_generator', [False, True])
+def test_fiber_selection(cmat_inputs, as_generator):
+    track_file, _ = cmat_inputs
+    streams, _ = nb.trackvis.read(track_file, as_generator=as_generator)
+    selection = cmtk._FiberSelection(streams, [0, 3, 5])
+    assert len(selection) == 3
+    assert [f[0][:, 0].tolist() for f in selection] == [
+        FIBERS[0], FIBERS[3], FIBERS[5]]
+
+
+def test_fibers_intersections(cmat_inputs):
+    fibers = [(_points(xs), None, None) for xs in FIBERS]
+    roi = np.zeros((6, 2, 2), dtype=np.int16)
+    roi[:] = np.array(LABELS)[:, None, None]
+    expected = np.array([[0, 3, 2],
+                         [3, 0, 1],
+                         [2, 1, 0]])
+
+    matrix, fiber_ids = cmtk._fibers_intersections(fibers, roi,
+                                                   (1., 1., 1.), 3)
+    assert np.array_equal(matrix, expected)
+    assert fiber_ids == [0, 1, 2, 3, 5]
+
+    # Accumulating over chunks smaller than the number of fibers
+    matrix, fiber_ids = cmtk.create_allpoints_cmat(fibers, roi, (1., 1., 1.),
+                                                   3, chunk_size=4)
+    assert np.array_equal(matrix, expected)
+    assert fiber_ids == [0, 1, 2, 3, 5]
+
+
+def test_incidence_connectivity():
+    fiber_ids = np.array([0, 0, 1, 1, 1, 2])
+    rois = np.array([1, 2, 1, 2, 3, 3])
+    assert np.array_equal(cmtk._incidence_connectivity(3, fiber_ids, rois),
+                          [[0, 2, 1], [2, 0, 1], [1, 1, 0]])
+    assert np.array_equal(
+        cmtk._incidence_connectivity(2, fiber_ids[:0], rois[:0]),
+        np.zeros((2, 2)))
+
+
+@pytest.mark.parametrize('chunk_size', [cmtk.FIBER_CHUNK_SIZE, 4])
+@pytest.mark.parametrize('intersections', [False, True])
+def test_cmat(cmat_inputs, monkeypatch, chunk_size, intersections):
+    monkeypatch.setattr(cmtk, 'FIBER_CHUNK_SIZE', chunk_size)
+    track_file, roi_file = cmat_inputs
+    cmtk.cmat(track_file, roi_file, 'network.pck', 'cmatrix.pck',
+              'cmatrix.mat', 'fibers', intersections=intersections)
+
+    # Endpoint matrices
+    assert np.array_equal(
+        np.load('fibers_endpoints.npy')[:, :, 0],
+        [[0, 3], [0, 5], [2, 4], [0, 4], [2, 2], [3, 0]])
+    assert np.allclose(
+        np.load('fibers_endpointsmm.npy')[:, :, 0],
+        [[0.5, 3.5], [0.5, 5.5], [2.5, 4.5], [0.5, 4.5], [2.5, 2.5],
+         [3.5, 0.5]])
+
+    # Fiber filtering by their endpoints
+    assert np.array_equal(
+        np.load('fibers_filtered_fiberslabel.npy'),
+        [[1, 2], [1, 3], [-1, 0], [1, 3], [-1, 0], [1, 2]])
+    assert np.array_equal(np.load('fibers_final_fiberslabels.npy'),
+                          [[1, 2], [1, 3], [1, 3], [1, 2]])
+    assert _read_fibers('fibers_streamline_final.trk') == [
+        FIBERS[0], FIBERS[1], FIBERS[3], FIBERS[5]]
+
+    # Connectivity matrices
+    assert np.array_equal(sio.loadmat('cmatrix.mat')['number_of_fibers'],
+                          [[0, 2, 2], [2, 0, 0], [2, 0, 0]])
+    assert np.allclose(
+        sio.loadmat('cmatrix_mean_fiber_length.mat')['mean_fiber_length'],
+        [[0, 3, 4.5], [3, 0, 0], [4.5, 0, 0]])
+    assert np.allclose(
+        sio.loadmat('cmatrix_median_fiber_length.mat')['median_fiber_length'],
+        [[0, 3, 4.5], [3, 0, 0], [4.5, 0, 0]])
+    assert np.allclose(
+        sio.loadmat('cmatrix_fiber_length_std.mat')['fiber_length_std'],
+        [[0, 0, 0.5], [0, 0, 0], [0.5, 0, 0]])
+
+    G = nx.read_gpickle('cmatrix.pck')
+    assert sorted(G.edges()) == [(1, 2), (1, 3)]
+    assert G.edge[1][3]['number_of_fibers'] == 2
+    assert G.edge[1][3]['fiber_length_mean'] == 4.5
+
+    stats = sio.loadmat('fibers_statistics.mat')
+    assert stats['orig_n_fib'] == 6
+    assert stats['endpoint_n_fib'] == 4
+
+    if not intersections:
+        assert np.allclose(np.load('fibers_final_fiberslength.npy'),
+                           [3, 5, 4, 3])
+        assert not os.path.exists('cmatrix_intersections.mat')
+        return
+
+    # Fiber filtering by the regions they cross
+    assert np.allclose(np.load('fibers_final_fiberslength.npy'),
+                       [3, 5, 2, 4, 3])
+    assert np.array_equal(
+        sio.loadmat('cmatrix_intersections.mat')['intersections'],
+        [[0, 3, 2], [3, 0, 1], [2, 1, 0]])
+    assert _read_fibers('fibers_intersections_streamline_final.trk') == [
+        FIBERS[0], FIBERS[1], FIBERS[2], FIBERS[3], FIBERS[5]]
+    I = nx.read_gpickle('cmatrix_intersections.pck')
+    assert I.edge[1][2]['weight'] == 3
+    assert I.edge[2][3]['weight'] == 1
+    assert stats['intersections_n_fib'] == 5
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+import os
+
+import numpy as np
+import networkx as nx
+import scipy.io as sio
+
+from .. import nx as cnx
+
+
+def _graph(edges, values=None):
+    G = nx.Graph()
+    for node in range(1, 5):
+        G.add_node(node, dn_name='roi%d' % node)
+    for node, value in (values or {}).items():
+        G.node[node]['value'] = value
+    for u, v, data in edges:
+        G.add_edge(u, v, data)
+    return G
+
+
+SUBJECTS = [
+    _graph([(1, 2, {'weight': 2., 'number_of_fibers': 4}),
+            (2, 3, {'weight': 1., 'number_of_fibers': 1})], {1: 1.}),
+    _graph([(2, 1, {'weight': 4., 'number_of_fibers': 2}),
+            (3, 4, {'weight': 3., 'number_of_fibers': 3})], {1: 2.}),
+    _graph([(1, 2, {'weight': 6., 'number_of_fibers': 3}),
+            (2, 3, {'weight': 5., 'number_of_fibers': 3}),
+            (1, 4, {'weight': 1., 'number_of_fibers': 1})]),
+]
+
+
+def _average_edges_per_edge(graphs):
+    """ The edges of the average network, merged one edge at a time as
+    average_networks used to do """
+    summed = nx.Graph()
+    for G in graphs:
+        for u, v, d in G.edges_iter(data=True):
+            data = dict(d, count=1)
+            if summed.has_edge(u, v):
+                data = cnx.add_dicts_by_key(summed.edge[u][v], data)
+            summed.add_edge(u, v, data)
+
+    average = {}
+    for u, v, d in summed.edges_iter(data=True):
+        if d['count'] >= np.round(len(graphs) / 2.0):
+            average[tuple(sorted((u, v)))] = dict(
+                (key, value if key == 'count' else value / len(graphs))
+                for key, value in d.items())
+    return average
+
+
+def test_edge_data_to_arrays():
+    G = _graph([(2, 1, {'weight': 2.}),
+                (3, 4, {'weight': 3., 'number_of_fibers': 5})])
+    present, arrays = cnx.edge_data_to_arrays(G, 4)
+    assert np.array_equal(np.argwhere(present), [[0, 1], [2, 3]])
+    assert sorted(arrays) == ['number_of_fibers', 'weight']
+    assert np.array_equal(np.argwhere(arrays['weight']), [[0, 1], [2, 3]])
+    assert arrays['weight'][0, 1] == 2.
+    assert arrays['weight'][2, 3] == 3.
+    assert np.array_equal(np.argwhere(arrays['number_of_fibers']), [[2, 3]])
+    assert arrays['number_of_fibers'][2, 3] == 5
+
+    present, arrays = cnx.edge_data_to_arrays(_graph([]), 4)
+    assert not present.any()
+    assert arrays == {}
+
+
+def test_average_networks(tmpdir):
+    tmpdir.chdir()
+    in_files = []
+    for i, G in enumerate(SUBJECTS):
+        in_files.append(os.path.abspath('subject%d.pck' % i))
+        nx.write_gpickle(G, in_files[-1])
+    nx.write_gpickle(_graph([]), 'resolution.pck')
+
+    network_name, matlab_files = cnx.average_networks(
+        in_files, os.path.abspath('resolution.pck'), 'group')
+    assert network_name == 'group_average.gexf'
+    assert os.path.exists('group_average.gexf')
+
+    avg_ntwk = nx.read_gpickle('group_average.pck')
+    expected = _average_edges_per_edge(SUBJECTS)
+    assert sorted(expected) == [(1, 2), (2, 3)]
+    assert sorted(tuple(sorted(e)) for e in avg_ntwk.edges()) == \
+        sorted(expected)
+    for (u, v), data in expected.items():
+        assert sorted(avg_ntwk.edge[u][v]) == sorted(data)
+        for key, value in data.items():
+            assert np.isclose(avg_ntwk.edge[u][v][key], value)
+
+    assert avg_ntwk.node[1]['value'] == 1.
+    assert 'value' not in avg_ntwk.node[2]
+    assert avg_ntwk.node[3]['dn_name'] == 'roi3'
+
+    assert sorted(matlab_files) == sorted(
+        os.path.abspath('group_%s_average.mat' % key)
+        for key in ('count', 'weight', 'number_of_fibers'))
+    count = np.zeros((4, 4))
+    count[0, 1], count[1, 2], count[2, 3], count[0, 3] = 3, 2, 1, 1
+    assert np.array_equal(sio.loadmat('group_count_average.mat')['count'],
+                          count)
+    weight = np.zeros((4, 4))
+    weight[0, 1], weight[1, 2] = 4., 2.
+    assert np.allclose(sio.loadmat('group_weight_average.mat')['weight'],
+                       weight)
+    number_of_fibers = np.zeros((4, 4))
+    number_of_fibers[0, 1], number_of_fibers[1, 2] = 3., 4. / 3
+    assert np.allclose(
+        sio.loadmat('group_number_of_fibers_average.mat')['number_of_fibers'],
+        number_of_fibers)
+
+
+def test_add_edge_data():
+    G = nx.Graph()
+    G.add_nodes_from([1, 2, 3])
+    G.add_edge(1, 2, weight=7.)
+    edge_array = np.array([[0., 5., 0.],
+                           [0., 0., 1.],
+                           [2., 0., 0.]])
+
+    edge_ntwk = cnx.add_edge_data(edge_array, G, above=3, below=1)
+    assert sorted(edge_ntwk.edges()) == [(1, 2), (2, 3)]
+    assert edge_ntwk.edge[1][2] == {'value': 5., 'weight': 7.}
+    assert edge_ntwk.edge[2][3] == {'value': 1.}
+    # The input network is left untouched
+    assert G.edge[1][2] == {'weight': 7.}
+
+
+def test_dict_measure_array():
+    measure = {1: 0.5, 2: 0.25, 4: 1.}
+    nparray = cnx.dict_measure_array(measure)
+    assert nparray.shape == (2, 3)
+    assert dict(zip(nparray[0], nparray[1])) == measure
@@ -10,6 +10,7 @@ from multiprocessing import (Pool, cpu_count)
 import os.path as op
 from builtins import range
 
+import numpy as np
 import nibabel as nb
 
 from ... import logging
@@ -205,31 +206,28 @@ class SimulateMultiTensor(DipyBaseInterface):
             [[ba_evals[d]] * 3 for d in range(nballs)]
 
         b0 = b0_im.get_data()[msk > 0]
-        args = []
-        for i in range(nvox):
-            args.append(
-                {'fractions': fracs[i, ...].tolist(),
-                 'sticks': [tuple(dirs[i, j:j + 3])
-                            for j in range(nsticks + nballs)],
-                 'gradients': gtab,
-                 'mevals': mevals,
-                 'S0': b0[i],
-                 'snr': self.inputs.snr
-                 })
 
         n_proc = self.inputs.n_proc
         if n_proc == 0:
             n_proc = cpu_count()
 
-        try:
-            pool = Pool(processes=n_proc, maxtasksperchild=50)
-        except TypeError:
-            pool = Pool(processes=n_proc)
+        # Voxels are sent to the workers in blocks, the gradient table and
+        # eigenvalues are only sent once per worker.
+        nchunks = max(1, min(nvox, 4 * n_proc))
+        chunks = [(fracs[idx], dirs[idx], b0[idx])
+                  for idx in np.array_split(np.arange(nvox), nchunks)]
 
         # Simulate sticks using dipy
         IFLOGGER.info(('Starting simulation of %d voxels, %d diffusion'
-                       ' directions.') % (len(args), ndirs))
-        result = np.array(pool.map(_compute_voxel, args))
+                       ' directions.') % (nvox, ndirs))
+        pool = Pool(processes=n_proc, initializer=_init_worker,
+                    initargs=(gtab, mevals, self.inputs.snr))
+        try:
+            result = np.vstack(pool.map(_compute_voxels, chunks))
+        finally:
+            pool.close()
+            pool.join()
+
         if np.shape(result)[1] != ndirs:
             raise RuntimeError(('Computed directions do not match number'
                                 'of b-values.'))
@@ -255,10 +253,27 @@ class SimulateMultiTensor(DipyBaseInterface):
         return outputs
 
 
-def _compute_voxel(args):
+# Simulation settings shared by all the voxels processed by a worker
+_WORKER_SETTINGS = {}
+
+
+def _init_worker(gtab, mevals, snr):
+    """
+    Store the gradient table, eigenvalues and SNR in the worker process
+    """
+    _WORKER_SETTINGS['gradients'] = gtab
+    _WORKER_SETTINGS['mevals'] = mevals
+    _WORKER_SETTINGS['snr'] = snr if snr > 0 else None
+
+
+def _compute_voxels(chunk):
     """
-    Simulate DW signal for one voxel. Uses the multi-tensor model and
-    three isotropic compartments.
+    Simulate DW signal for a block of voxels. Uses the multi-tensor model
+    and three isotropic compartments.
+
+    ``chunk`` is a tuple of the fractions (voxels x compartments), the
+    directions (voxels x 3 * compartments) and the baseline signal of the
+    voxels. The remaining settings are set by :func:`_init_worker`.
 
     Apparent diffusivity tensors are taken from [Alexander2002]_
     and [Pierpaoli1996]_.
@@ -270,27 +285,45 @@ def _compute_voxel(args):
     .. [Pierpaoli1996] Pierpaoli et al., Diffusion tensor MR imaging
       of the human brain, Radiology 201:637-648. 1996.
     """
-    from dipy.sims.voxel import multi_tensor
-
-    ffs = args['fractions']
-    gtab = args['gradients']
-    signal = np.zeros_like(gtab.bvals, dtype=np.float32)
-
-    # Simulate dwi signal
-    sf_vf = np.sum(ffs)
-    if sf_vf > 0.0:
-        ffs = ((np.array(ffs) / sf_vf) * 100)
-        snr = args['snr'] if args['snr'] > 0 else None
-
-        try:
-            signal, _ = multi_tensor(
-                gtab, args['mevals'], S0=args['S0'],
-                angles=args['sticks'], fractions=ffs, snr=snr)
-        except Exception as e:
-            pass
-            # IFLOGGER.warn('Exception simulating dwi signal: %s' % e)
-
-    return signal.tolist()
+    from dipy.sims.voxel import multi_tensor, add_noise
+
+    fracs, dirs, b0 = chunk
+    gtab = _WORKER_SETTINGS['gradients']
+    mevals = _WORKER_SETTINGS['mevals']
+    snr = _WORKER_SETTINGS['snr']
+
+    signal = np.zeros((len(b0), len(gtab.bvals)), dtype=np.float32)
+    sf_vf = np.sum(fracs, axis=1)
+    sticks = dirs.reshape((len(b0), -1, 3))
+    valid = sf_vf > 0.0
+
+    if any(ev[1] != ev[2] for ev in mevals):
+        # Simulate dwi signal
+        for i in np.flatnonzero(valid):
+            try:
+                signal[i], _ = multi_tensor(
+                    gtab, mevals, S0=b0[i], angles=sticks[i],
+                    fractions=(fracs[i] / sf_vf[i]) * 100, snr=snr)
+            except Exception as e:
+                pass
+                # IFLOGGER.warn('Exception simulating dwi signal: %s' % e)
+        return signal
+
+    # With axially symmetric tensors, the apparent diffusivity along a
+    # gradient g only depends on the principal direction e0:
+    # g'Dg = l2 * |g|^2 + (l1 - l2) * (g.e0)^2
+    bvals = np.asarray(gtab.bvals, dtype=np.float64)
+    bvecs = np.asarray(gtab.bvecs, dtype=np.float64)
+    gnorm2 = np.sum(bvecs ** 2, axis=1)
+    weights = fracs[valid] / sf_vf[valid, np.newaxis]
+    vsignal = np.zeros((np.count_nonzero(valid), len(bvals)))
+    for k, (l1, l2, _) in enumerate(mevals):
+        proj2 = np.dot(sticks[valid, k], bvecs.T) ** 2
+        adc = l2 * gnorm2 + (l1 - l2) * proj2
+        vsignal += weights[:, k, np.newaxis] * np.exp(-bvals * adc)
+    s0 = b0[valid, np.newaxis]
+    signal[valid] = add_noise(s0 * vsignal, snr, s0)
+    return signal
 
 
 def _generate_gradients(ndirs=64, values=[1000, 3000], nb0s=1):
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from ..base import no_dipy
+from .. import simulate
+
+
+@pytest.mark.skipif(no_dipy(), reason="dipy is not installed")
+def test_compute_voxels():
+    from dipy.core.gradients import gradient_table
+    from dipy.sims.voxel import multi_tensor
+
+    rng = np.random.RandomState(0)
+    bvecs = rng.randn(33, 3)
+    bvecs /= np.linalg.norm(bvecs, axis=1)[:, np.newaxis]
+    bvecs[0] = 0.
+    gtab = gradient_table(np.hstack((0, [1000] * 16, [3000] * 16)), bvecs)
+    mevals = [[1700e-6, 200e-6, 200e-6]] * 2 + [[3000e-6] * 3]
+
+    nvox = 20
+    dirs = rng.randn(nvox, 3, 3)
+    dirs /= np.linalg.norm(dirs, axis=2)[..., np.newaxis]
+    fracs = rng.rand(nvox, 3)
+    fracs[0] = 0.
+    b0 = rng.rand(nvox) * 1000
+
+    simulate._init_worker(gtab, mevals, 0)
+    signal = simulate._compute_voxels((fracs, dirs.reshape((nvox, -1)), b0))
+
+    assert signal.shape == (nvox, 33)
+    assert np.all(signal[0] == 0.)
+    for i in range(1, nvox):
+        expected, _ = multi_tensor(gtab, mevals, S0=b0[i], angles=dirs[i],
+                                   fractions=fracs[i] / fracs[i].sum() * 100,
+                                   snr=None)
+        assert np.allclose(signal[i], expected, rtol=1e-4)
@@ -23,19 +23,28 @@ from builtins import object, zip, filter, range, open, str
 
 import glob
 import fnmatch
+import errno
 import string
 import os
 import os.path as op
 import shutil
 import subprocess
 import re
+import stat
 import tempfile
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 from warnings import warn
 
 import sqlite3
 
 from .. import config, logging
-from ..utils.filemanip import copyfile, list_to_filename, filename_to_list
+from ..utils.filemanip import (copyfile, list_to_filename, filename_to_list,
+                               append_json_line, load_json_lines,
+                               append_json_record, load_json_records,
+                               get_related_files, split_filename,
+                               hash_infile, load_json, save_json)
 from ..utils.misc import human_order_sorted, str2bool
 from .base import (
     TraitedSpec, traits, Str, File, Directory, BaseInterface, InputMultiPath,
@@ -59,6 +68,12 @@ except:
 
 iflogger = logging.getLogger('interface')
 
+# Files larger than this are uploaded to S3 in parts of the given size
+S3_MULTIPART_THRESHOLD = 64 * 1024 * 1024
+S3_MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+# Bytes read at a time when computing checksums of files uploaded to S3
+S3_HASH_CHUNK_SIZE = 1024 * 1024
+
 def copytree(src, dst, use_hardlink=False):
     """Recursively copy a directory tree using
     nipype.utils.filemanip.copyfile()
@@ -95,6 +110,64 @@ def copytree(src, dst, use_hardlink=False):
         raise Exception(errors)
 
 
+def _makedirs(path, made_dirs=None):
+    """Create ``path`` (and its parents) unless it is in ``made_dirs``, a
+    set of the directories already created during this run"""
+    if made_dirs is not None and path in made_dirs:
+        return
+    try:
+        os.makedirs(path)
+    except OSError as inst:
+        if inst.errno != errno.EEXIST or not op.isdir(path):
+            raise
+    if made_dirs is not None:
+        made_dirs.add(path)
+
+
+def _mtime(st):
+    return getattr(st, 'st_mtime_ns', st.st_mtime)
+
+
+def _same_stat(src, dst):
+    """True if ``dst`` is a regular file of the size and mtime of ``src``"""
+    try:
+        src_stat = os.stat(src)
+        dst_stat = os.lstat(dst)
+    except OSError:
+        return False
+    return (stat.S_ISREG(dst_stat.st_mode) and
+            src_stat.st_size == dst_stat.st_size and
+            _mtime(src_stat) == _mtime(dst_stat))
+
+
+def _sink_file(src, dst, use_hardlink=False):
+    """Copy (or hard link) ``src`` and its related files to ``dst``
+
+    Destinations that already have the size and modification time of their
+    source are left untouched, and copies get the modification time of
+    their source, so that re-running a sink does not hash any content.
+    Otherwise :func:`~nipype.utils.filemanip.copyfile` is used, which only
+    hashes files of equal sizes.
+    """
+    pairs = [(src, dst)]
+    if split_filename(src)[2] == split_filename(dst)[2]:
+        pairs = list(zip(get_related_files(src), get_related_files(dst)))
+
+    for alt_src, alt_dst in pairs:
+        if not op.exists(alt_src) or _same_stat(alt_src, alt_dst):
+            continue
+        copyfile(alt_src, alt_dst, copy=True, hashmethod='content',
+                 use_hardlink=use_hardlink, copy_related_files=False)
+        src_stat = os.stat(alt_src)
+        if _mtime(src_stat) != _mtime(os.stat(alt_dst)):
+            if hasattr(src_stat, 'st_mtime_ns'):
+                os.utime(alt_dst, ns=(src_stat.st_atime_ns,
+                                      src_stat.st_mtime_ns))
+            else:
+                os.utime(alt_dst, (src_stat.st_atime, src_stat.st_mtime))
+    return dst
+
+
 def add_traits(base, names, trait_type=None):
     """ Add traits to a traited class.
 
@@ -196,6 +269,10 @@ class DataSinkInputSpec(DynamicTraitedSpec, BaseInterfaceInputSpec):
     _outputs = traits.Dict(Str, value={}, usedefault=True)
     remove_dest_dir = traits.Bool(False, usedefault=True,
                                   desc='remove dest directory when copying dirs')
+    num_copy_threads = traits.Int(4, usedefault=True,
+                                  desc='number of threads copying (or hard '
+                                       'linking) files or uploading them to '
+                                       'S3 concurrently')
 
     # AWS S3 data attributes
     creds_path = Str(desc='Filepath to AWS credentials file for S3 bucket '\
@@ -342,6 +419,16 @@ class DataSink(IOBase):
             dst = dst[1:]
         return dst
 
+    # Compile regexp substitutions once for all the paths of a run
+    def _compiled_substitutions(self):
+        substitutions = tuple(self.inputs.regexp_substitutions)
+        cached = getattr(self, '_regexp_cache', None)
+        if cached is None or cached[0] != substitutions:
+            cached = (substitutions, [(re.compile(key), val)
+                                      for key, val in substitutions])
+            self._regexp_cache = cached
+        return cached[1]
+
     # Substitute paths in substitutions dictionary parameter
     def _substitute(self, pathstr):
         pathstr_ = pathstr
@@ -353,12 +440,13 @@ class DataSink(IOBase):
                     iflogger.debug('sub.str: %s -> %s using %r -> %r'
                                    % (oldpathstr, pathstr, key, val))
         if isdefined(self.inputs.regexp_substitutions):
-            for key, val in self.inputs.regexp_substitutions:
+            for regexp, val in self._compiled_substitutions():
                 oldpathstr = pathstr
-                pathstr, _ = re.subn(key, val, pathstr)
+                pathstr, _ = regexp.subn(val, pathstr)
                 if pathstr != oldpathstr:
                     iflogger.debug('sub.regexp: %s -> %s using %r -> %r'
-                                   % (oldpathstr, pathstr, key, val))
+                                   % (oldpathstr, pathstr, regexp.pattern,
+                                      val))
         if pathstr_ != pathstr:
             iflogger.info('sub: %s -> %s' % (pathstr_, pathstr))
         return pathstr
@@ -558,21 +646,14 @@ class DataSink(IOBase):
         # Return the bucket
         return bucket
 
-    # Send up to S3 method
-    def _upload_to_s3(self, bucket, src, dst):
+    # List the files and keys to upload to S3
+    def _s3_upload_jobs(self, bucket, src, dst):
         '''
-        Method to upload outputs to S3 bucket instead of on local disk
+        Method to list the (source file, key name) pairs needed to upload
+        src (a file or a directory) to dst in an S3 bucket
         '''
 
-        # Import packages
-        import hashlib
-        import logging
-        import os
-
-        from botocore.exceptions import ClientError
-
         # Init variables
-        iflogger = logging.getLogger('interface')
         s3_str = 's3://'
         s3_prefix = s3_str + bucket.name
 
@@ -594,39 +675,95 @@ class DataSink(IOBase):
             src_files = [src]
             dst_files = [dst]
 
-        # Iterate over src and copy to dst
-        for src_idx, src_f in enumerate(src_files):
-            # Get destination filename/keyname
-            dst_f = dst_files[src_idx]
-            dst_k = dst_f.replace(s3_prefix, '').lstrip('/')
+        return [(src_f, dst_f.replace(s3_prefix, '').lstrip('/'))
+                for src_f, dst_f in zip(src_files, dst_files)]
 
-            # See if same file is already up there
-            try:
-                dst_obj = bucket.Object(key=dst_k)
-                dst_md5 = dst_obj.e_tag.strip('"')
+    # Upload one file to S3, unless it is already there
+    def _upload_s3_file(self, client, bucket_name, src_f, dst_k,
+                        transfer_config=None):
+        '''
+        Method to upload a file to an S3 bucket, skipping it if an object of
+        the same size and checksum exists. The md5 of the file is computed
+        in a streaming way and stored in the object metadata, since ETags
+        are not md5 checksums for multipart uploads.
+        '''
 
-                # See if same file is already there
-                src_read = open(src_f, 'rb').read()
-                src_md5 = hashlib.md5(src_read).hexdigest()
-                # Move to next loop iteration
+        # Import packages
+        from botocore.exceptions import ClientError
+
+        # See if same file is already up there
+        src_md5 = None
+        try:
+            head = client.head_object(Bucket=bucket_name, Key=dst_k)
+        except ClientError:
+            iflogger.info('New file to S3')
+        else:
+            # Only hash the source if sizes match
+            if head['ContentLength'] == os.path.getsize(src_f):
+                src_md5 = hash_infile(src_f, chunk_len=S3_HASH_CHUNK_SIZE)
+                dst_md5 = head.get('Metadata', {}).get('md5') or \
+                    head['ETag'].strip('"')
+                # Move to next file
                 if dst_md5 == src_md5:
-                    iflogger.info('File %s already exists on S3, skipping...' % dst_f)
-                    continue
-                else:
-                    iflogger.info('Overwriting previous S3 file...')
+                    iflogger.info('File %s already exists on S3, skipping...'
+                                  % dst_k)
+                    return False
+            iflogger.info('Overwriting previous S3 file...')
+
+        if src_md5 is None:
+            src_md5 = hash_infile(src_f, chunk_len=S3_HASH_CHUNK_SIZE)
+
+        # Copy file up to S3 (either encrypted or not)
+        iflogger.info('Uploading %s to S3 bucket, %s, as %s...'\
+                      % (src_f, bucket_name, dst_k))
+        extra_args = {'Metadata': {'md5': src_md5}}
+        if self.inputs.encrypt_bucket_keys:
+            extra_args['ServerSideEncryption'] = 'AES256'
+        client.upload_file(src_f, bucket_name, dst_k, ExtraArgs=extra_args,
+                           Callback=ProgressPercentage(src_f),
+                           Config=transfer_config)
+        return True
+
+    # Upload a list of (file, key) pairs concurrently
+    def _upload_s3_jobs(self, bucket, jobs):
+        '''
+        Method to upload (source file, key name) pairs to an S3 bucket with
+        a pool of num_copy_threads threads, using multipart transfers for
+        files larger than S3_MULTIPART_THRESHOLD
+        '''
+
+        # Import packages
+        from boto3.s3.transfer import TransferConfig
 
-            except ClientError:
-                iflogger.info('New file to S3')
+        # boto3 clients (unlike resources) are thread-safe
+        client = bucket.meta.client
+        transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=S3_MULTIPART_CHUNKSIZE)
 
-            # Copy file up to S3 (either encrypted or not)
-            iflogger.info('Uploading %s to S3 bucket, %s, as %s...'\
-                          % (src_f, bucket.name, dst_f))
-            if self.inputs.encrypt_bucket_keys:
-                extra_args = {'ServerSideEncryption' : 'AES256'}
-            else:
-                extra_args = {}
-            bucket.upload_file(src_f, dst_k, ExtraArgs=extra_args,
-                               Callback=ProgressPercentage(src_f))
+        def _upload_job(job):
+            return self._upload_s3_file(client, bucket.name, job[0], job[1],
+                                        transfer_config)
+
+        nthreads = min(self.inputs.num_copy_threads, len(jobs))
+        if nthreads > 1:
+            pool = ThreadPool(nthreads)
+            try:
+                uploaded = pool.map(_upload_job, jobs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            uploaded = [_upload_job(job) for job in jobs]
+        return sum(uploaded)
+
+    # Send up to S3 method
+    def _upload_to_s3(self, bucket, src, dst):
+        '''
+        Method to upload outputs to S3 bucket instead of on local disk
+        '''
+        return self._upload_s3_jobs(bucket,
+                                    self._s3_upload_jobs(bucket, src, dst))
 
     # List outputs, main run routine
     def _list_outputs(self):
@@ -679,18 +816,16 @@ class DataSink(IOBase):
             outdir = os.path.join(outdir, self.inputs.container)
             s3dir = os.path.join(s3dir, self.inputs.container)
 
+        # Directories created in this run and files to copy, by destination
+        made_dirs = set()
+        copy_jobs = OrderedDict()
+        s3_jobs = []
+
         # If sinking to local folder
         if outdir != s3dir:
             outdir = os.path.abspath(outdir)
             # Create the directory if it doesn't exist
-            if not os.path.exists(outdir):
-                try:
-                    os.makedirs(outdir)
-                except OSError as inst:
-                    if 'File exists' in inst:
-                        pass
-                    else:
-                        raise(inst)
+            _makedirs(outdir, made_dirs)
 
         # Iterate through outputs attributes {key : path(s)}
         for key, files in list(self.inputs._outputs.items()):
@@ -727,26 +862,19 @@ class DataSink(IOBase):
                 dst = self._substitute(dst)
                 path, _ = os.path.split(dst)
 
-                # If we're uploading to S3
+                # If we're uploading to S3, queue the upload
                 if s3_flag:
-                    self._upload_to_s3(bucket, src, s3dst)
+                    s3_jobs.extend(self._s3_upload_jobs(bucket, src, s3dst))
                     out_files.append(s3dst)
                 # Otherwise, copy locally src -> dst
                 if not s3_flag or isdefined(self.inputs.local_copy):
                     # Create output directory if it doesnt exist
-                    if not os.path.exists(path):
-                        try:
-                            os.makedirs(path)
-                        except OSError as inst:
-                            if 'File exists' in inst:
-                                pass
-                            else:
-                                raise(inst)
-                    # If src is a file, copy it to dst
+                    _makedirs(path, made_dirs)
+                    # If src is a file, queue its copy to dst
                     if os.path.isfile(src):
                         iflogger.debug('copyfile: %s %s' % (src, dst))
-                        copyfile(src, dst, copy=True, hashmethod='content',
-                                 use_hardlink=use_hardlink)
+                        copy_jobs.pop(dst, None)
+                        copy_jobs[dst] = src
                         out_files.append(dst)
                     # If src is a directory, copy entire contents to dst dir
                     elif os.path.isdir(src):
@@ -757,6 +885,26 @@ class DataSink(IOBase):
                         copytree(src, dst)
                         out_files.append(dst)
 
+        # Upload files to S3 with a pool of threads
+        if s3_jobs:
+            self._upload_s3_jobs(bucket, s3_jobs)
+
+        # Copy files with a pool of threads
+        def _copy_job(job):
+            return _sink_file(job[1], job[0], use_hardlink=use_hardlink)
+
+        nthreads = min(self.inputs.num_copy_threads, len(copy_jobs))
+        if nthreads > 1:
+            pool = ThreadPool(nthreads)
+            try:
+                pool.map(_copy_job, list(copy_jobs.items()))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for job in list(copy_jobs.items()):
+                _copy_job(job)
+
         # Return outputs dictionary
         outputs['out_file'] = out_files
 
@@ -982,6 +1130,184 @@ class S3DataGrabber(IOBase):
         return localpath
 
 
+def _scan_directory(path):
+    """Returns a (name, is_dir, is_symlink) tuple for each entry of a
+    directory, where is_dir follows symlinks as os.walk does"""
+    scandir = getattr(os, 'scandir', None)
+    if scandir is None:
+        try:
+            from scandir import scandir
+        except ImportError:
+            entries = []
+            for name in os.listdir(path):
+                full_path = op.join(path, name)
+                entries.append((name, op.isdir(full_path),
+                                op.islink(full_path)))
+            return entries
+
+    entries = []
+    for entry in scandir(path):
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        entries.append((entry.name, is_dir, entry.is_symlink()))
+    return entries
+
+
+def _list_directory(path):
+    """Returns the sorted names of all the entries of a directory and of
+    its subdirectories (following symlinks)"""
+    entries = _scan_directory(path)
+    return (sorted(name for name, _, _ in entries),
+            sorted(name for name, is_dir, _ in entries if is_dir))
+
+
+class DirectoryIndex(object):
+    """An index of the entries of the directories below ``root``, used to
+    resolve glob patterns without scanning the filesystem every time.
+
+    Directories are listed (with ``os.scandir``) the first time a pattern
+    reaches them. After each :meth:`refresh`, a directory is validated once,
+    with a ``stat`` of its modification time, and listed again only if it
+    changed. If ``index_file`` is given, the listings are persisted there
+    by :meth:`save` so that later runs only need those ``stat`` calls.
+
+    >>> import os
+    >>> index = DirectoryIndex(os.getcwd())
+    >>> [os.path.basename(f) for f in index.glob('T1*.nii')]
+    ['T1.nii', 'T1_brain.nii']
+
+    """
+
+    def __init__(self, root, index_file=None):
+        self.root = op.abspath(root)
+        self.index_file = index_file
+        self._prefix = op.join(self.root, '')
+        self._entries = self._load()
+        self._listings = {}
+        self._checked = set()
+        self._dirty = False
+
+    def _load(self):
+        if not self.index_file or not op.exists(self.index_file):
+            return {}
+        try:
+            data = load_json(self.index_file)
+        except ValueError:
+            iflogger.warning('Ignoring corrupt directory index %s',
+                             self.index_file)
+            return {}
+        if data.get('root') != self.root:
+            return {}
+        return data.get('entries', {})
+
+    def refresh(self):
+        """Validate the directories again the next time patterns reach them,
+        picking up the changes made since they were listed"""
+        self._listings = {}
+
+    def _listing(self, reldir):
+        """Returns the sets of entry and subdirectory names of
+        ``root/reldir``, or None if it is not a directory"""
+        if reldir in self._listings:
+            return self._listings[reldir]
+
+        self._checked.add(reldir)
+        path = op.join(self.root, reldir)
+        try:
+            dir_stat = os.stat(path)
+        except OSError:
+            dir_stat = None
+        if dir_stat is None or not stat.S_ISDIR(dir_stat.st_mode):
+            self._dirty |= self._entries.pop(reldir, None) is not None
+            self._listings[reldir] = None
+            return None
+
+        entry = self._entries.get(reldir)
+        if entry is None or entry[0] != _mtime(dir_stat):
+            names, dirs = _list_directory(path)
+            entry = self._entries[reldir] = [_mtime(dir_stat), names, dirs]
+            self._dirty = True
+        listing = self._listings[reldir] = (set(entry[1]), set(entry[2]))
+        return listing
+
+    def glob(self, pattern):
+        """Return the paths matching ``pattern``, like ``glob.glob``
+        (patterns outside of ``root`` are passed on to ``glob.glob``)"""
+        path = op.abspath(pattern)
+        if path == self.root:
+            return [self.root]
+        if not path.startswith(self._prefix):
+            return glob.glob(pattern)
+
+        parts = path[len(self._prefix):].split(os.sep)
+        matches = ['']
+        for i, part in enumerate(parts):
+            last = i == len(parts) - 1
+            magic = glob.has_magic(part)
+            found = []
+            for reldir in matches:
+                listing = self._listing(reldir)
+                if listing is None:
+                    continue
+                candidates = listing[0] if last else listing[1]
+                if magic:
+                    hits = fnmatch.filter(candidates, part)
+                    if not part.startswith('.'):
+                        hits = [hit for hit in hits if not hit.startswith('.')]
+                    hits.sort()
+                elif part in candidates:
+                    hits = [part]
+                else:
+                    continue
+                prefix = reldir + os.sep if reldir else ''
+                found.extend(prefix + hit for hit in hits)
+            matches = found
+        return [self._prefix + match for match in matches]
+
+    def save(self):
+        """Persist the listings to ``index_file``, merged with the listings
+        saved by other processes meanwhile"""
+        if not self.index_file or not self._dirty:
+            return
+        entries = self._load()
+        for reldir in self._checked:
+            if reldir in self._entries:
+                entries[reldir] = self._entries[reldir]
+            else:
+                entries.pop(reldir, None)
+
+        tmp_file = '%s.%d.tmp' % (self.index_file, os.getpid())
+        save_json(tmp_file, {'root': self.root, 'entries': entries})
+        os.rename(tmp_file, self.index_file)
+        self._dirty = False
+
+
+# Directory indexes used in this process, by root and index file
+_DIRECTORY_INDEXES = {}
+
+
+def _get_directory_index(inputs):
+    """Returns the :class:`DirectoryIndex` requested by the ``use_index``
+    and ``index_file`` inputs of a grabber, or None
+
+    The index is refreshed, so that each run of the grabber sees the
+    current contents of the directories.
+    """
+    if not inputs.use_index or not isdefined(inputs.base_directory):
+        return None
+    index_file = None
+    if isdefined(inputs.index_file):
+        index_file = op.abspath(inputs.index_file)
+    key = (op.abspath(inputs.base_directory), index_file)
+    if key not in _DIRECTORY_INDEXES:
+        _DIRECTORY_INDEXES[key] = DirectoryIndex(*key)
+    index = _DIRECTORY_INDEXES[key]
+    index.refresh()
+    return index
+
+
 class DataGrabberInputSpec(DynamicTraitedSpec, BaseInterfaceInputSpec):
     base_directory = Directory(exists=True,
                                desc='Path to the base directory consisting of subject data.')
@@ -994,6 +1320,12 @@ class DataGrabberInputSpec(DynamicTraitedSpec, BaseInterfaceInputSpec):
     template_args = traits.Dict(key_trait=Str,
                                 value_trait=traits.List(traits.List),
                                 desc='Information to plug into template')
+    use_index = traits.Bool(False, usedefault=True,
+                            desc=('resolve templates with an index of the '
+                                  'base directory instead of globbing it '
+                                  'every time'))
+    index_file = File(desc=('file persisting the index across runs '
+                            '(with use_index)'))
 
 
 class DataGrabber(IOBase):
@@ -1110,6 +1442,9 @@ class DataGrabber(IOBase):
                         (self.__class__.__name__, key)
                     raise ValueError(msg)
 
+        index = _get_directory_index(self.inputs)
+        globfn = index.glob if index is not None else glob.glob
+
         outputs = {}
         for key, args in list(self.inputs.template_args.items()):
             outputs[key] = []
@@ -1124,7 +1459,7 @@ class DataGrabber(IOBase):
             else:
                 template = os.path.abspath(template)
             if not args:
-                filelist = glob.glob(template)
+                filelist = globfn(template)
                 if len(filelist) == 0:
                     msg = 'Output key: %s Template: %s returned no files' % (
                         key, template)
@@ -1162,7 +1497,7 @@ class DataGrabber(IOBase):
                             filledtemplate = template % tuple(argtuple)
                         except TypeError as e:
                             raise TypeError(e.message + ": Template %s failed to convert with args %s" % (template, str(tuple(argtuple))))
-                    outfiles = glob.glob(filledtemplate)
+                    outfiles = globfn(filledtemplate)
                     if len(outfiles) == 0:
                         msg = 'Output key: %s Template: %s returned no files' % (key, filledtemplate)
                         if self.inputs.raise_on_empty:
@@ -1180,6 +1515,8 @@ class DataGrabber(IOBase):
                 outputs[key] = None
             elif len(outputs[key]) == 1:
                 outputs[key] = outputs[key][0]
+        if index is not None:
+            index.save()
         return outputs
 
 
@@ -1197,6 +1534,12 @@ class SelectFilesInputSpec(DynamicTraitedSpec, BaseInterfaceInputSpec):
                                       "matches the template. Either a boolean that applies to all "
                                       "output fields or a list of output field names to coerce to "
                                       " a list"))
+    use_index = traits.Bool(False, usedefault=True,
+                            desc=("Resolve templates with an index of the "
+                                  "base directory instead of globbing it "
+                                  "every time."))
+    index_file = File(desc=("File persisting the index across runs "
+                            "(with use_index)."))
 
 
 class SelectFiles(IOBase):
@@ -1292,6 +1635,9 @@ class SelectFiles(IOBase):
                    "'templates'.") % (plural, bad_fields, verb)
             raise ValueError(msg)
 
+        index = _get_directory_index(self.inputs)
+        globfn = index.glob if index is not None else glob.glob
+
         for field, template in list(self._templates.items()):
 
             # Build the full template path
@@ -1303,7 +1649,7 @@ class SelectFiles(IOBase):
 
             # Fill in the template and glob for files
             filled_template = template.format(**info)
-            filelist = glob.glob(filled_template)
+            filelist = globfn(filled_template)
 
             # Handle the case where nothing matched
             if not filelist:
@@ -1324,9 +1670,77 @@ class SelectFiles(IOBase):
 
             outputs[field] = filelist
 
+        if index is not None:
+            index.save()
         return outputs
 
 
+def _combine_regexes(regexes):
+    """Compiles a list of regular expressions into a single alternation.
+
+    Falls back to a list of compiled expressions when the patterns cannot
+    be safely combined (repeated group names, numbered backreferences or
+    inline flags).
+    """
+    compiled = [re.compile(regex) for regex in regexes]
+    if len(compiled) < 2:
+        return compiled
+    if any(re.search(r'\\[1-9]|\(\?[aiLmsux]+\)', regex.pattern)
+           for regex in compiled):
+        return compiled
+    try:
+        return [re.compile('|'.join('(?:%s)' % regex.pattern
+                                    for regex in compiled))]
+    except re.error:
+        return compiled
+
+
+def _walk_paths(top, depth, min_depth, max_depth, prune=None, pool=None):
+    """Returns the paths DataFinder tests below the directory ``top``, which
+    sits ``depth`` levels beneath its root path.
+
+    Matches the paths of an os.walk based search: directories deeper
+    than ``min_depth - 1``, files from directories shallower than
+    ``max_depth`` and no symlinked directories. Directories at
+    ``max_depth`` are not listed at all and directories for which
+    ``prune(path)`` is true are not descended into. If a thread ``pool`` is
+    given, the subdirectories of ``top`` are walked concurrently.
+    """
+    paths = []
+    stack = [(top, depth)]
+    while stack:
+        curr_dir, curr_depth = stack.pop()
+        if max_depth is not None and curr_depth >= max_depth:
+            # os.walk only yields the directories it can list
+            if curr_depth >= min_depth and os.access(curr_dir, os.R_OK):
+                paths.append(curr_dir)
+            continue
+        try:
+            entries = _scan_directory(curr_dir)
+        except OSError:
+            continue
+        if curr_depth >= min_depth:
+            paths.append(curr_dir)
+        sub_dirs = []
+        for name, is_dir, is_link in entries:
+            full_path = op.join(curr_dir, name)
+            if not is_dir:
+                if curr_depth >= (min_depth - 1):
+                    paths.append(full_path)
+            elif not is_link and (prune is None or not prune(full_path)):
+                sub_dirs.append(full_path)
+        if pool is not None:
+            for sub_paths in pool.map(
+                    lambda sub_dir: _walk_paths(sub_dir, curr_depth + 1,
+                                                min_depth, max_depth, prune),
+                    sub_dirs):
+                paths.extend(sub_paths)
+            break
+        stack.extend((sub_dir, curr_depth + 1)
+                     for sub_dir in reversed(sub_dirs))
+    return paths
+
+
 class DataFinderInputSpec(DynamicTraitedSpec, BaseInterfaceInputSpec):
     root_paths = traits.Either(traits.List(),
                                Str(),
@@ -1346,6 +1760,9 @@ class DataFinderInputSpec(DynamicTraitedSpec, BaseInterfaceInputSpec):
     unpack_single = traits.Bool(False,
                                 usedefault=True,
                                 desc="Unpack single results from list")
+    num_walk_threads = traits.Int(1, usedefault=True,
+                                  desc=("Number of threads walking the "
+                                        "subdirectories of each root path"))
 
 
 class DataFinder(IOBase):
@@ -1387,11 +1804,23 @@ class DataFinder(IOBase):
     output_spec = DynamicTraitedSpec
     _always_run = True
 
-    def _match_path(self, target_path):
-        # Check if we should ignore the path
+    def _is_ignored(self, target_path):
         for ignore_re in self.ignore_regexes:
             if ignore_re.search(target_path):
-                return
+                return True
+        return False
+
+    def _prune_dir(self, dir_path):
+        # Only skip a directory that is ignored itself and whose entries
+        # would all be ignored too, i.e. when the ignore expressions also
+        # match the directory path followed by a separator and any name
+        return (self._is_ignored(dir_path) and
+                self._is_ignored(dir_path + os.sep + '\0'))
+
+    def _match_path(self, target_path):
+        # Check if we should ignore the path
+        if self._is_ignored(target_path):
+            return
         # Check if we can match the path
         match = self.match_regex.search(target_path)
         if match is not None:
@@ -1420,35 +1849,29 @@ class DataFinder(IOBase):
         if self.inputs.ignore_regexes is Undefined:
             self.ignore_regexes = []
         else:
-            self.ignore_regexes = \
-                [re.compile(regex)
-                 for regex in self.inputs.ignore_regexes]
+            self.ignore_regexes = _combine_regexes(self.inputs.ignore_regexes)
+        prune = self._prune_dir if self.ignore_regexes else None
         self.result = None
-        for root_path in self.inputs.root_paths:
-            # Handle tilda/env variables and remove extra seperators
-            root_path = os.path.normpath(os.path.expandvars(os.path.expanduser(root_path)))
-            # Check if the root_path is a file
-            if os.path.isfile(root_path):
-                if min_depth == 0:
-                    self._match_path(root_path)
-                continue
-            # Walk through directory structure checking paths
-            for curr_dir, sub_dirs, files in os.walk(root_path):
-                # Determine the current depth from the root_path
-                curr_depth = (curr_dir.count(os.sep) -
-                              root_path.count(os.sep))
-                # If the max path depth has been reached, clear sub_dirs
-                # and files
-                if max_depth is not None and curr_depth >= max_depth:
-                    sub_dirs[:] = []
-                    files = []
-                # Test the path for the curr_dir and all files
-                if curr_depth >= min_depth:
-                    self._match_path(curr_dir)
-                if curr_depth >= (min_depth - 1):
-                    for infile in files:
-                        full_path = os.path.join(curr_dir, infile)
-                        self._match_path(full_path)
+        pool = None
+        if self.inputs.num_walk_threads > 1:
+            pool = ThreadPool(self.inputs.num_walk_threads)
+        try:
+            for root_path in self.inputs.root_paths:
+                # Handle tilda/env variables and remove extra seperators
+                root_path = os.path.normpath(os.path.expandvars(os.path.expanduser(root_path)))
+                # Check if the root_path is a file
+                if os.path.isfile(root_path):
+                    if min_depth == 0:
+                        self._match_path(root_path)
+                    continue
+                # Walk through directory structure checking paths
+                for path in _walk_paths(root_path, 0, min_depth, max_depth,
+                                        prune=prune, pool=pool):
+                    self._match_path(path)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
         if (self.inputs.unpack_single and
                 len(self.result['out_paths']) == 1):
             for key, vals in list(self.result.items()):
@@ -1597,8 +2020,11 @@ class FreeSurferSource(IOBase):
     output_spec = FSSourceOutputSpec
     _always_run = True
     _additional_metadata = ['loc', 'altkey']
+    # Outputs to look up (all of them if empty), set by the node running
+    # this interface to the outputs connected downstream
+    needed_outputs = None
 
-    def _get_files(self, path, key, dirval, altkey=None):
+    def _get_files(self, path, key, dirval, altkey=None, listings=None):
         globsuffix = ''
         if dirval == 'mri':
             globsuffix = '.mgz'
@@ -1620,19 +2046,33 @@ class FreeSurferSource(IOBase):
         keydir = os.path.join(path, dirval)
         if altkey:
             key = altkey
-        globpattern = os.path.join(
-            keydir, ''.join((globprefix, key, globsuffix)))
-        return [os.path.abspath(f) for f in glob.glob(globpattern)]
+        globpattern = ''.join((globprefix, key, globsuffix))
+
+        # List each subject subdirectory once for all the keys it holds
+        if listings is None:
+            listings = {}
+        if keydir not in listings:
+            try:
+                listings[keydir] = [name for name in _list_directory(keydir)[0]
+                                    if not name.startswith('.')]
+            except OSError:
+                listings[keydir] = []
+        return [os.path.abspath(os.path.join(keydir, f))
+                for f in fnmatch.filter(listings[keydir], globpattern)]
 
     def _list_outputs(self):
         subjects_dir = self.inputs.subjects_dir
         subject_path = os.path.join(subjects_dir, self.inputs.subject_id)
         output_traits = self._outputs()
         outputs = output_traits.get()
+        listings = {}
         for k in list(outputs.keys()):
+            if self.needed_outputs and k not in self.needed_outputs:
+                continue
             val = self._get_files(subject_path, k,
                                   output_traits.traits()[k].loc,
-                                  output_traits.traits()[k].altkey)
+                                  output_traits.traits()[k].altkey,
+                                  listings)
             if val:
                 outputs[k] = list_to_filename(val)
         return outputs
@@ -2079,9 +2519,66 @@ def push_provenance():
     pass
 
 
+def _buffer_sql_row(buffer_file, table_name, columns, values):
+    """Queues one row for :func:`_flush_sql_rows`"""
+    append_json_line(buffer_file, {'table': table_name,
+                                   'columns': list(columns),
+                                   'values': list(values)})
+
+
+def _flush_sql_rows(buffer_file, conn, statement, placeholder):
+    """Writes the rows queued in ``buffer_file`` with one ``executemany``
+    per table and set of columns, all in a single transaction, and removes
+    the buffer once committed. Returns the number of rows written.
+    """
+    if not op.exists(buffer_file):
+        return 0
+
+    batches = {}
+    for record in load_json_lines(buffer_file):
+        key = (record['table'], tuple(record['columns']))
+        batches.setdefault(key, []).append(record['values'])
+
+    c = conn.cursor()
+    try:
+        for (table_name, columns), rows in list(batches.items()):
+            c.executemany("%s INTO %s (" % (statement, table_name) +
+                          ",".join(columns) + ") VALUES (" +
+                          ",".join([placeholder] * len(columns)) + ")",
+                          rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        c.close()
+
+    os.remove(buffer_file)
+    return sum(len(rows) for rows in batches.values())
+
+
+def _buffered_sink_settings(sink, inputs, required):
+    """Returns the inputs of a buffered sink (those of the interface,
+    updated with ``inputs``), or None if there is no buffer to flush"""
+    settings = sink.inputs.get_traitsfree()
+    settings.update(inputs or {})
+    buffer_file = settings.get('buffer_file')
+    if buffer_file is None or not op.exists(buffer_file):
+        return None
+    missing = [name for name in required if settings.get(name) is None]
+    if missing:
+        raise ValueError('Cannot flush the rows buffered in %s: %s not set' %
+                         (buffer_file, ', '.join(missing)))
+    return settings
+
+
 class SQLiteSinkInputSpec(DynamicTraitedSpec, BaseInterfaceInputSpec):
     database_file = File(exists=True, mandatory=True)
     table_name = Str(mandatory=True)
+    buffer_file = File(hash_files=False,
+                       desc=('queue rows in this file instead of writing '
+                             'them, to be inserted in a single transaction '
+                             'when the workflow finishes'))
 
 
 class SQLiteSink(IOBase):
@@ -2092,6 +2589,14 @@ class SQLiteSink(IOBase):
             This is not a thread-safe node because it can write to a common
             shared location. It will not complain when it overwrites a file.
 
+        If ``buffer_file`` is set, rows are appended to it (see
+        :func:`~nipype.utils.filemanip.append_json_line`) and inserted all
+        at once by ``Workflow.run`` when the workflow finishes. This avoids
+        one commit per node and ``database is locked`` errors with
+        concurrent writers. In that mode, the database is switched to
+        write-ahead logging (WAL), which SQLite does not support on network
+        filesystems.
+
         Examples
         --------
 
@@ -2112,20 +2617,49 @@ class SQLiteSink(IOBase):
         self._input_names = filename_to_list(input_names)
         add_traits(self.inputs, [name for name in self._input_names])
 
+    def _connect(self, database_file, wal=False):
+        conn = sqlite3.connect(database_file, check_same_thread=False)
+        if wal:
+            conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
     def _list_outputs(self):
         """Execute this module.
         """
-        conn = sqlite3.connect(self.inputs.database_file,
-                               check_same_thread=False)
+        values = [getattr(self.inputs, name) for name in self._input_names]
+        if isdefined(self.inputs.buffer_file):
+            _buffer_sql_row(self.inputs.buffer_file, self.inputs.table_name,
+                            self._input_names, values)
+            return None
+
+        conn = self._connect(self.inputs.database_file)
         c = conn.cursor()
         c.execute("INSERT OR REPLACE INTO %s (" % self.inputs.table_name +
                   ",".join(self._input_names) + ") VALUES (" +
                   ",".join(["?"] * len(self._input_names)) + ")",
-                  [getattr(self.inputs, name) for name in self._input_names])
+                  values)
         conn.commit()
         c.close()
+        conn.close()
         return None
 
+    def _flush_buffered_rows(self, inputs=None):
+        """Insert the rows queued in ``buffer_file``, if any
+
+        ``inputs`` are the inputs the node actually ran with, which take
+        precedence over those set on this interface.
+        """
+        settings = _buffered_sink_settings(self, inputs, ['database_file'])
+        if settings is None:
+            return 0
+
+        conn = self._connect(settings['database_file'], wal=True)
+        try:
+            return _flush_sql_rows(settings['buffer_file'], conn,
+                                   "INSERT OR REPLACE", "?")
+        finally:
+            conn.close()
+
 
 class MySQLSinkInputSpec(DynamicTraitedSpec, BaseInterfaceInputSpec):
     host = Str('localhost', mandatory=True,
@@ -2138,11 +2672,18 @@ class MySQLSinkInputSpec(DynamicTraitedSpec, BaseInterfaceInputSpec):
     table_name = Str(mandatory=True)
     username = Str()
     password = Str()
+    buffer_file = File(hash_files=False,
+                       desc=('queue rows in this file instead of writing '
+                             'them, to be inserted in a single transaction '
+                             'when the workflow finishes'))
 
 
 class MySQLSink(IOBase):
     """ Very simple frontend for storing values into MySQL database.
 
+        If ``buffer_file`` is set, rows are queued and inserted all at once
+        when the workflow finishes, as in :class:`SQLiteSink`.
+
         Examples
         --------
 
@@ -2165,27 +2706,55 @@ class MySQLSink(IOBase):
         self._input_names = filename_to_list(input_names)
         add_traits(self.inputs, [name for name in self._input_names])
 
+    def _connect(self, settings):
+        import MySQLdb
+        if settings.get('config') is not None:
+            return MySQLdb.connect(db=settings['database_name'],
+                                   read_default_file=settings['config'])
+        return MySQLdb.connect(host=settings['host'],
+                               user=settings.get('username'),
+                               passwd=settings.get('password'),
+                               db=settings['database_name'])
+
     def _list_outputs(self):
         """Execute this module.
         """
-        import MySQLdb
-        if isdefined(self.inputs.config):
-            conn = MySQLdb.connect(db=self.inputs.database_name,
-                                   read_default_file=self.inputs.config)
-        else:
-            conn = MySQLdb.connect(host=self.inputs.host,
-                                   user=self.inputs.username,
-                                   passwd=self.inputs.password,
-                                   db=self.inputs.database_name)
+        values = [getattr(self.inputs, name) for name in self._input_names]
+        if isdefined(self.inputs.buffer_file):
+            _buffer_sql_row(self.inputs.buffer_file, self.inputs.table_name,
+                            self._input_names, values)
+            return None
+
+        conn = self._connect(self.inputs.get_traitsfree())
         c = conn.cursor()
         c.execute("REPLACE INTO %s (" % self.inputs.table_name +
                   ",".join(self._input_names) + ") VALUES (" +
                   ",".join(["%s"] * len(self._input_names)) + ")",
-                  [getattr(self.inputs, name) for name in self._input_names])
+                  values)
         conn.commit()
         c.close()
         return None
 
+    def _flush_buffered_rows(self, inputs=None):
+        """Insert the rows queued in ``buffer_file``, if any (see
+        :meth:`SQLiteSink._flush_buffered_rows`)
+        """
+        settings = _buffered_sink_settings(self, inputs, ['database_name'])
+        if settings is None:
+            return 0
+
+        conn = self._connect(settings)
+        try:
+            return _flush_sql_rows(settings['buffer_file'], conn,
+                                   "REPLACE", "%s")
+        finally:
+            conn.close()
+
+
+# SSH clients shared by the SSHDataGrabber nodes of a process, by host
+_SSH_CLIENTS = {}
+_SSH_CLIENTS_LOCK = threading.Lock()
+
 
 class SSHDataGrabberInputSpec(DataGrabberInputSpec):
     hostname = Str(mandatory=True, desc='Server hostname.')
@@ -2199,6 +2768,9 @@ class SSHDataGrabberInputSpec(DataGrabberInputSpec):
                                       desc='Use either fnmatch or regexp to express templates')
     ssh_log_to_file = Str('', usedefault=True,
                                  desc='If set SSH commands will be logged to the given file')
+    num_download_threads = traits.Int(4, usedefault=True,
+                                      desc=('Number of SFTP channels '
+                                            'downloading files concurrently'))
 
 
 class SSHDataGrabber(DataGrabber):
@@ -2327,6 +2899,20 @@ class SSHDataGrabber(DataGrabber):
                         (self.__class__.__name__, key)
                     raise ValueError(msg)
 
+        client = self._get_ssh_client()
+        sftp = client.open_sftp()
+        sftp.chdir(self.inputs.base_directory)
+        # Each remote directory is listed once, whatever the number of
+        # templates it is matched against
+        listings = {}
+
+        def _listdir(path='.'):
+            if path not in listings:
+                listings[path] = sftp.listdir(path)
+            return listings[path]
+
+        # Local file name -> (remote file name, whether it must exist)
+        downloads = OrderedDict()
         outputs = {}
         for key, args in list(self.inputs.template_args.items()):
             outputs[key] = []
@@ -2336,10 +2922,7 @@ class SSHDataGrabber(DataGrabber):
                     key in self.inputs.field_template:
                 template = self.inputs.field_template[key]
             if not args:
-                client = self._get_ssh_client()
-                sftp = client.open_sftp()
-                sftp.chdir(self.inputs.base_directory)
-                filelist = sftp.listdir()
+                filelist = _listdir()
                 if self.inputs.template_expression == 'fnmatch':
                     filelist = fnmatch.filter(filelist, template)
                 elif self.inputs.template_expression == 'regexp':
@@ -2360,7 +2943,7 @@ class SSHDataGrabber(DataGrabber):
                     outputs[key] = list_to_filename(filelist)
                 if self.inputs.download_files:
                     for f in filelist:
-                        sftp.get(f, f)
+                        downloads[f] = (f, True)
             for argnum, arglist in enumerate(args):
                 maxlen = 1
                 for arg in arglist:
@@ -2387,12 +2970,9 @@ class SSHDataGrabber(DataGrabber):
                             filledtemplate = template % tuple(argtuple)
                         except TypeError as e:
                             raise TypeError(e.message + ": Template %s failed to convert with args %s" % (template, str(tuple(argtuple))))
-                    client = self._get_ssh_client()
-                    sftp = client.open_sftp()
-                    sftp.chdir(self.inputs.base_directory)
                     filledtemplate_dir = os.path.dirname(filledtemplate)
                     filledtemplate_base = os.path.basename(filledtemplate)
-                    filelist = sftp.listdir(filledtemplate_dir)
+                    filelist = _listdir(filledtemplate_dir)
                     if self.inputs.template_expression == 'fnmatch':
                         outfiles = fnmatch.filter(filelist, filledtemplate_base)
                     elif self.inputs.template_expression == 'regexp':
@@ -2413,10 +2993,8 @@ class SSHDataGrabber(DataGrabber):
                         outputs[key].append(list_to_filename(outfiles))
                         if self.inputs.download_files:
                             for f in outfiles:
-                                try:
-                                    sftp.get(os.path.join(filledtemplate_dir, f), f)
-                                except IOError:
-                                    iflogger.info('remote file %s not found' % f)
+                                downloads[f] = (
+                                    os.path.join(filledtemplate_dir, f), False)
             if any([val is None for val in outputs[key]]):
                 outputs[key] = []
             if len(outputs[key]) == 0:
@@ -2424,12 +3002,75 @@ class SSHDataGrabber(DataGrabber):
             elif len(outputs[key]) == 1:
                 outputs[key] = outputs[key][0]
 
+        sftp.close()
+
+        if downloads:
+            self._download_files(client, downloads)
+
         for k, v in list(outputs.items()):
-            outputs[k] = os.path.join(os.getcwd(), v)
+            if isinstance(v, list):
+                outputs[k] = [os.path.join(os.getcwd(), f) for f in v]
+            elif v is not None:
+                outputs[k] = os.path.join(os.getcwd(), v)
 
         return outputs
 
+    def _download_files(self, client, downloads):
+        """Fetch files into the working directory over parallel SFTP
+        channels of a single SSH connection
+
+        Parameters
+        ----------
+        client : paramiko.SSHClient
+            Connected client
+        downloads : dict
+            Maps local file names to (remote file name, required) tuples,
+            remote names being relative to base_directory
+        """
+        jobs = [(remote, local, required)
+                for local, (remote, required) in list(downloads.items())]
+        nthreads = max(1, min(self.inputs.num_download_threads, len(jobs)))
+
+        def _download_chunk(chunk):
+            sftp = client.open_sftp()
+            try:
+                sftp.chdir(self.inputs.base_directory)
+                for remote, local, required in chunk:
+                    try:
+                        sftp.get(remote, local)
+                    except IOError:
+                        if required:
+                            raise
+                        iflogger.info('remote file %s not found' % local)
+            finally:
+                sftp.close()
+
+        chunks = [jobs[i::nthreads] for i in range(nthreads)]
+        if nthreads > 1:
+            pool = ThreadPool(nthreads)
+            try:
+                pool.map(_download_chunk, chunks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            _download_chunk(jobs)
+
     def _get_ssh_client(self):
+        """Returns a connected client to ``hostname``, reusing the one
+        opened by an earlier node of this process if it is still active"""
+        key = (os.getpid(), self.inputs.hostname)
+        with _SSH_CLIENTS_LOCK:
+            client = _SSH_CLIENTS.get(key)
+            transport = None
+            if client is not None:
+                transport = client.get_transport()
+            if transport is None or not transport.is_active():
+                client = self._connect_ssh_client()
+                _SSH_CLIENTS[key] = client
+        return client
+
+    def _connect_ssh_client(self):
         config = paramiko.SSHConfig()
         config.parse(open(os.path.expanduser('~/.ssh/config')))
         host = config.lookup(self.inputs.hostname)
@@ -2452,6 +3093,12 @@ class JSONFileGrabberInputSpec(DynamicTraitedSpec, BaseInterfaceInputSpec):
     in_file = File(exists=True, desc='JSON source file')
     defaults = traits.Dict(desc=('JSON dictionary that sets default output'
                                  'values, overridden by values found in in_file'))
+    store_file = File(exists=True, xor=['in_file'], requires=['record_id'],
+                      desc=('JSON-lines store written by JSONFileSink '
+                            'nodes, read instead of in_file'))
+    record_id = Str(desc='Identifier of the record to read from store_file')
+    keys = traits.List(Str, desc=('Keys to expose as outputs (default: all '
+                                  'of them)'))
 
 
 class JSONFileGrabber(IOBase):
@@ -2475,6 +3122,14 @@ class JSONFileGrabber(IOBase):
     >>> pprint.pprint(res.outputs.get())  # doctest: +NORMALIZE_WHITESPACE, +ELLIPSIS +ALLOW_UNICODE
     {'param1': 'exampleStr', 'param2': 4, 'param3': 1.0}
 
+    Reading some keys of one record of a store filled by JSONFileSink
+    nodes, without parsing the records of other subjects
+
+    >>> storeSource = JSONFileGrabber()
+    >>> storeSource.inputs.store_file = 'measures.jsonl'
+    >>> storeSource.inputs.record_id = 's1'
+    >>> storeSource.inputs.keys = ['snr', 'fd_mean']
+    >>> res = storeSource.run() # doctest: +SKIP
 
     """
     input_spec = JSONFileGrabberInputSpec
@@ -2485,7 +3140,19 @@ class JSONFileGrabber(IOBase):
         import simplejson
 
         outputs = {}
-        if isdefined(self.inputs.in_file):
+        keys = None
+        if isdefined(self.inputs.keys):
+            keys = self.inputs.keys
+
+        if isdefined(self.inputs.store_file):
+            records = load_json_records(self.inputs.store_file,
+                                        [self.inputs.record_id], keys)
+            if not records:
+                raise RuntimeError('Record %s not found in %s' % (
+                    self.inputs.record_id, self.inputs.store_file))
+            outputs.update(records[self.inputs.record_id])
+
+        elif isdefined(self.inputs.in_file):
             with open(self.inputs.in_file, 'r') as f:
                 data = simplejson.load(f)
 
@@ -2493,7 +3160,8 @@ class JSONFileGrabber(IOBase):
                 raise RuntimeError('JSON input has no dictionary structure')
 
             for key, value in list(data.items()):
-                outputs[key] = value
+                if keys is None or key in keys:
+                    outputs[key] = value
 
         if isdefined(self.inputs.defaults):
             defaults = self.inputs.defaults
@@ -2508,6 +3176,11 @@ class JSONFileSinkInputSpec(DynamicTraitedSpec, BaseInterfaceInputSpec):
     out_file = File(desc='JSON sink file')
     in_dict = traits.Dict(value={}, usedefault=True,
                           desc='input JSON dictionary')
+    store_file = File(xor=['out_file'], requires=['record_id'],
+                      desc=('JSON-lines store shared by several sinks, the '
+                            'dictionary is appended to it as a record '
+                            'instead of written to out_file'))
+    record_id = Str(desc='Identifier of the record in store_file')
     _outputs = traits.Dict(value={}, usedefault=True)
 
     def __setattr__(self, key, value):
@@ -2553,6 +3226,16 @@ class JSONFileSink(IOBase):
         ...                            'some_measurement': 11.4}
         >>> dictsink.run() # doctest: +SKIP
 
+        Appending to a store shared by the sinks of all subjects, which
+        JSONFileGrabber and
+        :func:`~nipype.utils.filemanip.load_json_records` read back:
+
+        >>> storesink = JSONFileSink(infields=['snr'])
+        >>> storesink.inputs.store_file = 'measures.jsonl'
+        >>> storesink.inputs.record_id = 's1'
+        >>> storesink.inputs.snr = 11.4
+        >>> storesink.run() # doctest: +SKIP
+
     """
     input_spec = JSONFileSinkInputSpec
     output_spec = JSONFileSinkOutputSpec
@@ -2601,8 +3284,12 @@ class JSONFileSink(IOBase):
             key, val = self._process_name(key, val)
             out_dict[key] = val
 
-        with open(out_file, 'w') as f:
-            f.write(str(simplejson.dumps(out_dict, ensure_ascii=False)))
+        if isdefined(self.inputs.store_file):
+            out_file = op.abspath(self.inputs.store_file)
+            append_json_record(out_file, self.inputs.record_id, out_dict)
+        else:
+            with open(out_file, 'w') as f:
+                f.write(str(simplejson.dumps(out_dict, ensure_ascii=False)))
 
         outputs = self.output_spec().get()
         outputs['out_file'] = out_file
@@ -19,10 +19,14 @@ import numpy as np
 import nibabel as nb
 
 from .. import logging
+from ..utils import NUMPY_MMAP
 from ..interfaces.base import (traits, TraitedSpec, BaseInterface,
                                BaseInterfaceInputSpec, File, InputMultiPath)
 IFLOG = logging.getLogger('interface')
 
+# Approximate number of values of in_file read at once in single-pass mode
+CHUNK_SIZE = 2 ** 24
+
 class SignalExtractionInputSpec(BaseInterfaceInputSpec):
     in_file = File(exists=True, mandatory=True, desc='4-D fMRI nii file')
     label_files = InputMultiPath(File(exists=True), mandatory=True,
@@ -51,6 +55,13 @@ class SignalExtractionInputSpec(BaseInterfaceInputSpec):
                                  'labeled "GlobalSignal", with values calculated from the entire brain '
                                  '(instead of just regions).')
     detrend = traits.Bool(False, usedefault=True, desc='If True, perform detrending using nilearn.')
+    single_pass = traits.Bool(False, usedefault=True,
+                              desc='If True, read in_file only once, in chunks of '
+                              'voxels, and compute all the regional means and map '
+                              'regressions together instead of fitting one nilearn '
+                              'masker per label image. Requires label_files and '
+                              'in_file to share the same grid, and at most one '
+                              '3-D label image.')
 
 class SignalExtractionOutputSpec(TraitedSpec):
     out_file = File(exists=True, desc='tsv file containing the computed '
@@ -62,6 +73,10 @@ class SignalExtraction(BaseInterface):
     '''
     Extracts signals over tissue classes or brain regions
 
+    With ``single_pass`` set, in_file is read only once, in chunks of voxels,
+    and the regional means (or map regressions) of all label sets are
+    computed together, instead of running one nilearn masker per label set.
+
     >>> seinterface = SignalExtraction()
     >>> seinterface.inputs.in_file = 'functional.nii'
     >>> seinterface.inputs.label_files = 'segmentation0.nii.gz'
@@ -76,20 +91,121 @@ class SignalExtraction(BaseInterface):
     _results = {}
 
     def _run_interface(self, runtime):
-        maskers = self._process_inputs()
+        if self.inputs.single_pass:
+            region_signals = self._single_pass_signals()
+        else:
+            maskers = self._process_inputs()
 
-        signals = []
-        for masker in maskers:
-            signals.append(masker.fit_transform(self.inputs.in_file))
-        region_signals = np.hstack(signals)
-
-        output = np.vstack((self.inputs.class_labels, region_signals.astype(str)))
+            signals = []
+            for masker in maskers:
+                signals.append(masker.fit_transform(self.inputs.in_file))
+            region_signals = np.hstack(signals)
 
         # save output
         self._results['out_file'] = os.path.abspath(self.inputs.out_file)
-        np.savetxt(self._results['out_file'], output, fmt=b'%s', delimiter='\t')
+        np.savetxt(self._results['out_file'], region_signals, fmt=b'%.17g',
+                   delimiter='\t', comments='',
+                   header='\t'.join(self.inputs.class_labels))
         return runtime
 
+    def _single_pass_signals(self):
+        ''' computes the signals of all label sets reading in_file once.
+        Returns a timepoints x regions array. '''
+        from scipy import sparse, signal
+
+        imgs = [nb.load(f, mmap=NUMPY_MMAP) for f in self.inputs.label_files]
+        label_img = imgs[0] if len(imgs) == 1 else nb.concat_images(imgs)
+        label_data = label_img.get_data()
+        if label_data.ndim == 3:
+            label_data = label_data[..., np.newaxis]
+
+        in_img = nb.load(self.inputs.in_file, mmap=NUMPY_MMAP)
+        if (in_img.shape[:3] != label_data.shape[:3] or
+                not np.allclose(in_img.affine, label_img.affine)):
+            raise ValueError('single_pass requires label_files {} to be on '
+                             'the grid of in_file {}'.format(
+                                 self.inputs.label_files, self.inputs.in_file))
+
+        is_3d_labels = np.amax(label_data) > 1
+        if is_3d_labels:
+            if label_data.shape[3] > 1:
+                raise ValueError('single_pass supports a single 3D label '
+                                 'image, got {}'.format(
+                                     self.inputs.label_files))
+            label_data = label_data[..., 0]
+            labels = np.unique(label_data)
+            labels = labels[labels != 0]
+            n_labels = np.amax(label_data)
+        else:
+            n_labels = label_data.shape[3]
+        self._check_n_labels(n_labels)
+
+        # Slabs are read from the data object, so compressed or scaled
+        # files are not loaded as a whole either
+        shape = in_img.shape
+        ntp = shape[3] if len(shape) > 3 else 1
+
+        # sufficient statistics: region x region and region x time products
+        if is_3d_labels:
+            sums = np.zeros((len(labels), ntp))
+            counts = np.zeros(len(labels))
+        else:
+            gram = np.zeros((n_labels, n_labels))
+            sums = np.zeros((n_labels, ntp))
+        global_sum = np.zeros(ntp)
+        global_count = 0
+
+        slab = shape[0] * shape[1] * ntp
+        step = max(1, int(CHUNK_SIZE // slab))
+        for z0 in range(0, shape[2], step):
+            lchunk = label_data[:, :, z0:z0 + step]
+            lchunk = lchunk.reshape((-1, ) + label_data.shape[3:])
+            inmask = lchunk != 0
+            if not is_3d_labels:
+                inmask = np.any(inmask, axis=1)
+            if not np.any(inmask):
+                continue
+            lchunk = lchunk[inmask]
+            dchunk = np.asarray(in_img.dataobj[:, :, z0:z0 + step],
+                                dtype=np.float64)
+            dchunk = np.nan_to_num(dchunk.reshape((-1, ntp))[inmask])
+
+            if self.inputs.include_global:
+                # binarized sum across all regions
+                global_mask = lchunk if is_3d_labels else lchunk.sum(axis=1)
+                global_mask = np.rint(global_mask).clip(0, 1) > 0
+                global_sum += dchunk[global_mask].sum(axis=0)
+                global_count += np.count_nonzero(global_mask)
+
+            if is_3d_labels:
+                rows = np.searchsorted(labels, lchunk)
+                indicator = sparse.csr_matrix(
+                    (np.ones(len(rows)), (rows, np.arange(len(rows)))),
+                    shape=(len(labels), len(rows)))
+                sums += indicator.dot(dchunk)
+                counts += np.bincount(rows, minlength=len(labels))
+            else:
+                maps = lchunk.astype(np.float64)
+                gram += maps.T.dot(maps)
+                sums += maps.T.dot(dchunk)
+
+        if is_3d_labels:
+            region_signals = sums / counts[:, np.newaxis]
+        elif self.inputs.incl_shared_variance:
+            region_signals = sums / np.diag(gram)[:, np.newaxis]
+        else:
+            region_signals = np.linalg.lstsq(gram, sums, rcond=-1)[0]
+        region_signals = region_signals.T
+
+        if self.inputs.include_global:
+            region_signals = np.hstack((
+                (global_sum / global_count)[:, np.newaxis], region_signals))
+            self.inputs.class_labels.insert(0, 'GlobalSignal')
+
+        if self.inputs.detrend:
+            region_signals = signal.detrend(region_signals, axis=0)
+        return region_signals
+
     def _process_inputs(self):
         ''' validate and  process inputs into useful form.
         Returns a list of nilearn maskers and the list of corresponding label names.'''
@@ -111,17 +227,7 @@ class SignalExtraction(BaseInterface):
             else: # 4d labels, one computation fitting all
                 maskers.append(nl.NiftiMapsMasker(label_data))
 
-        # check label list size
-        if not np.isclose(int(n_labels), n_labels):
-            raise ValueError('The label files {} contain invalid value {}. Check input.'
-                             .format(self.inputs.label_files, n_labels))
-
-        if len(self.inputs.class_labels) != n_labels:
-            raise ValueError('The length of class_labels {} does not '
-                             'match the number of regions {} found in '
-                             'label_files {}'.format(self.inputs.class_labels,
-                                                     n_labels,
-                                                     self.inputs.label_files))
+        self._check_n_labels(n_labels)
 
         if self.inputs.include_global:
             global_label_data = label_data.get_data().sum(axis=3) # sum across all regions
@@ -136,6 +242,19 @@ class SignalExtraction(BaseInterface):
 
         return maskers
 
+    def _check_n_labels(self, n_labels):
+        ''' check label list size '''
+        if not np.isclose(int(n_labels), n_labels):
+            raise ValueError('The label files {} contain invalid value {}. Check input.'
+                             .format(self.inputs.label_files, n_labels))
+
+        if len(self.inputs.class_labels) != n_labels:
+            raise ValueError('The length of class_labels {} does not '
+                             'match the number of regions {} found in '
+                             'label_files {}'.format(self.inputs.class_labels,
+                                                     n_labels,
+                                                     self.inputs.label_files))
+
     def _4d(self, array, affine):
         ''' takes a 3-dimensional numpy array and an affine,
         returns the equivalent 4th dimensional nifti file '''
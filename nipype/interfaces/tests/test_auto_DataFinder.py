@@ -12,6 +12,8 @@ def test_DataFinder_inputs():
     ),
     max_depth=dict(),
     min_depth=dict(),
+    num_walk_threads=dict(usedefault=True,
+    ),
     root_paths=dict(mandatory=True,
     ),
     unpack_single=dict(usedefault=True,
@@ -8,6 +8,7 @@ def test_DataGrabber_inputs():
     ignore_exception=dict(nohash=True,
     usedefault=True,
     ),
+    index_file=dict(),
     raise_on_empty=dict(usedefault=True,
     ),
     sort_filelist=dict(mandatory=True,
@@ -15,6 +16,8 @@ def test_DataGrabber_inputs():
     template=dict(mandatory=True,
     ),
     template_args=dict(),
+    use_index=dict(usedefault=True,
+    ),
     )
     inputs = DataGrabber.input_spec()
 
@@ -15,6 +15,8 @@ def test_DataSink_inputs():
     usedefault=True,
     ),
     local_copy=dict(),
+    num_copy_threads=dict(usedefault=True,
+    ),
     parameterization=dict(usedefault=True,
     ),
     regexp_substitutions=dict(),
@@ -9,6 +9,11 @@ def test_JSONFileGrabber_inputs():
     usedefault=True,
     ),
     in_file=dict(),
+    keys=dict(),
+    record_id=dict(),
+    store_file=dict(requires=['record_id'],
+    xor=['in_file'],
+    ),
     )
     inputs = JSONFileGrabber.input_spec()
 
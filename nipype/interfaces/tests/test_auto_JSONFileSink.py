@@ -12,6 +12,10 @@ def test_JSONFileSink_inputs():
     in_dict=dict(usedefault=True,
     ),
     out_file=dict(),
+    record_id=dict(),
+    store_file=dict(requires=['record_id'],
+    xor=['out_file'],
+    ),
     )
     inputs = JSONFileSink.input_spec()
 
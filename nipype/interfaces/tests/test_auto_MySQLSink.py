@@ -4,7 +4,9 @@ from ..io import MySQLSink
 
 
 def test_MySQLSink_inputs():
-    input_map = dict(config=dict(mandatory=True,
+    input_map = dict(buffer_file=dict(hash_files=False,
+    ),
+    config=dict(mandatory=True,
     xor=['host'],
     ),
     database_name=dict(mandatory=True,
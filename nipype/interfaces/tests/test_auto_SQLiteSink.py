@@ -4,7 +4,9 @@ from ..io import SQLiteSink
 
 
 def test_SQLiteSink_inputs():
-    input_map = dict(database_file=dict(mandatory=True,
+    input_map = dict(buffer_file=dict(hash_files=False,
+    ),
+    database_file=dict(mandatory=True,
     ),
     ignore_exception=dict(nohash=True,
     usedefault=True,
@@ -13,6 +13,9 @@ def test_SSHDataGrabber_inputs():
     ignore_exception=dict(nohash=True,
     usedefault=True,
     ),
+    index_file=dict(),
+    num_download_threads=dict(usedefault=True,
+    ),
     password=dict(),
     raise_on_empty=dict(usedefault=True,
     ),
@@ -25,6 +28,8 @@ def test_SSHDataGrabber_inputs():
     template_args=dict(),
     template_expression=dict(usedefault=True,
     ),
+    use_index=dict(usedefault=True,
+    ),
     username=dict(),
     )
     inputs = SSHDataGrabber.input_spec()
@@ -10,10 +10,13 @@ def test_SelectFiles_inputs():
     ignore_exception=dict(nohash=True,
     usedefault=True,
     ),
+    index_file=dict(),
     raise_on_empty=dict(usedefault=True,
     ),
     sort_filelist=dict(usedefault=True,
     ),
+    use_index=dict(usedefault=True,
+    ),
     )
     inputs = SelectFiles.input_spec()
 
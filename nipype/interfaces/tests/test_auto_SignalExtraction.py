@@ -21,6 +21,8 @@ def test_SignalExtraction_inputs():
     ),
     out_file=dict(usedefault=True,
     ),
+    single_pass=dict(usedefault=True,
+    ),
     )
     inputs = SignalExtraction.input_spec()
 
@@ -11,11 +11,15 @@ import shutil
 import os.path as op
 from subprocess import Popen
 import hashlib
+import re
 
 import pytest
 import nipype
 import nipype.interfaces.io as nio
+import nipype.pipeline.engine as pe
 from nipype.interfaces.base import Undefined
+from nipype.utils.filemanip import load_json_records
+from nipype.utils.misc import human_order_sorted
 
 # Check for boto
 noboto = False
@@ -33,6 +37,13 @@ try:
 except ImportError:
     noboto3 = True
 
+# Check for moto
+nomoto = False
+try:
+    from moto import mock_s3
+except ImportError:
+    nomoto = True
+
 # Check for fakes3
 standard_library.install_aliases()
 from subprocess import check_call, CalledProcessError
@@ -157,6 +168,93 @@ def test_datagrabber_order(tmpdir):
     assert 'sub002_L3_R10' in outfiles[2][1]
 
 
+def test_directory_index(tmpdir):
+    for path in ['sub01/anat/T1w.nii', 'sub01/func/run1.nii',
+                 'sub01/func/run2.nii', 'sub01/func/.hidden.nii',
+                 'sub02/anat/T1w.nii', 'sub02/func/run1.nii',
+                 'sub10/func/run1.nii.gz', 'participants.tsv']:
+        tmpdir.ensure(path)
+    root = tmpdir.strpath
+    index_file = tmpdir.join('index.json').strpath
+
+    index = nio.DirectoryIndex(root, index_file)
+    for pattern in ['sub*/func/run?.nii*', 'sub01/*/*.nii', 'sub0[12]',
+                    'sub*/anat/T1w.nii', 'sub01/func/.*', 'missing/*',
+                    'participants.tsv', 'sub01/anat/T1w.nii/*', '*']:
+        pattern = op.join(root, pattern)
+        assert sorted(index.glob(pattern)) == sorted(glob.glob(pattern))
+    index.save()
+    assert op.exists(index_file)
+
+    # a new index loads the listings and only rescans what changed
+    tmpdir.ensure('sub02/func/run2.nii')
+    os.utime(tmpdir.join('sub02', 'func').strpath, (0, 1))
+    index = nio.DirectoryIndex(root, index_file)
+    assert index.glob(op.join(root, 'sub02/func/*.nii')) == [
+        op.join(root, 'sub02/func/run1.nii'),
+        op.join(root, 'sub02/func/run2.nii')]
+
+
+def test_selectfiles_index(tmpdir):
+    for sub in ['sub01', 'sub02']:
+        tmpdir.ensure(sub, 'anat', 'T1w.nii')
+        tmpdir.ensure(sub, 'func', 'run1.nii')
+    templates = {'anat': '{subject_id}/anat/*.nii',
+                 'func': '{subject_id}/func/run{run}.nii'}
+    index_file = tmpdir.join('index.json').strpath
+
+    for subject_id in ['sub01', 'sub02']:
+        sf = nio.SelectFiles(templates, base_directory=tmpdir.strpath,
+                             use_index=True, index_file=index_file)
+        sf.inputs.subject_id = subject_id
+        sf.inputs.run = 1
+        res = sf.run()
+        assert res.outputs.anat == tmpdir.join(subject_id, 'anat',
+                                               'T1w.nii').strpath
+        assert res.outputs.func == tmpdir.join(subject_id, 'func',
+                                               'run1.nii').strpath
+
+    dg = nio.DataGrabber(infields=['sid'], use_index=True,
+                         index_file=index_file)
+    dg.inputs.base_directory = tmpdir.strpath
+    dg.inputs.template = '%s/func/*.nii'
+    dg.inputs.template_args = {'outfiles': [['sid']]}
+    dg.inputs.sid = ['sub01', 'sub02']
+    dg.inputs.sort_filelist = True
+    res = dg.run()
+    assert res.outputs.outfiles == [
+        tmpdir.join('sub01', 'func', 'run1.nii').strpath,
+        tmpdir.join('sub02', 'func', 'run1.nii').strpath]
+
+
+@pytest.mark.parametrize('index_file', [None, 'index.json'])
+def test_selectfiles_index_new_subject(tmpdir, index_file):
+    tmpdir.ensure('sub01', 'func', 'run1.nii')
+    templates = {'func': '{subject_id}/func/run*.nii'}
+    if index_file is not None:
+        index_file = tmpdir.join(index_file).strpath
+
+    def select(subject_id):
+        sf = nio.SelectFiles(templates, base_directory=tmpdir.strpath,
+                             use_index=True, sort_filelist=True)
+        if index_file is not None:
+            sf.inputs.index_file = index_file
+        sf.inputs.subject_id = subject_id
+        return sf.run().outputs.func
+
+    assert select('sub01') == tmpdir.join('sub01', 'func', 'run1.nii').strpath
+    with pytest.raises(IOError):
+        select('sub02')
+
+    # a subject and a run added after the directories were indexed
+    tmpdir.ensure('sub02', 'func', 'run1.nii')
+    tmpdir.ensure('sub01', 'func', 'run2.nii')
+    assert select('sub02') == tmpdir.join('sub02', 'func', 'run1.nii').strpath
+    assert select('sub01') == [
+        tmpdir.join('sub01', 'func', 'run1.nii').strpath,
+        tmpdir.join('sub01', 'func', 'run2.nii').strpath]
+
+
 def test_datasink():
     ds = nio.DataSink()
     assert ds.inputs.parameterization
@@ -240,6 +338,51 @@ def test_datasink_to_s3(dummy_input, tmpdir):
     assert src_md5 == dst_md5
 
 
+@pytest.mark.skipif(noboto3 or nomoto, reason="boto3 or moto library is not available")
+def test_datasink_to_s3_concurrent(tmpdir, monkeypatch):
+    '''
+    Test that DataSink uploads files concurrently, in parts if they are
+    large, and skips the ones already uploaded
+    '''
+    monkeypatch.setattr(nio, 'S3_MULTIPART_THRESHOLD', 5 * 1024 * 1024)
+    monkeypatch.setattr(nio, 'S3_MULTIPART_CHUNKSIZE', 5 * 1024 * 1024)
+    files = []
+    for i in range(8):
+        files.append(tmpdir.join('file%d.txt' % i).strpath)
+        with open(files[-1], 'wb') as fp:
+            fp.write(os.urandom(1024 * (i + 1)))
+    files.append(tmpdir.join('large.bin').strpath)
+    with open(files[-1], 'wb') as fp:
+        fp.write(os.urandom(6 * 1024 * 1024))
+
+    with mock_s3():
+        resource = boto3.resource('s3', region_name='us-east-1')
+        bucket = resource.create_bucket(Bucket='test')
+
+        ds = nio.DataSink(base_directory='s3://test', container='outputs',
+                          num_copy_threads=4)
+        ds.inputs.bucket = bucket
+        setattr(ds.inputs, 'files.@in', files)
+        ds.run()
+        keys = sorted(obj.key for obj in bucket.objects.all())
+        assert keys == sorted('outputs/files/' + op.basename(f)
+                              for f in files)
+        large = bucket.Object('outputs/files/large.bin')
+        src_md5 = hashlib.md5(open(files[-1], 'rb').read()).hexdigest()
+        assert '-' in large.e_tag
+        assert large.metadata['md5'] == src_md5
+
+        # A second run finds every file and uploads nothing
+        ds = nio.DataSink(num_copy_threads=4)
+        jobs = [(f, 'outputs/files/' + op.basename(f)) for f in files]
+        assert ds._upload_s3_jobs(bucket, jobs) == 0
+
+        # Changed files are uploaded again
+        with open(files[0], 'wb') as fp:
+            fp.write(b'changed')
+        assert ds._upload_s3_jobs(bucket, jobs) == 1
+
+
 # Test AWS creds read from env vars
 @pytest.mark.skipif(noboto3 or not fakes3, reason="boto3 or fakes3 library is not available")
 def test_aws_keys_from_env():
@@ -329,6 +472,50 @@ def test_datasink_substitutions(tmpdir):
               == ['!-yz-b.n', 'ABABAB.n']  # so we got re used 2nd and both patterns
 
 
+def test_datasink_skip_unchanged(tmpdir, monkeypatch):
+    from nipype.utils import filemanip
+
+    indir = tmpdir.mkdir('in')
+    outdir = tmpdir.mkdir('out')
+    files = []
+    for i in range(20):
+        files.append(indir.join('file%02d.img' % i).strpath)
+        with open(files[-1], 'w') as fp:
+            fp.write('%02d' % i)
+        with open(files[-1][:-4] + '.hdr', 'w') as fp:
+            fp.write('header')
+
+    def _run():
+        ds = nio.DataSink(base_directory=outdir.strpath, num_copy_threads=4)
+        setattr(ds.inputs, 'images.@files', files)
+        return ds.run().outputs.out_file
+
+    config_hardlink = nipype.config.get('execution', 'try_hard_link_datasink')
+    nipype.config.set('execution', 'try_hard_link_datasink', 'false')
+    try:
+        out_files = _run()
+        assert out_files == [outdir.join('images', op.basename(f)).strpath
+                             for f in files]
+        for out_file in out_files:
+            assert op.exists(out_file[:-4] + '.hdr')
+
+        # unchanged files are skipped without hashing their contents
+        def _no_hash(*args, **kwargs):
+            raise AssertionError('content was hashed')
+        monkeypatch.setattr(filemanip, 'hash_infile', _no_hash)
+        _run()
+
+        # changes of size are copied without hashing either
+        with open(files[3], 'w') as fp:
+            fp.write('changed')
+        _run()
+        with open(out_files[3]) as fp:
+            assert fp.read() == 'changed'
+    finally:
+        nipype.config.set('execution', 'try_hard_link_datasink',
+                          config_hardlink)
+
+
 def _temp_analyze_files():
     """Generate temporary analyze file pair."""
     fd, orig_img = mkstemp(suffix='.img', dir=mkdtemp())
@@ -394,6 +581,125 @@ def test_datafinder_unpack(tmpdir):
     assert result.outputs.out_paths == single_res
 
 
+@pytest.mark.parametrize("ignore_regexes", [
+        [], ['\\.git'], ['\\.git$'], ['\\.git', '\\.txt$']
+])
+@pytest.mark.parametrize("num_walk_threads", [1, 3])
+def test_datafinder_ignore(tmpdir, ignore_regexes, num_walk_threads):
+    outdir = str(tmpdir)
+    for sub in ('sub-01', 'sub-02'):
+        for subdir in ('anat', '.git'):
+            os.makedirs(os.path.join(outdir, sub, subdir))
+            for fname in ('T1.nii', 'notes.txt'):
+                open(os.path.join(outdir, sub, subdir, fname), 'a').close()
+    os.symlink(os.path.join(outdir, 'sub-01'), os.path.join(outdir, 'link'))
+
+    # reference search over the whole tree
+    expected = []
+    for curr_dir, _, files in os.walk(outdir):
+        for path in [curr_dir] + [os.path.join(curr_dir, f) for f in files]:
+            if not any(re.search(regex, path) for regex in ignore_regexes):
+                expected.append(path)
+
+    df = nio.DataFinder(root_paths=outdir, match_regex='.+',
+                        num_walk_threads=num_walk_threads)
+    if ignore_regexes:
+        df.inputs.ignore_regexes = ignore_regexes
+    result = df.run()
+    assert result.outputs.out_paths == human_order_sorted(expected)
+
+
+class _LocalSFTP(object):
+    """SFTP client serving files from a local directory"""
+
+    def __init__(self, root, calls):
+        self.cwd = root
+        self.calls = calls
+
+    def chdir(self, path):
+        self.cwd = os.path.join(self.cwd, path)
+
+    def listdir(self, path='.'):
+        self.calls.append(('listdir', path))
+        return os.listdir(os.path.join(self.cwd, path))
+
+    def get(self, remotepath, localpath):
+        self.calls.append(('get', remotepath))
+        shutil.copyfile(os.path.join(self.cwd, remotepath), localpath)
+
+    def close(self):
+        pass
+
+
+class _LocalSSHClient(object):
+    """SSH client whose SFTP channels read from the local filesystem"""
+
+    def __init__(self, root):
+        self.root = root
+        self.calls = []
+        self.active = True
+
+    def get_transport(self):
+        client = self
+
+        class _Transport(object):
+            def is_active(self):
+                return client.active
+        return _Transport()
+
+    def open_sftp(self):
+        self.calls.append(('open_sftp', ))
+        return _LocalSFTP(self.root, self.calls)
+
+
+def test_sshdatagrabber_pooled(tmpdir, monkeypatch):
+    remote = tmpdir.mkdir('remote')
+    for sid in ('s1', 's2'):
+        subject_dir = remote.mkdir(sid)
+        for fname in ('f3.nii', 'f5.nii', 'struct.nii'):
+            subject_dir.join(fname).write(sid + fname)
+    workdir = tmpdir.mkdir('work')
+    workdir.chdir()
+
+    connections = []
+
+    def _connect(self):
+        connections.append(_LocalSSHClient(str(remote)))
+        return connections[-1]
+
+    monkeypatch.setattr(nio, 'paramiko', object(), raising=False)
+    monkeypatch.setattr(nio, '_SSH_CLIENTS', {})
+    monkeypatch.setattr(nio.SSHDataGrabber, '_connect_ssh_client', _connect)
+
+    for sid in ('s1', 's2'):
+        dg = nio.SSHDataGrabber(infields=['sid'],
+                                outfields=['func', 'struct'])
+        dg.inputs.hostname = 'myhost.com'
+        dg.inputs.base_directory = '.'
+        dg.inputs.template = '%s/%s.nii'
+        dg.inputs.template_args = {'func': [['sid', ['f3', 'f5']]],
+                                   'struct': [['sid', 'struct']]}
+        dg.inputs.sid = sid
+        dg.inputs.num_download_threads = 2
+        outputs = dg._list_outputs()
+        assert outputs['func'] == [str(workdir.join('f3.nii')),
+                                   str(workdir.join('f5.nii'))]
+        assert outputs['struct'] == str(workdir.join('struct.nii'))
+        assert workdir.join('f5.nii').read() == sid + 'f5.nii'
+
+    # a single connection, listing each subject directory once
+    assert len(connections) == 1
+    calls = connections[0].calls
+    assert [call for call in calls if call[0] == 'listdir'] == [
+        ('listdir', 's1'), ('listdir', 's2')]
+    assert len([call for call in calls if call[0] == 'get']) == 6
+
+    # a dropped connection is replaced
+    connections[0].active = False
+    dg._list_outputs()
+    assert len(connections) == 2
+
+
 def test_freesurfersource():
     fss = nio.FreeSurferSource()
     assert fss.inputs.hemi == 'both'
@@ -401,6 +707,43 @@ def test_freesurfersource():
     assert fss.inputs.subjects_dir == Undefined
 
 
+def test_freesurfersource_needed_outputs(tmpdir):
+    subject_dir = tmpdir.mkdir('s1')
+    for subdir, fnames in [('mri', ['T1.mgz', 'aseg.mgz', 'lh.ribbon.mgz',
+                                    'rh.ribbon.mgz', 'ribbon.mgz']),
+                           ('surf', ['lh.white', 'rh.white', '.lh.white'])]:
+        for fname in fnames:
+            subject_dir.ensure(subdir, fname)
+
+    fss = nio.FreeSurferSource(subjects_dir=str(tmpdir), subject_id='s1')
+    outputs = fss._list_outputs()
+    assert outputs['T1'] == str(subject_dir.join('mri', 'T1.mgz'))
+    assert outputs['white'] == [str(subject_dir.join('surf', 'lh.white')),
+                                str(subject_dir.join('surf', 'rh.white'))]
+    assert len(outputs['ribbon']) == 3
+
+    # only the outputs connected downstream are looked up
+    node = pe.Node(nio.FreeSurferSource(subjects_dir=str(tmpdir),
+                                        subject_id='s1', hemi='lh'),
+                   name='fssource', needed_outputs=['ribbon', 'white'],
+                   base_dir=str(tmpdir))
+    result = node.run()
+    assert result.outputs.white == str(subject_dir.join('surf', 'lh.white'))
+    assert result.outputs.ribbon == str(subject_dir.join('mri',
+                                                         'lh.ribbon.mgz'))
+    assert result.outputs.T1 == Undefined
+
+    # all outputs are looked up when the unneeded ones are kept
+    node = pe.Node(nio.FreeSurferSource(subjects_dir=str(tmpdir),
+                                        subject_id='s1', hemi='lh'),
+                   name='fssource_all', needed_outputs=['ribbon', 'white'],
+                   base_dir=str(tmpdir))
+    node.config = {'execution': {'remove_unnecessary_outputs': False}}
+    result = node.run()
+    assert result.outputs.white == str(subject_dir.join('surf', 'lh.white'))
+    assert result.outputs.T1 == str(subject_dir.join('mri', 'T1.mgz'))
+
+
 def test_jsonsink_input(tmpdir):
 
     ds = nio.JSONFileSink()
@@ -433,4 +776,223 @@ def test_jsonsink(tmpdir, inputs_attributes):
     assert data == expected_data
 
 
-
+def test_jsonsink_store(tmpdir):
+    tmpdir.chdir()
+    for sid, snr in [('s1', 10.5), ('s2', 20.5), ('s3', 30.5), ('s2', 21.5)]:
+        js = nio.JSONFileSink(infields=['snr'], in_dict={'subject': sid})
+        js.inputs.store_file = 'measures.jsonl'
+        js.inputs.record_id = sid
+        js.inputs.snr = snr
+        res = js.run()
+    assert res.outputs.out_file == str(tmpdir.join('measures.jsonl'))
+    assert len([line for line in
+                tmpdir.join('measures.jsonl.idx').readlines()
+                if line.strip()]) == 4
+
+    # later records replace earlier ones
+    records = load_json_records('measures.jsonl', keys=['snr'])
+    assert list(records.items()) == [('s1', {'snr': 10.5}),
+                                     ('s2', {'snr': 21.5}),
+                                     ('s3', {'snr': 30.5})]
+
+    # records of other subjects are not parsed
+    lines = tmpdir.join('measures.jsonl').readlines()
+    lines[1] = '{' + ' ' * (len(lines[1]) - 2) + '\n'
+    tmpdir.join('measures.jsonl').write(''.join(lines))
+    jg = nio.JSONFileGrabber(store_file='measures.jsonl', record_id='s3',
+                             keys=['snr'])
+    assert jg.run().outputs.get() == {'snr': 30.5}
+
+    jg.inputs.record_id = 's4'
+    with pytest.raises(RuntimeError):
+        jg.run()
+
+    # without an index the store is scanned, skipping broken records
+    tmpdir.join('measures.jsonl.idx').remove()
+    records = load_json_records('measures.jsonl', ['s3', 's2', 's1'])
+    assert list(records.items()) == [
+        ('s3', {'snr': 30.5, 'subject': 's3'}),
+        ('s2', {'snr': 21.5, 'subject': 's2'})]
+
+
+def _buffer_sqlite_rows(args):
+    database_file, buffer_file, subjects = args
+    for subject in subjects:
+        sql = nio.SQLiteSink(input_names=['subject_id', 'value'],
+                             database_file=database_file,
+                             table_name='results', buffer_file=buffer_file)
+        sql.inputs.subject_id = 's%03d' % subject
+        sql.inputs.value = subject / 10.0
+        sql.run()
+
+
+def test_sqlitesink_buffered(tmpdir):
+    import sqlite3
+    import multiprocessing
+    import nipype.pipeline.engine as pe
+    from nipype.interfaces.utility import IdentityInterface
+
+    tmpdir.chdir()
+    database_file = tmpdir.join('results.db').strpath
+    buffer_file = tmpdir.join('results.rows').strpath
+    conn = sqlite3.connect(database_file)
+    conn.execute('CREATE TABLE results (subject_id TEXT PRIMARY KEY, '
+                 'value REAL)')
+    conn.commit()
+    conn.close()
+
+    # concurrent writers only append to the buffer
+    pool = multiprocessing.Pool(4)
+    try:
+        pool.map(_buffer_sqlite_rows,
+                 [(database_file, buffer_file, range(w, 100, 4))
+                  for w in range(4)])
+    finally:
+        pool.close()
+        pool.join()
+
+    conn = sqlite3.connect(database_file)
+    assert conn.execute('SELECT COUNT(*) FROM results').fetchone()[0] == 0
+    conn.close()
+
+    # the workflow flushes the buffer when it finishes
+    subjects = pe.Node(IdentityInterface(fields=['subject_id']),
+                       name='subjects')
+    subjects.iterables = ('subject_id', ['s%03d' % i for i in range(90, 110)])
+    sql = pe.Node(nio.SQLiteSink(input_names=['subject_id', 'value']),
+                  name='sql')
+    sql.inputs.database_file = database_file
+    sql.inputs.table_name = 'results'
+    sql.inputs.buffer_file = buffer_file
+    sql.inputs.value = -1.0
+    wf = pe.Workflow(name='buffered', base_dir=tmpdir.strpath)
+    wf.connect(subjects, 'subject_id', sql, 'subject_id')
+    wf.run()
+
+    assert not os.path.exists(buffer_file)
+    conn = sqlite3.connect(database_file)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    rows = dict(conn.execute('SELECT subject_id, value FROM results'))
+    conn.close()
+    assert len(rows) == 110
+    assert rows['s042'] == 4.2
+    assert rows['s095'] == -1.0
+
+
+def test_sqlitesink_unbuffered_journal(tmpdir):
+    import sqlite3
+
+    database_file = tmpdir.join('results.db').strpath
+    conn = sqlite3.connect(database_file)
+    conn.execute('CREATE TABLE results (subject_id TEXT PRIMARY KEY, '
+                 'value REAL)')
+    conn.commit()
+    conn.close()
+
+    sql = nio.SQLiteSink(input_names=['subject_id', 'value'],
+                         database_file=database_file, table_name='results')
+    sql.inputs.subject_id = 's001'
+    sql.inputs.value = 1.0
+    sql.run()
+
+    # the journal mode of the database is left alone without a buffer
+    conn = sqlite3.connect(database_file)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    assert list(conn.execute('SELECT subject_id, value FROM results')) == [
+        ('s001', 1.0)]
+    conn.close()
+
+
+def _sqlite_files(database_file, buffer_file):
+    return database_file, buffer_file
+
+
+def test_sqlitesink_buffered_connected(tmpdir):
+    import sqlite3
+    from nipype.interfaces.utility import Function, IdentityInterface
+
+    tmpdir.chdir()
+    database_file = tmpdir.join('results.db').strpath
+    buffer_file = tmpdir.join('results.rows').strpath
+    conn = sqlite3.connect(database_file)
+    conn.execute('CREATE TABLE results (subject_id TEXT PRIMARY KEY, '
+                 'value REAL)')
+    conn.commit()
+    conn.close()
+
+    # the buffer and the database are only known to the nodes that ran
+    # in the worker processes (without local_hash_check, the inputs are
+    # not even collected in the main process)
+    files = pe.Node(Function(input_names=['database_file', 'buffer_file'],
+                             output_names=['database_file', 'buffer_file'],
+                             function=_sqlite_files),
+                    name='files')
+    files.inputs.database_file = database_file
+    files.inputs.buffer_file = buffer_file
+    subjects = pe.Node(IdentityInterface(fields=['subject_id']),
+                       name='subjects')
+    subjects.iterables = ('subject_id', ['s%03d' % i for i in range(4)])
+    sql = pe.Node(nio.SQLiteSink(input_names=['subject_id', 'value']),
+                  name='sql')
+    sql.inputs.table_name = 'results'
+    sql.inputs.value = 1.0
+    wf = pe.Workflow(name='buffered', base_dir=tmpdir.strpath)
+    wf.connect([(files, sql, [('database_file', 'database_file'),
+                              ('buffer_file', 'buffer_file')]),
+                (subjects, sql, [('subject_id', 'subject_id')])])
+    wf.config['execution']['local_hash_check'] = False
+    wf.run(plugin='MultiProc', plugin_args={'n_procs': 2})
+
+    assert not os.path.exists(buffer_file)
+    conn = sqlite3.connect(database_file)
+    rows = dict(conn.execute('SELECT subject_id, value FROM results'))
+    conn.close()
+    assert rows == dict(('s%03d' % i, 1.0) for i in range(4))
+
+
+def _fail():
+    raise ValueError('node failed')
+
+
+@pytest.mark.parametrize('create_table', [True, False])
+def test_sqlitesink_buffered_failed_run(tmpdir, create_table):
+    import sqlite3
+    import nipype.pipeline.engine as pe
+    from nipype.interfaces.utility import Function
+
+    tmpdir.chdir()
+    database_file = tmpdir.join('results.db').strpath
+    buffer_file = tmpdir.join('results.rows').strpath
+    conn = sqlite3.connect(database_file)
+    if create_table:
+        conn.execute('CREATE TABLE results (subject_id TEXT PRIMARY KEY, '
+                     'value REAL)')
+    conn.commit()
+    conn.close()
+
+    sql = pe.Node(nio.SQLiteSink(input_names=['subject_id', 'value']),
+                  name='sql')
+    sql.inputs.database_file = database_file
+    sql.inputs.table_name = 'results'
+    sql.inputs.buffer_file = buffer_file
+    sql.inputs.subject_id = 's001'
+    sql.inputs.value = 1.0
+    fail = pe.Node(Function(input_names=[], output_names=[], function=_fail),
+                   name='fail')
+    wf = pe.Workflow(name='buffered', base_dir=tmpdir.strpath)
+    wf.add_nodes([sql, fail])
+    wf.config['execution']['crashdump_dir'] = tmpdir.strpath
+
+    # the error of the workflow is raised even if flushing fails as well
+    with pytest.raises(RuntimeError):
+        wf.run()
+
+    conn = sqlite3.connect(database_file)
+    if create_table:
+        # the rows of the nodes that ran are kept
+        assert not os.path.exists(buffer_file)
+        assert list(conn.execute('SELECT subject_id, value FROM results')) \
+            == [('s001', 1.0)]
+    else:
+        assert os.path.exists(buffer_file)
+    conn.close()
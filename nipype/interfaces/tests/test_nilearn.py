@@ -122,6 +122,38 @@ class TestSignalExtraction():
         # assert
         # just checking that it passes trait validations
 
+    @pytest.mark.parametrize('detrend', [True, False])
+    @pytest.mark.parametrize('include_global', [True, False])
+    @pytest.mark.parametrize('incl_shared_variance', [True, False])
+    @pytest.mark.parametrize('label_file', ['label_files', '4d_label_file'])
+    def test_signal_extr_single_pass(self, label_file, incl_shared_variance,
+                                     include_global, detrend):
+        # set up
+        utils.save_toy_nii(self.fake_4d_label_data, self.filenames['4d_label_file'])
+
+        # run with nilearn maskers and in a single pass
+        got = []
+        for single_pass in (False, True):
+            iface.SignalExtraction(in_file=self.filenames['in_file'],
+                                   label_files=self.filenames[label_file],
+                                   class_labels=self.labels,
+                                   incl_shared_variance=incl_shared_variance,
+                                   include_global=include_global,
+                                   detrend=detrend,
+                                   single_pass=single_pass).run()
+            got.append(np.loadtxt(self.filenames['out_file'], skiprows=1))
+
+        # assert
+        npt.assert_almost_equal(got[0], got[1], decimal=5)
+
+    def test_signal_extr_single_pass_label_files(self):
+        # two 3D label files would silently lose all but the first one
+        with pytest.raises(ValueError):
+            iface.SignalExtraction(in_file=self.filenames['in_file'],
+                                   label_files=[self.filenames['label_files']] * 2,
+                                   class_labels=self.labels,
+                                   single_pass=True).run()
+
     def _test_4d_label(self, wanted, fake_labels, include_global=False, incl_shared_variance=True):
         # set up
         utils.save_toy_nii(fake_labels, self.filenames['4d_label_file'])
@@ -209,3 +241,37 @@ class TestSignalExtraction():
                     [-19.0869565217, 21.2391304348, -4.57608695652],
                     [5.19565217391, -3.66304347826, -1.51630434783],
                     [-12.0, 3., 0.5]]
+
+
+@pytest.mark.parametrize('in_file', ['fmri.nii.gz', 'fmri_scaled.nii'])
+def test_signal_extr_single_pass_slabs(tmpdir, monkeypatch, in_file):
+    import nibabel as nb
+    tmpdir.chdir()
+    np.random.seed(0)
+    fmri = np.random.randint(0, 100, size=(3, 4, 5, 6)).astype(np.int16)
+    img = nb.Nifti1Image(fmri, np.eye(4))
+    if in_file == 'fmri_scaled.nii':
+        img.header.set_slope_inter(0.5, 10.)
+    img.to_filename(in_file)
+    fmri = nb.load(in_file).get_data().astype(np.float64)
+    labels = np.random.randint(0, 3, size=(3, 4, 5)).astype(np.int16)
+    labels[0, 0, :2] = [1, 2]
+    nb.Nifti1Image(labels, np.eye(4)).to_filename('labels.nii')
+
+    # one z-slice at a time, never reading the whole 4D image
+    monkeypatch.setattr(iface, 'CHUNK_SIZE', 3 * 4 * 6)
+
+    def _array(self, *args):
+        assert len(self.shape) < 4, 'the whole 4D image was read'
+        return _orig_array(self, *args)
+    _orig_array = nb.arrayproxy.ArrayProxy.__array__
+    monkeypatch.setattr(nb.arrayproxy.ArrayProxy, '__array__', _array)
+
+    iface.SignalExtraction(in_file=in_file, label_files='labels.nii',
+                           class_labels=['a', 'b'], include_global=True,
+                           single_pass=True).run()
+    got = np.loadtxt('signals.tsv', skiprows=1)
+    wanted = np.column_stack([fmri[labels > 0].mean(axis=0),
+                              fmri[labels == 1].mean(axis=0),
+                              fmri[labels == 2].mean(axis=0)])
+    npt.assert_almost_equal(got, wanted)
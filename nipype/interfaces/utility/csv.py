@@ -17,13 +17,136 @@ from builtins import zip, range, str, open
 from future import standard_library
 standard_library.install_aliases()
 
-from ..base import traits, TraitedSpec, DynamicTraitedSpec, File, BaseInterface
+import csv
+import itertools
+
+import numpy as np
+
+from ..base import (traits, TraitedSpec, DynamicTraitedSpec, File,
+                    BaseInterface, isdefined)
 from ..io import add_traits
 
+# Number of rows converted to typed arrays at a time by read_csv_columns
+CSV_CHUNK_ROWS = 10000
+# Number of characters looked at to detect the delimiter of a file
+CSV_SNIFF_SIZE = 64 * 1024
+
+
+def sniff_delimiter(in_file):
+    """Guesses the field delimiter of a CSV file from its first lines,
+    falling back to a comma"""
+    with open(in_file, 'r') as fid:
+        sample = fid.read(CSV_SNIFF_SIZE)
+    try:
+        return str(csv.Sniffer().sniff(sample, delimiters=',\t;|').delimiter)
+    except csv.Error:
+        return ','
+
+
+def _to_array(values):
+    """Converts a list of strings to an integer or a float array, or
+    returns None if some of them are not numbers"""
+    for dtype in (np.int64, np.float64):
+        try:
+            return np.array(values, dtype=dtype)
+        except (ValueError, OverflowError):
+            pass
+    return None
+
+
+def _iter_csv_rows(in_file, delimiter):
+    with open(in_file, 'r', newline='') as fid:
+        for row in csv.reader(fid, delimiter=delimiter):
+            yield [field.strip() for field in row]
+
+
+def read_csv_columns(in_file, header=False, delimiter=None,
+                     infer_types=False, chunk_rows=None):
+    """Reads the columns of a CSV file
+
+    Rows are parsed in chunks of ``chunk_rows``. With ``infer_types``, each
+    chunk of a column is converted to an integer or float array as it is
+    read, so that numeric columns are never held as lists of strings. A
+    column holding any other value is returned as strings, the file being
+    read again for it if earlier chunks looked numeric.
+
+    Returns
+    -------
+    names : list of str
+        The header fields, or ``column_<n>`` names
+    columns : list
+        One list of strings or numpy array per column
+    """
+    if delimiter is None:
+        delimiter = sniff_delimiter(in_file)
+    if chunk_rows is None:
+        chunk_rows = CSV_CHUNK_ROWS
+
+    rows = _iter_csv_rows(in_file, delimiter)
+    first = next(rows, [])
+    if header:
+        names = first
+    else:
+        names = ['column_' + str(x) for x in range(len(first))]
+        rows = itertools.chain([first], rows)
+
+    text = set() if infer_types else set(range(len(names)))
+    columns = [[] for _ in names]
+    chunk = [[] for _ in names]
+
+    def _flush_chunk():
+        for idx, values in enumerate(chunk):
+            chunk[idx] = []
+            array = None
+            if idx not in text and values:
+                array = _to_array(values)
+                if array is None:
+                    text.add(idx)
+                    if columns[idx]:
+                        # earlier chunks were converted, read them back
+                        reread.add(idx)
+            if array is not None:
+                columns[idx].append(array)
+            elif idx not in reread:
+                columns[idx].extend(values)
+
+    reread = set()
+    nrows = 0
+    for row in rows:
+        for idx, value in enumerate(row[:len(names)]):
+            chunk[idx].append(value)
+        nrows += 1
+        if nrows % chunk_rows == 0:
+            _flush_chunk()
+    _flush_chunk()
+
+    if reread:
+        # Some numeric-looking columns turned out to hold text
+        for idx in reread:
+            columns[idx] = []
+        rows = _iter_csv_rows(in_file, delimiter)
+        if header:
+            next(rows, None)
+        for row in rows:
+            for idx in reread:
+                if idx < len(row):
+                    columns[idx].append(row[idx])
+
+    for idx in range(len(names)):
+        if idx not in text:
+            columns[idx] = (np.concatenate(columns[idx]) if columns[idx]
+                            else np.array([], dtype=np.int64))
+    return names, columns
+
 
 class CSVReaderInputSpec(DynamicTraitedSpec, TraitedSpec):
     in_file = File(exists=True, mandatory=True, desc='Input comma-seperated value (CSV) file')
     header = traits.Bool(False, usedefault=True, desc='True if the first line is a column header')
+    delimiter = traits.Str(desc=('Field delimiter, detected from the first '
+                                 'lines of the file if undefined'))
+    infer_types = traits.Bool(False, usedefault=True,
+                              desc=('Return numeric columns as integer or '
+                                    'float arrays instead of strings'))
 
 
 class CSVReader(BaseInterface):
@@ -57,23 +180,26 @@ class CSVReader(BaseInterface):
     output_spec = DynamicTraitedSpec
     _always_run = True
 
-    def _append_entry(self, outputs, entry):
-        for key, value in zip(self._outfields, entry):
-            outputs[key].append(value)
-        return outputs
-
-    def _parse_line(self, line):
-        line = line.replace('\n', '')
-        entry = [x.strip() for x in line.split(',')]
-        return entry
+    def _get_delimiter(self):
+        if isdefined(self.inputs.delimiter):
+            return self.inputs.delimiter
+        # Detect the delimiter once per input file
+        if getattr(self, '_sniffed', (None, ))[0] != self.inputs.in_file:
+            self._sniffed = (self.inputs.in_file,
+                             sniff_delimiter(self.inputs.in_file))
+        return self._sniffed[1]
 
     def _get_outfields(self):
-        with open(self.inputs.in_file, 'r') as fid:
-            entry = self._parse_line(fid.readline())
+        layout = (self.inputs.in_file, self.inputs.header,
+                  self._get_delimiter())
+        if getattr(self, '_layout', None) != layout:
+            rows = _iter_csv_rows(self.inputs.in_file, layout[2])
+            entry = next(rows, [])
             if self.inputs.header:
                 self._outfields = tuple(entry)
             else:
                 self._outfields = tuple(['column_' + str(x) for x in range(len(entry))])
+            self._layout = layout
         return self._outfields
 
     def _run_interface(self, runtime):
@@ -88,14 +214,10 @@ class CSVReader(BaseInterface):
 
     def _list_outputs(self):
         outputs = self.output_spec().get()
-        isHeader = True
-        for key in self._outfields:
-            outputs[key] = []  # initialize outfields
-        with open(self.inputs.in_file, 'r') as fid:
-            for line in fid.readlines():
-                if self.inputs.header and isHeader:  # skip header line
-                    isHeader = False
-                    continue
-                entry = self._parse_line(line)
-                outputs = self._append_entry(outputs, entry)
+        names, columns = read_csv_columns(
+            self.inputs.in_file, header=self.inputs.header,
+            delimiter=self._get_delimiter(),
+            infer_types=self.inputs.infer_types)
+        for key, column in zip(names, columns):
+            outputs[key] = column
         return outputs
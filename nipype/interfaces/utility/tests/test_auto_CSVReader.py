@@ -4,10 +4,13 @@ from ..csv import CSVReader
 
 
 def test_CSVReader_inputs():
-    input_map = dict(header=dict(usedefault=True,
+    input_map = dict(delimiter=dict(),
+    header=dict(usedefault=True,
     ),
     in_file=dict(mandatory=True,
     ),
+    infer_types=dict(usedefault=True,
+    ),
     )
     inputs = CSVReader.input_spec()
 
@@ -3,7 +3,10 @@
 # vi: set ft=python sts=4 ts=4 sw=4 et:
 from __future__ import print_function, unicode_literals
 
+import numpy as np
+
 from nipype.interfaces import utility
+from nipype.interfaces.utility.csv import read_csv_columns
 
 
 def test_csvReader(tmpdir):
@@ -30,3 +33,29 @@ def test_csvReader(tmpdir):
                 assert out.outputs.column_0 == ['foo', 'bar', 'baz']
                 assert out.outputs.column_1 == ['hello', 'world', 'goodbye']
                 assert out.outputs.column_2 == ['300.1', '5', '0.3']
+
+
+def test_csvReader_types(tmpdir):
+    name = str(tmpdir.join("testfile.tsv"))
+    with open(name, 'w') as fid:
+        fid.write("files\tsize\terosion\tnote\n")
+        fid.write("foo\t3\t300.1\t1\n")
+        fid.write("bar, baz\t5\t5\t2\n")
+        fid.write("qux\t7\t0.3\tn/a\n")
+
+    reader = utility.CSVReader(in_file=name, header=True, infer_types=True)
+    out = reader.run()
+    assert out.outputs.files == ['foo', 'bar, baz', 'qux']
+    assert out.outputs.size.dtype == np.int64
+    assert out.outputs.size.tolist() == [3, 5, 7]
+    assert out.outputs.erosion.tolist() == [300.1, 5.0, 0.3]
+    assert out.outputs.note == ['1', '2', 'n/a']
+
+    # columns that turn non-numeric in a later chunk are read back as text
+    for chunk_rows in (1, 2, 10):
+        names, columns = read_csv_columns(name, header=True,
+                                          infer_types=True,
+                                          chunk_rows=chunk_rows)
+        assert names == ['files', 'size', 'erosion', 'note']
+        assert columns[2].tolist() == [300.1, 5.0, 0.3]
+        assert columns[3] == ['1', '2', 'n/a']
@@ -603,6 +603,14 @@ class Node(EngineBase):
                 fd.writelines(cmd + "\n")
                 fd.close()
                 logger.info('Running: %s' % cmd)
+            if hasattr(self._interface, 'needed_outputs'):
+                # let interfaces that look their outputs up on demand skip
+                # the ones nothing is connected to, unless the unneeded
+                # outputs are kept
+                self._interface.needed_outputs = None
+                if str2bool(self.config['execution']
+                            ['remove_unnecessary_outputs']):
+                    self._interface.needed_outputs = self.needed_outputs
             try:
                 result = self._interface.run()
             except Exception as msg:
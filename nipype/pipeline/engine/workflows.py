@@ -587,7 +587,14 @@ connected.
         self._configure_exec_nodes(execgraph)
         if str2bool(self.config['execution']['create_report']):
             self._write_report_info(self.base_dir, self.name, execgraph)
-        runner.run(execgraph, updatehash=updatehash, config=self.config)
+        try:
+            runner.run(execgraph, updatehash=updatehash, config=self.config)
+        except BaseException:
+            # Keep the rows of the nodes that did run, but do not let a
+            # failing flush hide the error of the workflow
+            self._flush_buffers(execgraph, raise_errors=False)
+            raise
+        self._flush_buffers(execgraph)
         datestr = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
         if str2bool(self.config['execution']['write_provenance']):
             prov_base = op.join(self.base_dir,
@@ -598,6 +605,32 @@ connected.
 
     # PRIVATE API AND FUNCTIONS
 
+    def _flush_buffers(self, graph, raise_errors=True):
+        """Flush the rows queued by buffered sinks (e.g. SQLiteSink)
+
+        Sinks queueing rows implement ``_flush_buffered_rows``, which is
+        given the inputs each node ran with: inputs connected from other
+        nodes, or set in worker processes, are not set on the interfaces
+        of this graph. With ``raise_errors=False``, errors are logged and
+        the remaining sinks are flushed.
+        """
+        for node in graph.nodes():
+            flush = getattr(node.interface, '_flush_buffered_rows', None)
+            if not callable(flush):
+                continue
+            try:
+                result = node.result
+                nrows = flush(getattr(result, 'inputs', None))
+            except Exception as e:
+                if raise_errors:
+                    raise
+                logger.error('[%s] Could not flush buffered rows: %s',
+                             node.name, e)
+                continue
+            if nrows:
+                logger.info('[%s] Flushed %d buffered rows', node.name,
+                            nrows)
+
     def _write_report_info(self, workingdir, name, graph):
         if workingdir is None:
             workingdir = os.getcwd()
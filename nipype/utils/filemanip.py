@@ -20,6 +20,7 @@ import os
 import re
 import shutil
 import posixpath
+from collections import OrderedDict
 import simplejson as json
 import numpy as np
 
@@ -360,6 +361,10 @@ def copyfile(originalfile, newfile, copy=False, create_new=False,
                 keep = True
         elif posixpath.samefile(newfile, originalfile):
             keep = True
+        elif hashmethod == 'content' and \
+                os.path.getsize(newfile) != os.path.getsize(originalfile):
+            # files of different sizes cannot have the same content
+            keep = False
         else:
             if hashmethod == 'timestamp':
                 hashfn = hash_timestamp
@@ -551,6 +556,200 @@ def load_json(filename):
     return data
 
 
+def _json_default(obj):
+    if hasattr(obj, 'item'):
+        return obj.item()
+    return str(obj)
+
+
+def _append_line(filename, line):
+    """Append an encoded line with a single ``O_APPEND`` write and return
+    the offset it was written at"""
+    fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+    try:
+        written = os.write(fd, line)
+        # The descriptor is left at the end of this very write
+        end = os.lseek(fd, 0, os.SEEK_CUR)
+    finally:
+        os.close(fd)
+
+    if written != len(line):
+        raise IOError('Short write appending a record to %s' % filename)
+    return end - written
+
+
+def append_json_line(filename, data):
+    """Append data to a file as a single line of json
+
+    The file is opened with ``O_APPEND`` and the line is written with a
+    single ``write`` call, so that concurrent writers on a local filesystem
+    never interleave or lose records. The line starts with a newline
+    (rather than ending with one), so that a record left unterminated by
+    a writer killed in the middle of a write never runs into the next one.
+
+    Parameters
+    ----------
+    filename : str
+        Filename to append data to.
+    data : dict
+        Dictionary to append (numpy scalars are converted).
+
+    Returns
+    -------
+    offset, length : int
+        Position and size in bytes of the record in the file
+
+    """
+    record = json.dumps(data, sort_keys=True,
+                        default=_json_default).encode('utf-8')
+    return _append_line(filename, b'\n' + record) + 1, len(record)
+
+
+def load_json_lines(filename):
+    """Load the records appended to a file with :func:`append_json_line`
+
+    Truncated records (e.g. from a writer killed in the middle of a write)
+    are skipped with a warning.
+
+    Returns
+    -------
+    data : list of dict
+
+    """
+    records = []
+    with open(filename, 'r', encoding='utf-8') as fp:
+        for lineno, line in enumerate(fp, 1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                fmlogger.warning('Skipping malformed record %d of %s',
+                                 lineno, filename)
+    return records
+
+
+def append_json_record(filename, record_id, data):
+    """Append a record to a JSON-lines store and to its offset index
+
+    The store holds one ``{"id": record_id, "data": data}`` line per
+    record. Its index (``filename + '.idx'``) holds the offset, length and
+    id of each of them, so that :func:`load_json_records` reads and parses
+    the selected records only. Both files are only ever appended to (see
+    :func:`append_json_line`), so that many nodes can share one store.
+
+    Parameters
+    ----------
+    filename : str
+        JSON-lines store
+    record_id : str
+        Identifier of the record; records appended later replace earlier
+        ones with the same identifier.
+    data : dict
+        Record to append
+
+    """
+    offset, length = append_json_line(filename, {'id': record_id,
+                                                 'data': data})
+    entry = '\n%d\t%d\t%s' % (offset, length, json.dumps(record_id))
+    _append_line(filename + '.idx', entry.encode('utf-8'))
+
+
+def _decode_record_id(raw):
+    # Plain strings are by far the most common identifiers
+    if (len(raw) > 1 and raw.startswith('"') and raw.endswith('"') and
+            '\\' not in raw):
+        return raw[1:-1]
+    return json.loads(raw)
+
+
+def _json_store_index(filename, record_ids=None):
+    """Returns the (offset, length) of the latest record of each id (or
+    of the given ids) of a JSON-lines store, scanning the store if it has
+    no index"""
+    index = OrderedDict()
+    index_file = filename + '.idx'
+    if os.path.exists(index_file):
+        # Match the ids as they were encoded rather than decoding them all
+        wanted = None
+        if record_ids is not None:
+            wanted = dict((json.dumps(record_id), record_id)
+                          for record_id in record_ids)
+        with open(index_file, 'r', encoding='utf-8') as fp:
+            for line in fp:
+                fields = line.rstrip('\n').split('\t', 2)
+                if len(fields) < 3:
+                    continue
+                try:
+                    if wanted is None:
+                        record_id = _decode_record_id(fields[2])
+                    elif fields[2] in wanted:
+                        record_id = wanted[fields[2]]
+                    else:
+                        continue
+                except ValueError:
+                    continue
+                # Concurrent writers may index their records out of order
+                offset = int(fields[0])
+                if record_id not in index or index[record_id][0] < offset:
+                    index[record_id] = (offset, int(fields[1]))
+        return index
+
+    offset = 0
+    with open(filename, 'rb') as fp:
+        for line in fp:
+            try:
+                record_id = json.loads(line.decode('utf-8'))['id']
+            except (ValueError, KeyError, TypeError):
+                pass
+            else:
+                index[record_id] = (offset, len(line))
+            offset += len(line)
+    return index
+
+
+def load_json_records(filename, record_ids=None, keys=None):
+    """Load records from a store written with :func:`append_json_record`
+
+    Only the records that are asked for are read and parsed.
+
+    Parameters
+    ----------
+    filename : str
+        JSON-lines store
+    record_ids : list of str
+        Records to load (default: all of them)
+    keys : list of str
+        Keys of each record to return (default: all of them)
+
+    Returns
+    -------
+    records : OrderedDict
+        Maps record ids to their data, in the order of ``record_ids`` or
+        of the store
+
+    """
+    index = _json_store_index(filename, record_ids)
+    if record_ids is None:
+        record_ids = list(index.keys())
+
+    # Read the records in file order
+    wanted = sorted((index[record_id], record_id) for record_id in
+                    OrderedDict.fromkeys(record_ids) if record_id in index)
+    data = {}
+    with open(filename, 'rb') as fp:
+        for (offset, length), record_id in wanted:
+            fp.seek(offset)
+            record = json.loads(fp.read(length).decode('utf-8'))['data']
+            if keys is not None:
+                record = OrderedDict((key, record[key]) for key in keys
+                                     if key in record)
+            data[record_id] = record
+
+    return OrderedDict((record_id, data[record_id])
+                       for record_id in record_ids if record_id in data)
+
+
 def loadcrash(infile, *args):
     if '.pkl' in infile:
         return loadpkl(infile)
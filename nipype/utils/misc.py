@@ -248,6 +248,7 @@ def unflatten(in_list, prev_structure):
 def normalize_mc_params(params, source):
     """
     Normalize a single row of motion parameters to the SPM format.
+    A 2D array is normalized row by row.
 
     SPM saves motion parameters as:
         x   Right-Left          (mm)
@@ -258,11 +259,15 @@ def normalize_mc_params(params, source):
         rz  Roll                (rad)
     """
     if source.upper() == 'FSL':
-        params = params[[3, 4, 5, 0, 1, 2]]
+        params = params[..., [3, 4, 5, 0, 1, 2]]
     elif source.upper() in ('AFNI', 'FSFAST'):
-        params = params[np.asarray([4, 5, 3, 1, 2, 0]) + (len(params) > 6)]
-        params[3:] = params[3:] * np.pi / 180.
+        params = params[..., np.asarray([4, 5, 3, 1, 2, 0]) +
+                        (params.shape[-1] > 6)]
+        params[..., 3:] = params[..., 3:] * np.pi / 180.
     elif source.upper() == 'NIPY':
+        if params.ndim > 1:
+            return np.apply_along_axis(normalize_mc_params, -1, params,
+                                       source)
         from nipy.algorithms.registration import to_matrix44, aff2euler
         matrix = to_matrix44(params)
         params = np.zeros(6)
@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 from builtins import open
 
 import os
+import json
 import time
 from tempfile import mkstemp, mkdtemp
 import shutil
@@ -13,6 +14,8 @@ import warnings
 import pytest
 from ...testing import TempFATFS
 from ...utils.filemanip import (save_json, load_json,
+                                append_json_line, load_json_lines,
+                                append_json_record, load_json_records,
                                 fname_presuffix, fnames_presuffix,
                                 hash_rename, check_forhash,
                                 _cifs_table, on_cifs,
@@ -320,6 +323,39 @@ def test_json():
     assert sorted(adict.items()) == sorted(new_dict.items())
 
 
+def test_json_lines_torn_write(tmpdir):
+    filename = str(tmpdir.join('records.jsonl'))
+    offset, length = append_json_line(filename, {'a': 1})
+    with open(filename, 'rb') as fp:
+        fp.seek(offset)
+        assert json.loads(fp.read(length).decode('utf-8')) == {'a': 1}
+    append_json_line(filename, {'a': 2, 'b': 'two'})
+
+    # truncate the last record as a writer killed mid-write would do,
+    # then keep appending
+    with open(filename, 'r+') as fp:
+        fp.truncate(os.path.getsize(filename) - 4)
+    append_json_line(filename, {'a': 3})
+    assert load_json_lines(filename) == [{'a': 1}, {'a': 3}]
+
+
+def test_json_records_torn_write(tmpdir):
+    filename = str(tmpdir.join('records.jsonl'))
+    append_json_record(filename, 's1', {'x': 1})
+    append_json_record(filename, 's2', {'x': 2})
+    for name in (filename, filename + '.idx'):
+        with open(name, 'r+') as fp:
+            fp.truncate(os.path.getsize(name) - 3)
+    append_json_record(filename, 's3', {'x': 3})
+    append_json_record(filename, 's1', {'x': 4})
+
+    expected = [('s1', {'x': 4}), ('s3', {'x': 3})]
+    assert list(load_json_records(filename).items()) == expected
+    # without the index, the store is scanned
+    os.remove(filename + '.idx')
+    assert list(load_json_records(filename).items()) == expected
+
+
 @pytest.mark.parametrize("file, length, expected_files", [
         ('/path/test.img',  3, ['/path/test.hdr', '/path/test.img', '/path/test.mat']),
         ('/path/test.hdr',  3, ['/path/test.hdr', '/path/test.img', '/path/test.mat']),